@@ -0,0 +1,53 @@
+"""
+Benchmark ROC curve simplification against the "rdp" package.
+
+Run with "python benchmarks/roc_simplification.py"; the "rdp" package from the "test" dependency
+group must be installed.
+"""
+
+import functools
+import timeit
+import warnings
+
+import numpy as np
+import rdp
+
+from isic_challenge_scoring import metrics
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    for point_count in [1_000, 5_000, 20_000]:
+        # A noisy, monotone ROC-like curve
+        fp_rates = np.sort(rng.random(point_count))
+        tp_rates = np.maximum.accumulate(
+            np.sqrt(fp_rates) + rng.normal(scale=0.01, size=point_count)
+        )
+        points = np.vstack((fp_rates, tp_rates)).T
+
+        with warnings.catch_warnings():
+            # "rdp" calls "numpy.cross" in a deprecated way
+            warnings.simplefilter('ignore', DeprecationWarning)
+            reference_mask = rdp.rdp(points, epsilon=0.001, return_mask=True)
+            reference_time = min(
+                timeit.repeat(
+                    functools.partial(rdp.rdp, points, epsilon=0.001, return_mask=True),
+                    number=1,
+                    repeat=3,
+                )
+            )
+        mask = metrics._rdp_mask(points, epsilon=0.001)
+        time = min(
+            timeit.repeat(functools.partial(metrics._rdp_mask, points, epsilon=0.001), number=1)
+        )
+
+        assert np.array_equal(mask, reference_mask)
+        print(
+            f'{point_count:>6} points -> {mask.sum():>4} points: '
+            f'rdp {reference_time * 1000:9.2f} ms, '
+            f'_rdp_mask {time * 1000:7.2f} ms ({reference_time / time:.0f}x)'
+        )
+
+
+if __name__ == '__main__':
+    main()
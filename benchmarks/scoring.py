@@ -0,0 +1,245 @@
+"""
+Benchmark the classification and segmentation scoring hot paths, against a stored baseline.
+
+Run with "python benchmarks/scoring.py [--scale small|medium|large]". The throughput and peak
+memory of each stage is compared against "benchmarks/baseline.json", and the benchmark fails if
+any is worse by more than "--tolerance". Throughput depends on the machine, so comparisons are
+only meaningful against a baseline recorded on the same machine, with "--update-baseline".
+"""
+
+import argparse
+import collections
+from collections.abc import Callable
+from dataclasses import dataclass
+import io
+import json
+import pathlib
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from typing import Any
+
+import synthetic
+
+from isic_challenge_scoring import load_csv, metrics
+from isic_challenge_scoring.classification import (
+    ClassificationMetric,
+    ClassificationScore,
+    ClassificationTruth,
+)
+from isic_challenge_scoring.load_image import iter_image_pairs
+from isic_challenge_scoring.segmentation import SegmentationScore
+
+BASELINE_FILE = pathlib.Path(__file__).parent / 'baseline.json'
+
+
+@dataclass(frozen=True)
+class ClassificationCase:
+    row_count: int
+    category_count: int
+
+    @property
+    def name(self) -> str:
+        return f'classification-{self.row_count}x{self.category_count}'
+
+
+@dataclass(frozen=True)
+class SegmentationCase:
+    mask_count: int
+    min_size: int
+    max_size: int
+
+    @property
+    def name(self) -> str:
+        return f'segmentation-{self.mask_count}x{self.min_size}-{self.max_size}'
+
+
+SCALES: dict[str, list[ClassificationCase | SegmentationCase]] = {
+    'small': [
+        ClassificationCase(1_000, 2),
+        ClassificationCase(10_000, 10),
+        ClassificationCase(10_000, 50),
+        SegmentationCase(100, 64, 256),
+    ],
+    'medium': [
+        ClassificationCase(100_000, 2),
+        ClassificationCase(100_000, 10),
+        ClassificationCase(100_000, 50),
+        ClassificationCase(1_000_000, 10),
+        SegmentationCase(1_000, 256, 1024),
+    ],
+    'large': [
+        ClassificationCase(1_000_000, 50),
+        ClassificationCase(10_000_000, 2),
+        ClassificationCase(10_000_000, 10),
+        SegmentationCase(10_000, 256, 2048),
+    ],
+}
+
+
+@dataclass
+class StageResult:
+    seconds: float
+    peak_memory: int
+    item_count: int
+
+    @property
+    def throughput(self) -> float:
+        return self.item_count / self.seconds
+
+
+def measure(function: Callable[[], Any], item_count: int, repeat: int) -> StageResult:
+    # Fast stages are run many times per measurement, to reduce noise
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+
+    # Tracing allocations slows execution, so time and memory are measured in separate runs
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return StageResult(seconds, peak_memory, item_count)
+
+
+def benchmark_classification(case: ClassificationCase, repeat: int) -> dict[str, StageResult]:
+    truth_csv, prediction_csv = synthetic.classification_csvs(case.row_count, case.category_count)
+    truth = ClassificationTruth.from_stream(io.StringIO(truth_csv))
+    categories = truth.probabilities.columns
+    prediction_probabilities = load_csv.align_rows(
+        truth.probabilities.index, load_csv.parse_csv(io.StringIO(prediction_csv), categories)
+    )
+
+    return {
+        'parse_csv': measure(
+            lambda: load_csv.parse_csv(io.StringIO(prediction_csv), categories),
+            case.row_count,
+            repeat,
+        ),
+        'roc': measure(
+            lambda: metrics.roc(
+                truth.probabilities[categories[0]],
+                prediction_probabilities[categories[0]],
+                truth.weights['score_weight'],
+            ),
+            case.row_count,
+            repeat,
+        ),
+        # From CSV parsing to every metric
+        'classification_score': measure(
+            lambda: ClassificationScore.from_truth(
+                truth, io.StringIO(prediction_csv), ClassificationMetric.BALANCED_ACCURACY
+            ).to_dict(),
+            case.row_count,
+            repeat,
+        ),
+    }
+
+
+def benchmark_segmentation(case: SegmentationCase, repeat: int) -> dict[str, StageResult]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        truth_path = pathlib.Path(temp_dir) / 'truth'
+        prediction_path = pathlib.Path(temp_dir) / 'prediction'
+        truth_path.mkdir()
+        prediction_path.mkdir()
+        synthetic.segmentation_dirs(
+            truth_path, prediction_path, case.mask_count, case.min_size, case.max_size
+        )
+
+        results = {
+            # Images are decoded one pair at a time, so are not retained
+            'iter_image_pairs': measure(
+                lambda: collections.deque(iter_image_pairs(truth_path, prediction_path), maxlen=0),
+                case.mask_count,
+                repeat,
+            ),
+        }
+        image_pairs = list(iter_image_pairs(truth_path, prediction_path))
+
+    results['segmentation_score'] = measure(
+        lambda: SegmentationScore(image_pairs).to_dict(), case.mask_count, repeat
+    )
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, StageResult]],
+    baseline: dict[str, dict[str, dict[str, float]]],
+    tolerance: float,
+) -> list[str]:
+    """Print results, returning a description of each regression from the baseline."""
+    regressions = []
+    print(
+        f'{"case":<32} {"stage":<22} {"time":>11} {"items/s":>12} {"peak":>11} '
+        f'{"vs. baseline":>22}'
+    )
+    for case_name, stage_results in results.items():
+        for stage_name, result in stage_results.items():
+            comparison = ''
+            stage_baseline = baseline.get(case_name, {}).get(stage_name)
+            if stage_baseline is not None:
+                throughput_ratio = result.throughput / stage_baseline['throughput']
+                memory_ratio = result.peak_memory / stage_baseline['peak_memory']
+                comparison = f'{throughput_ratio:6.2f}x speed {memory_ratio:5.2f}x mem'
+                if throughput_ratio < 1.0 - tolerance:
+                    regressions.append(
+                        f'{case_name} {stage_name}: throughput is {throughput_ratio:.2f}x baseline'
+                    )
+                if memory_ratio > 1.0 + tolerance:
+                    regressions.append(
+                        f'{case_name} {stage_name}: peak memory is {memory_ratio:.2f}x baseline'
+                    )
+            print(
+                f'{case_name:<32} {stage_name:<22} {result.seconds * 1000:>8.1f} ms '
+                f'{result.throughput:>12,.0f} {result.peak_memory / 2**20:>7.1f} MiB '
+                f'{comparison:>22}'
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES.keys(), default='small')
+    parser.add_argument('--repeat', type=int, default=3, help='Time the best of this many runs.')
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.25,
+        help='The fraction by which throughput or peak memory may be worse than the baseline.',
+    )
+    parser.add_argument(
+        '--update-baseline',
+        action='store_true',
+        help='Store these results as the baseline, rather than comparing against it.',
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for case in SCALES[args.scale]:
+        if isinstance(case, ClassificationCase):
+            results[case.name] = benchmark_classification(case, args.repeat)
+        else:
+            results[case.name] = benchmark_segmentation(case, args.repeat)
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    if args.update_baseline:
+        compare(results, {}, args.tolerance)
+        for case_name, stage_results in results.items():
+            baseline[case_name] = {
+                stage_name: {'throughput': result.throughput, 'peak_memory': result.peak_memory}
+                for stage_name, result in stage_results.items()
+            }
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('\nRegressions from baseline:', *regressions, sep='\n  ', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Deterministic synthetic submissions, for benchmarks."""
+
+import io
+import pathlib
+
+from PIL import Image
+import numpy as np
+import pandas as pd
+
+
+def classification_csvs(row_count: int, category_count: int, seed: int = 0) -> tuple[str, str]:
+    """
+    Generate a classification ground truth CSV and a prediction CSV for it.
+
+    Predictions are noisy, but informative, so metrics are neither trivial nor degenerate.
+    """
+    rng = np.random.default_rng(seed)
+    images = [f'ISIC_{image_number:08d}' for image_number in range(row_count)]
+    categories = [f'category_{category_index}' for category_index in range(category_count)]
+
+    labels = rng.integers(category_count, size=row_count)
+    truth = np.zeros((row_count, category_count))
+    truth[np.arange(row_count), labels] = 1.0
+    truth_table = pd.DataFrame(truth, index=pd.Index(images, name='image'), columns=categories)
+    truth_table['score_weight'] = 1.0
+    truth_table['validation_weight'] = rng.integers(2, size=row_count).astype(float)
+
+    logits = rng.normal(size=(row_count, category_count)) + 2.0 * truth
+    prediction = np.exp(logits)
+    prediction /= prediction.sum(axis=1, keepdims=True)
+    # Predictions are rarely in the same order as the truth
+    prediction_table = pd.DataFrame(
+        prediction, index=pd.Index(images, name='image'), columns=categories
+    ).iloc[rng.permutation(row_count)]
+
+    return _to_csv(truth_table), _to_csv(prediction_table)
+
+
+def segmentation_dirs(
+    truth_path: pathlib.Path,
+    prediction_path: pathlib.Path,
+    mask_count: int,
+    min_size: int,
+    max_size: int,
+    seed: int = 0,
+) -> None:
+    """
+    Write segmentation ground truth and prediction masks, of varied resolution, as PNG files.
+
+    Each mask is an ellipse, and each prediction is a shifted and resized version of its truth.
+    """
+    rng = np.random.default_rng(seed)
+    for image_number in range(mask_count):
+        height, width = rng.integers(min_size, max_size + 1, size=2)
+        center = rng.uniform(0.3, 0.7, size=2) * (height, width)
+        radii = rng.uniform(0.1, 0.3, size=2) * (height, width)
+
+        truth_mask = _ellipse_mask(height, width, center, radii)
+        prediction_mask = _ellipse_mask(
+            height,
+            width,
+            center + rng.normal(scale=0.05, size=2) * (height, width),
+            radii * rng.uniform(0.8, 1.2, size=2),
+        )
+
+        Image.fromarray(truth_mask).save(truth_path / f'ISIC_{image_number:07d}_segmentation.png')
+        Image.fromarray(prediction_mask).save(
+            prediction_path / f'ISIC_{image_number:07d}_prediction.png'
+        )
+
+
+def _ellipse_mask(height: int, width: int, center: np.ndarray, radii: np.ndarray) -> np.ndarray:
+    rows, columns = np.ogrid[:height, :width]
+    inside = ((rows - center[0]) / radii[0]) ** 2 + ((columns - center[1]) / radii[1]) ** 2 <= 1.0
+    return np.where(inside, 255, 0).astype(np.uint8)
+
+
+def _to_csv(table: pd.DataFrame) -> str:
+    stream = io.StringIO()
+    table.to_csv(stream)
+    return stream.getvalue()
@@ -1,5 +1,37 @@
-from isic_challenge_scoring.classification import ClassificationMetric, ClassificationScore
-from isic_challenge_scoring.segmentation import SegmentationScore
-from isic_challenge_scoring.types import ScoreError
+from __future__ import annotations
 
-__all__ = ['ClassificationScore', 'SegmentationScore', 'ScoreError', 'ClassificationMetric']
+import importlib
+from typing import TYPE_CHECKING, Any
+
+from isic_challenge_scoring.types import ClassificationMetric, ScoreError
+
+if TYPE_CHECKING:
+    from isic_challenge_scoring.classification import ClassificationScore, ClassificationTruth
+    from isic_challenge_scoring.segmentation import SegmentationScore
+
+__all__ = [
+    'ClassificationScore',
+    'ClassificationTruth',
+    'SegmentationScore',
+    'ScoreError',
+    'ClassificationMetric',
+]
+
+# Scoring modules import heavy dependencies (e.g. Pandas), so are only imported on first use
+_lazy_attributes = {
+    'ClassificationScore': 'isic_challenge_scoring.classification',
+    'ClassificationTruth': 'isic_challenge_scoring.classification',
+    'SegmentationScore': 'isic_challenge_scoring.segmentation',
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
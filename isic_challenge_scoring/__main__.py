@@ -1,3 +1,5 @@
+from collections.abc import Iterator
+import contextlib
 import json
 import pathlib
 from typing import cast
@@ -5,35 +7,86 @@ from typing import cast
 import click
 import click_pathlib
 
-from isic_challenge_scoring.classification import ClassificationMetric, ClassificationScore
-from isic_challenge_scoring.segmentation import SegmentationScore
-from isic_challenge_scoring.types import ScoreError
+# Scoring modules import heavy dependencies (e.g. Pandas), so are only imported by the commands
+# that use them, to keep startup fast
+from isic_challenge_scoring import timings, tracing
+from isic_challenge_scoring.types import ClassificationMetric, Score, ScoreError
 
 DirectoryPath = click_pathlib.Path(exists=True, file_okay=False, dir_okay=True, readable=True)
 FilePath = click_pathlib.Path(exists=True, file_okay=True, dir_okay=False, readable=True)
+FileOrDirectoryPath = click_pathlib.Path(exists=True, file_okay=True, dir_okay=True, readable=True)
+OutputFilePath = click_pathlib.Path(file_okay=True, dir_okay=False, writable=True)
 
 
 @click.group(name='isic-challenge-scoring', help='ISIC Challenge submission scoring')
-@click.option('-o', '--output', type=click.Choice(['table', 'json']), default='table')
-def cli(output: str) -> None:
+@click.option('-o', '--output', type=click.Choice(['table', 'json', 'npz']), default='table')
+@click.option(
+    '--profile',
+    is_flag=True,
+    help='Also output the time and memory used by each stage of scoring. Tracing memory slows '
+    'scoring (e.g. by around half, for classification), so times are higher than without '
+    '--profile; they are best compared between stages.',
+)
+@click.option(
+    '--trace',
+    type=OutputFilePath,
+    default=None,
+    help='Write a trace of each stage of scoring, from every process, to this file. It can be '
+    'loaded by Chrome trace viewers (e.g. Perfetto).',
+)
+def cli(output: str, profile: bool, trace: pathlib.Path | None) -> None:
     pass
 
 
+@contextlib.contextmanager
+def _instrument(
+    ctx: click.Context, submission: pathlib.Path | None = None
+) -> Iterator[timings.Recorder | None]:
+    """Record timings and write a trace, if requested, yielding any timings recorder."""
+    params = cast(click.Context, ctx.parent).params
+    with contextlib.ExitStack() as stack:
+        if params['trace'] is not None:
+            stack.enter_context(tracing.trace(params['trace']))
+        recorder = stack.enter_context(timings.record()) if params['profile'] else None
+        if submission is not None:
+            stack.enter_context(tracing.span_args(submission=submission.name))
+            stack.enter_context(timings.stage('score_submission'))
+        yield recorder
+
+
 @cli.command()
 @click.pass_context
 @click.argument('truth_dir', type=DirectoryPath)
 @click.argument('prediction_dir', type=DirectoryPath)
-def segmentation(ctx: click.Context, truth_dir: pathlib.Path, prediction_dir: pathlib.Path) -> None:
-    try:
-        score = SegmentationScore.from_dir(truth_dir, prediction_dir)
-    except ScoreError as e:
-        raise click.ClickException(str(e))
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=1,
+    help='The number of worker processes to decode and score images in parallel.',
+)
+def segmentation(
+    ctx: click.Context, truth_dir: pathlib.Path, prediction_dir: pathlib.Path, jobs: int
+) -> None:
+    from isic_challenge_scoring.segmentation import SegmentationScore
+
+    with _instrument(ctx, prediction_dir) as recorder:
+        try:
+            score = SegmentationScore.from_dir(truth_dir, prediction_dir, workers=jobs)
+        except ScoreError as e:
+            raise click.ClickException(str(e))
+    if recorder is not None:
+        score.timings = recorder.to_frame()
 
     output: str = cast(click.Context, ctx.parent).params['output']
     if output == 'table':
         click.echo(score.to_string())
+        if score.timings is not None:
+            click.echo(f'\nTimings:\n{score.timings.to_string()}')
     elif output == 'json':
         click.echo(json.dumps(score.to_dict(), indent=2))
+    elif output == 'npz':
+        click.echo(score.to_bytes(), nl=False)
 
 
 @cli.command()
@@ -46,21 +99,264 @@ def segmentation(ctx: click.Context, truth_dir: pathlib.Path, prediction_dir: pa
     type=click.Choice([metric.value for metric in ClassificationMetric]),
     default=ClassificationMetric.BALANCED_ACCURACY.value,
 )
+@click.option(
+    '--chunk-size',
+    type=click.IntRange(min=1),
+    default=None,
+    help='Read the prediction file this many rows at a time, to bound memory usage.',
+)
+@click.option(
+    '--memmap',
+    is_flag=True,
+    help='With --chunk-size, store the prediction values in a temporary memory-mapped file, '
+    'rather than in memory.',
+)
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=1,
+    help='The number of worker processes to score categories in parallel.',
+)
+@click.option(
+    '--fast',
+    is_flag=True,
+    help='Compute and output only the overall and validation scores, of the target metric.',
+)
+@click.option(
+    '--roc-points',
+    type=click.IntRange(min=2),
+    default=None,
+    help='Output at most this many points of each ROC curve, rather than every point needed to '
+    'accurately draw it.',
+)
+@click.option(
+    '--bootstrap',
+    'replicates',
+    type=click.IntRange(min=1),
+    default=None,
+    metavar='N',
+    help="Also output 95% confidence intervals of the target metric and of each category's AUC "
+    'and AP, from this many bootstrap replicates.',
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=0,
+    show_default=True,
+    help='The random seed of bootstrap replicates.',
+)
 def classification(
-    ctx: click.Context, truth_file: pathlib.Path, prediction_file: pathlib.Path, metric: str
+    ctx: click.Context,
+    truth_file: pathlib.Path,
+    prediction_file: pathlib.Path,
+    metric: str,
+    chunk_size: int | None,
+    memmap: bool,
+    jobs: int,
+    fast: bool,
+    roc_points: int | None,
+    replicates: int | None,
+    seed: int,
 ) -> None:
-    try:
-        score = ClassificationScore.from_file(
-            truth_file, prediction_file, ClassificationMetric(metric)
-        )
-    except ScoreError as e:
-        raise click.ClickException(str(e))
+    from isic_challenge_scoring.classification import ClassificationScore
 
     output: str = cast(click.Context, ctx.parent).params['output']
+    if replicates is not None and output == 'npz':
+        raise click.UsageError('Bootstrap confidence intervals cannot be output as npz.')
+    if memmap and chunk_size is None:
+        raise click.UsageError('--memmap requires --chunk-size.')
+
+    with _instrument(ctx, prediction_file) as recorder:
+        try:
+            classification_score = ClassificationScore.from_file(
+                truth_file,
+                prediction_file,
+                ClassificationMetric(metric),
+                chunk_size,
+                workers=jobs,
+                roc_points=roc_points,
+                memmap=memmap,
+            )
+            bootstrap = (
+                classification_score.bootstrap(replicates, seed) if replicates is not None else None
+            )
+            score: Score = classification_score
+            if fast:
+                # Other metrics are computed lazily, so are never computed if not output
+                score = Score(overall=score.overall, validation=score.validation)
+            elif recorder is not None or tracing.current_file() is not None:
+                # Compute every metric while instrumented
+                score.to_dict()
+        except ScoreError as e:
+            raise click.ClickException(str(e))
+    if recorder is not None:
+        score.timings = recorder.to_frame()
+
     if output == 'table':
         click.echo(score.to_string())
+        if bootstrap is not None:
+            click.echo(f'\n{bootstrap.to_string()}')
+        if score.timings is not None:
+            click.echo(f'\nTimings:\n{score.timings.to_string()}')
     elif output == 'json':
-        click.echo(json.dumps(score.to_dict(rocs=False), indent=2))
+        score_dict: dict[str, object] = dict(
+            score.to_dict(rocs=False) if isinstance(score, ClassificationScore) else score.to_dict()
+        )
+        if bootstrap is not None:
+            score_dict['bootstrap'] = bootstrap.to_dict()
+        click.echo(json.dumps(score_dict, indent=2))
+    elif output == 'npz':
+        click.echo(score.to_bytes(), nl=False)
+
+
+@cli.command(
+    name='classification-batch',
+    help='Score many prediction files, or directories of prediction CSV files, against the same '
+    'ground truth. Results are written as JSON Lines, as each submission finishes.',
+)
+@click.argument('truth_file', type=FilePath)
+@click.argument('predictions', type=FileOrDirectoryPath, nargs=-1, required=True)
+@click.option(
+    '-m',
+    '--metric',
+    type=click.Choice([metric.value for metric in ClassificationMetric]),
+    default=ClassificationMetric.BALANCED_ACCURACY.value,
+)
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=None,
+    help='The number of worker processes. Defaults to the number of CPUs.',
+)
+@click.pass_context
+def classification_batch(
+    ctx: click.Context,
+    truth_file: pathlib.Path,
+    predictions: tuple[pathlib.Path, ...],
+    metric: str,
+    jobs: int | None,
+) -> None:
+    from isic_challenge_scoring.classification import ClassificationScore
+
+    prediction_files = [
+        prediction_file
+        for prediction in predictions
+        for prediction_file in (
+            sorted(prediction.glob('*.csv')) if prediction.is_dir() else [prediction]
+        )
+    ]
+
+    try:
+        # Timings are not recorded from worker processes, but traces are
+        trace_file: pathlib.Path | None = cast(click.Context, ctx.parent).params['trace']
+        with tracing.trace(trace_file) if trace_file is not None else contextlib.nullcontext():
+            results = ClassificationScore.score_many(
+                truth_file, prediction_files, ClassificationMetric(metric), workers=jobs
+            )
+            for prediction_file, result in results:
+                line: dict[str, object]
+                if isinstance(result, ScoreError):
+                    line = {'prediction_file': str(prediction_file), 'error': str(result)}
+                else:
+                    line = {'prediction_file': str(prediction_file), **result.to_dict(rocs=False)}
+                click.echo(json.dumps(line))
+    except ScoreError as e:
+        raise click.ClickException(str(e))
+
+
+@cli.command(
+    name='prepare-truth',
+    help='Pre-parse a classification ground truth CSV into a bundle, which can be used in place '
+    'of the CSV to score submissions faster.',
+)
+@click.argument('truth_file', type=FilePath)
+@click.argument('bundle_file', type=OutputFilePath)
+def prepare_truth(truth_file: pathlib.Path, bundle_file: pathlib.Path) -> None:
+    from isic_challenge_scoring.classification import ClassificationTruth
+
+    truth = ClassificationTruth.from_file(truth_file)
+    truth.to_bundle(bundle_file)
+
+
+@cli.command(
+    help='Serve scoring as a local HTTP JSON service, with ground truth preloaded into a pool of '
+    'warm worker processes. Each ground truth is given a NAME, by which submissions are scored '
+    'against it.',
+)
+@click.option(
+    '--classification-truth',
+    'classification_truths',
+    type=(str, FilePath),
+    multiple=True,
+    metavar='NAME TRUTH_FILE',
+    help='A classification ground truth CSV file or bundle.',
+)
+@click.option(
+    '--segmentation-truth',
+    'segmentation_truths',
+    type=(str, FileOrDirectoryPath),
+    multiple=True,
+    metavar='NAME TRUTH_PATH',
+    help='A segmentation ground truth directory or ZIP file.',
+)
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=click.IntRange(min=0, max=65535), default=8000, show_default=True)
+@click.option(
+    '-j',
+    '--jobs',
+    type=click.IntRange(min=1),
+    default=None,
+    help='The number of worker processes. Defaults to the number of CPUs.',
+)
+@click.option(
+    '--max-queued',
+    type=click.IntRange(min=0),
+    default=100,
+    show_default=True,
+    help='The number of submissions which may wait for a worker, before more are rejected.',
+)
+@click.option(
+    '--max-body-size',
+    type=click.IntRange(min=0),
+    default=2**30,
+    show_default=True,
+    help='The largest submission, in bytes, which will be read and scored.',
+)
+def serve(
+    classification_truths: tuple[tuple[str, pathlib.Path], ...],
+    segmentation_truths: tuple[tuple[str, pathlib.Path], ...],
+    host: str,
+    port: int,
+    jobs: int | None,
+    max_queued: int,
+    max_body_size: int,
+) -> None:
+    from isic_challenge_scoring.classification import ClassificationTruth
+    from isic_challenge_scoring.server import ScoringServer
+
+    if not classification_truths and not segmentation_truths:
+        raise click.UsageError('At least one ground truth must be served.')
+
+    try:
+        server = ScoringServer(
+            (host, port),
+            {name: ClassificationTruth.from_file(path) for name, path in classification_truths},
+            dict(segmentation_truths),
+            workers=jobs,
+            max_queued=max_queued,
+            max_body_size=max_body_size,
+        )
+    except ScoreError as e:
+        raise click.ClickException(str(e))
+
+    with server:
+        click.echo(f'Serving on http://{host}:{server.server_address[1]}/', err=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == '__main__':
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import pathlib
+from typing import cast
+
+import numpy as np
+import pandas as pd
+
+from isic_challenge_scoring import metrics, tracing
+from isic_challenge_scoring.confusion import create_binary_confusion_matrices
+from isic_challenge_scoring.pool import spawn_pool
+from isic_challenge_scoring.timings import stage
+from isic_challenge_scoring.types import ClassificationMetric, DataFrameDict, SeriesDict
+
+# Replicates are scored in batches of at most this many, sized so that each (replicates x rows)
+# matrix of a batch has at most REPLICATE_BATCH_ELEMENTS values, so memory use does not grow with
+# the number of replicates. Each replicate has its own seed, so results do not depend on batching.
+MAX_REPLICATE_BATCH_SIZE = 64
+REPLICATE_BATCH_ELEMENTS = 2**22
+
+
+@dataclass
+class ClassificationBootstrap:
+    """The metrics of each bootstrap replicate of a classification score."""
+
+    # The target metric, indexed by replicate
+    overall: pd.Series
+    # Each category's metrics, with a row per replicate
+    auc: pd.DataFrame
+    ap: pd.DataFrame
+
+    @property
+    def replicates(self) -> int:
+        return len(self.overall)
+
+    def overall_interval(self, confidence: float = 0.95) -> pd.Series:
+        """Compute the percentile confidence interval of the target metric."""
+        return pd.Series(
+            self.overall.quantile(_quantiles(confidence)).to_numpy(),
+            index=['lower', 'upper'],
+            name='overall',
+        )
+
+    def per_category_intervals(self, confidence: float = 0.95) -> pd.DataFrame:
+        """Compute the percentile confidence intervals of each category's AUC and AP."""
+        quantiles = _quantiles(confidence)
+        auc_intervals = self.auc.quantile(quantiles)
+        ap_intervals = self.ap.quantile(quantiles)
+        return pd.DataFrame(
+            {
+                'auc_lower': auc_intervals.iloc[0],
+                'auc_upper': auc_intervals.iloc[1],
+                'ap_lower': ap_intervals.iloc[0],
+                'ap_upper': ap_intervals.iloc[1],
+            },
+            index=self.auc.columns,
+            columns=['auc_lower', 'auc_upper', 'ap_lower', 'ap_upper'],
+        )
+
+    def to_string(self, confidence: float = 0.95) -> str:
+        output = (
+            f'Bootstrap {confidence:.0%} confidence intervals, from {self.replicates} replicates:\n'
+        )
+        output += self.overall_interval(confidence).to_string()
+        output += '\n\nPer-category intervals:\n'
+        output += self.per_category_intervals(confidence).to_string()
+        return output
+
+    def to_dict(self, confidence: float = 0.95) -> dict[str, object]:
+        return {
+            'replicates': self.replicates,
+            'confidence': confidence,
+            'overall': cast(SeriesDict, self.overall_interval(confidence).to_dict()),
+            'per_category': cast(DataFrameDict, self.per_category_intervals(confidence).to_dict()),
+        }
+
+
+def _quantiles(confidence: float) -> list[float]:
+    if not (0 < confidence < 1):
+        raise ValueError(f'Out of bounds confidence: {confidence}.')
+    return [(1 - confidence) / 2, (1 + confidence) / 2]
+
+
+@dataclass
+class _BootstrapInputs:
+    """The rows which are resampled, with each category pre-sorted by decreasing prediction."""
+
+    truth_probabilities: pd.DataFrame
+    prediction_probabilities: pd.DataFrame
+    weights: np.ndarray
+    target_metric: ClassificationMetric
+    # Each category's row order, and the last row of each distinct prediction in that order
+    descending_indices: list[np.ndarray]
+    threshold_indices: list[np.ndarray]
+
+    @classmethod
+    def from_probabilities(
+        cls,
+        truth_probabilities: pd.DataFrame,
+        prediction_probabilities: pd.DataFrame,
+        weights: pd.Series,
+        target_metric: ClassificationMetric,
+    ) -> _BootstrapInputs:
+        # Only rows which are weighted for scoring are resampled
+        weighted = weights.to_numpy(dtype=np.float64) != 0.0
+        truth_probabilities = truth_probabilities[weighted]
+        prediction_probabilities = prediction_probabilities[weighted]
+
+        descending_indices = []
+        threshold_indices = []
+        for category in prediction_probabilities.columns:
+            prediction_values = prediction_probabilities[category].to_numpy(dtype=np.float64)
+            # A reversed stable sort matches the tie order used by sklearn
+            category_indices = np.argsort(prediction_values, kind='mergesort')[::-1]
+            distinct_value_indices = np.flatnonzero(np.diff(prediction_values[category_indices]))
+            descending_indices.append(category_indices)
+            threshold_indices.append(np.r_[distinct_value_indices, len(category_indices) - 1])
+
+        return cls(
+            truth_probabilities=truth_probabilities,
+            prediction_probabilities=prediction_probabilities,
+            weights=weights.to_numpy(dtype=np.float64)[weighted],
+            target_metric=target_metric,
+            descending_indices=descending_indices,
+            threshold_indices=threshold_indices,
+        )
+
+    def score_replicates(
+        self, seed_sequences: list[np.random.SeedSequence]
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Draw and score a replicate per seed, returning their target metrics, AUCs and APs.
+
+        Each replicate is represented by how many times each row is resampled, which weights that
+        row, so every replicate is scored at once, from the already sorted rows.
+        """
+        with stage('bootstrap_replicates'):
+            row_count = len(self.weights)
+            # A (replicates x rows) weight matrix, of the uniform draws of rows with replacement
+            replicate_weights = np.empty((len(seed_sequences), row_count), dtype=np.float64)
+            for replicate_index, seed_sequence in enumerate(seed_sequences):
+                draws = np.random.default_rng(seed_sequence).integers(0, row_count, size=row_count)
+                replicate_weights[replicate_index] = np.bincount(draws, minlength=row_count)
+            replicate_weights *= self.weights
+
+            truth_values = self.truth_probabilities.to_numpy() > 0.5
+            category_metrics = [
+                metrics.batch_ranking_metrics(
+                    truth_values[category_indices, category_index],
+                    category_thresholds,
+                    replicate_weights[:, category_indices],
+                )
+                for category_index, (category_indices, category_thresholds) in enumerate(
+                    zip(self.descending_indices, self.threshold_indices)
+                )
+            ]
+            auc = np.column_stack([category_auc for category_auc, _ in category_metrics])
+            ap = np.column_stack([category_ap for _, category_ap in category_metrics])
+
+            if self.target_metric == ClassificationMetric.BALANCED_ACCURACY:
+                overall = metrics.batch_balanced_multiclass_accuracy(
+                    self.truth_probabilities,
+                    self.prediction_probabilities,
+                    pd.DataFrame(replicate_weights.T, copy=False),
+                ).to_numpy()
+            elif self.target_metric == ClassificationMetric.AVERAGE_PRECISION:
+                overall = pd.DataFrame(ap).mean(axis='columns').to_numpy()
+            elif self.target_metric == ClassificationMetric.AUC:
+                overall = pd.DataFrame(auc).mean(axis='columns').to_numpy()
+            elif self.target_metric == ClassificationMetric.DICE:
+                cms = create_binary_confusion_matrices(
+                    truth_values,
+                    self.prediction_probabilities.to_numpy() > 0.5,
+                    replicate_weights.T,
+                )
+                overall = metrics.batch_binary_dice(cms).mean(axis=1)
+        return overall, auc, ap
+
+
+def bootstrap_classification(
+    truth_probabilities: pd.DataFrame,
+    prediction_probabilities: pd.DataFrame,
+    weights: pd.Series,
+    target_metric: ClassificationMetric,
+    replicates: int,
+    seed: int = 0,
+    workers: int = 1,
+) -> ClassificationBootstrap:
+    """
+    Score replicates of a classification submission, with rows resampled with replacement.
+
+    Replicates are reproducible from the seed, regardless of the number of workers. If workers is
+    greater than 1, batches of replicates are scored in that many parallel processes.
+    """
+    if replicates < 1:
+        raise ValueError('At least one bootstrap replicate is required.')
+
+    inputs = _BootstrapInputs.from_probabilities(
+        truth_probabilities, prediction_probabilities, weights, target_metric
+    )
+    seed_sequences = np.random.SeedSequence(seed).spawn(replicates)
+    batch_size = max(
+        1, min(MAX_REPLICATE_BATCH_SIZE, REPLICATE_BATCH_ELEMENTS // max(len(inputs.weights), 1))
+    )
+    batches = [
+        seed_sequences[start : start + batch_size] for start in range(0, replicates, batch_size)
+    ]
+
+    if workers > 1 and len(batches) > 1:
+        with spawn_pool(
+            min(workers, len(batches)),
+            _init_bootstrap_worker,
+            (inputs, tracing.current_file(), tracing.current_args()),
+        ) as executor:
+            batch_scores = list(executor.map(_score_worker_replicates, batches))
+    else:
+        batch_scores = [inputs.score_replicates(batch) for batch in batches]
+
+    categories = truth_probabilities.columns
+    return ClassificationBootstrap(
+        overall=pd.Series(
+            np.concatenate([overall for overall, _, _ in batch_scores]), name='overall'
+        ),
+        auc=pd.DataFrame(np.vstack([auc for _, auc, _ in batch_scores]), columns=categories),
+        ap=pd.DataFrame(np.vstack([ap for _, _, ap in batch_scores]), columns=categories),
+    )
+
+
+# The inputs of each bootstrap_classification worker process
+_bootstrap_inputs: _BootstrapInputs | None = None
+
+
+def _init_bootstrap_worker(
+    inputs: _BootstrapInputs, trace_file: pathlib.Path | None, trace_args: dict[str, str]
+) -> None:
+    global _bootstrap_inputs
+    _bootstrap_inputs = inputs
+    tracing.attach(trace_file, trace_args)
+
+
+def _score_worker_replicates(
+    seed_sequences: list[np.random.SeedSequence],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    assert _bootstrap_inputs is not None
+    return _bootstrap_inputs.score_replicates(seed_sequences)
@@ -1,31 +1,256 @@
 from __future__ import annotations
 
+from collections.abc import Iterable, Iterator
+from concurrent.futures import as_completed
 from dataclasses import dataclass
-import enum
+from functools import cached_property
+from multiprocessing.shared_memory import SharedMemory
 import pathlib
-from typing import TextIO, cast
+import tempfile
+from typing import Any, TextIO, cast
 
+import numpy as np
 import pandas as pd
 
-from isic_challenge_scoring import metrics
-from isic_challenge_scoring.confusion import create_binary_confusion_matrix
-from isic_challenge_scoring.load_csv import parse_csv, parse_truth_csv, sort_rows, validate_rows
-from isic_challenge_scoring.types import DataFrameDict, RocDict, Score, ScoreDict, SeriesDict
+from isic_challenge_scoring import metrics, tracing
+from isic_challenge_scoring.bootstrap import ClassificationBootstrap, bootstrap_classification
+from isic_challenge_scoring.confusion import create_binary_confusion_matrices
+from isic_challenge_scoring.load_csv import (
+    align_rows,
+    parse_aligned_csv,
+    parse_csv,
+    parse_truth_csv,
+    sort_rows,
+)
+from isic_challenge_scoring.pool import spawn_pool
+from isic_challenge_scoring.timings import stage
+from isic_challenge_scoring.truth_bundle import (
+    is_truth_bundle,
+    read_truth_bundle,
+    write_truth_bundle,
+)
+from isic_challenge_scoring.types import (
+    ClassificationMetric,
+    DataFrameDict,
+    RocDict,
+    Score,
+    ScoreDict,
+    ScoreError,
+    SeriesDict,
+    lazy_score_fields,
+)
 
 
-class ClassificationMetric(enum.Enum):
-    BALANCED_ACCURACY = 'balanced_accuracy'
-    AUC = 'auc'
-    AVERAGE_PRECISION = 'ap'
-    DICE = 'dice'
+@dataclass
+class ClassificationTruth:
+    """Parsed classification ground truth, with rows sorted by image."""
+
+    probabilities: pd.DataFrame
+    weights: pd.DataFrame
+
+    @classmethod
+    def from_stream(cls, truth_file_stream: TextIO) -> ClassificationTruth:
+        probabilities, weights = parse_truth_csv(truth_file_stream)
+
+        sort_rows(probabilities)
+        sort_rows(weights)
+
+        return cls(probabilities=probabilities, weights=weights)
+
+    @classmethod
+    def from_bundle(cls, bundle_file: pathlib.Path) -> ClassificationTruth:
+        metadata, arrays = read_truth_bundle(bundle_file)
+
+        index = pd.Index(arrays['index'], dtype=object, name=metadata['index_name'])
+        categories = pd.Index(metadata['categories'], dtype=object)
+
+        return cls(
+            # Wrap the memory-mapped arrays without copying them
+            probabilities=pd.DataFrame(
+                arrays['probabilities'], index=index, columns=categories, copy=False
+            ),
+            weights=pd.DataFrame(
+                arrays['weights'],
+                index=index,
+                columns=pd.Index(metadata['weight_names'], dtype=object),
+                copy=False,
+            ),
+        )
+
+    @classmethod
+    def from_file(cls, truth_file: pathlib.Path) -> ClassificationTruth:
+        """Load ground truth from either a CSV file or a bundle."""
+        if is_truth_bundle(truth_file):
+            return cls.from_bundle(truth_file)
+        with truth_file.open('r') as truth_file_stream:
+            return cls.from_stream(truth_file_stream)
+
+    def to_bundle(self, bundle_file: pathlib.Path) -> None:
+        write_truth_bundle(
+            bundle_file,
+            {
+                'index_name': self.probabilities.index.name,
+                'categories': self.probabilities.columns.tolist(),
+                'weight_names': self.weights.columns.tolist(),
+            },
+            {
+                # A fixed-width unicode array, which needs no decoding when loaded
+                'index': self.probabilities.index.to_numpy(dtype=str),
+                'probabilities': self.probabilities.to_numpy(dtype=np.float64),
+                'weights': self.weights.to_numpy(dtype=np.float64),
+            },
+        )
+
+
+@dataclass
+class _CategoryScore:
+    """
+    The ranking metrics of a single category, which are computed independently of others.
+
+    Each metric is computed on first access, then memoized, from rankings which share a single
+    sort of the category.
+    """
+
+    # Keyed by weight column
+    rankings: dict[str, metrics.CategoryRanking]
+    roc_points: int | None = None
+
+    @classmethod
+    def from_probabilities(
+        cls,
+        truth_probabilities: pd.Series,
+        prediction_probabilities: pd.Series,
+        truth_weights: pd.DataFrame,
+        roc_points: int | None = None,
+    ) -> _CategoryScore:
+        # The category is sorted only once, then shared by all the ranking metrics, the ROC and
+        # every weight column
+        rankings = metrics.CategoryRanking.from_weights(
+            truth_probabilities, prediction_probabilities, truth_weights
+        )
+        return cls(rankings=rankings, roc_points=roc_points)
+
+    # Keyed by weight column
+    @cached_property
+    def auc(self) -> dict[str, float]:
+        with stage('ranking_metrics'):
+            return {weight_name: ranking.auc() for weight_name, ranking in self.rankings.items()}
+
+    # Keyed by weight column
+    @cached_property
+    def ap(self) -> dict[str, float]:
+        with stage('ranking_metrics'):
+            return {
+                weight_name: ranking.average_precision()
+                for weight_name, ranking in self.rankings.items()
+            }
+
+    @cached_property
+    def auc_sens_80(self) -> float:
+        with stage('ranking_metrics'):
+            return self.rankings['score_weight'].auc_above_sensitivity(0.80)
+
+    @cached_property
+    def roc(self) -> pd.DataFrame:
+        with stage('ranking_metrics'):
+            return self.rankings['score_weight'].roc(self.roc_points)
+
+
+def _score_categories_parallel(
+    truth_probabilities: pd.DataFrame,
+    prediction_probabilities: pd.DataFrame,
+    truth_weights: pd.DataFrame,
+    workers: int,
+    roc_points: int | None,
+) -> list[_CategoryScore]:
+    """
+    Rank each category in a separate worker process, sharing the inputs through memory.
+
+    Only the sorting and cumulative sums are done by workers; the rankings are returned, so each
+    metric is still only computed if it is needed.
+    """
+    arrays = {
+        # Each category is contiguous
+        'truth': truth_probabilities.to_numpy(dtype=np.float64).T,
+        'prediction': prediction_probabilities.to_numpy(dtype=np.float64).T,
+        'weights': truth_weights.to_numpy(dtype=np.float64),
+    }
+    layout: dict[str, tuple[tuple[int, ...], int]] = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = (array.shape, offset)
+        offset += array.nbytes
+
+    shared_memory = SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for name, array in arrays.items():
+            shape, offset = layout[name]
+            np.ndarray(shape, dtype=np.float64, buffer=shared_memory.buf, offset=offset)[:] = array
+
+        with spawn_pool(
+            min(workers, len(truth_probabilities.columns)),
+            _init_category_worker,
+            (
+                shared_memory.name,
+                layout,
+                truth_weights.columns,
+                roc_points,
+                tracing.current_file(),
+                tracing.current_args(),
+            ),
+        ) as executor:
+            return list(
+                executor.map(_score_shared_category, range(len(truth_probabilities.columns)))
+            )
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+
+# The shared inputs of each _score_categories_parallel worker process
+_category_shared_memory: SharedMemory | None = None
+_category_arrays: dict[str, np.ndarray] = {}
+_category_weight_names: pd.Index | None = None
+_category_roc_points: int | None = None
+
+
+def _init_category_worker(
+    shared_memory_name: str,
+    layout: dict[str, tuple[tuple[int, ...], int]],
+    weight_names: pd.Index,
+    roc_points: int | None,
+    trace_file: pathlib.Path | None,
+    trace_args: dict[str, str],
+) -> None:
+    global _category_shared_memory, _category_weight_names, _category_roc_points
+    tracing.attach(trace_file, trace_args)
+    # The creating process is responsible for unlinking the shared memory
+    _category_shared_memory = SharedMemory(name=shared_memory_name, track=False)
+    for name, (shape, offset) in layout.items():
+        _category_arrays[name] = np.ndarray(
+            shape, dtype=np.float64, buffer=_category_shared_memory.buf, offset=offset
+        )
+    _category_weight_names = weight_names
+    _category_roc_points = roc_points
+
+
+def _score_shared_category(category_index: int) -> _CategoryScore:
+    return _CategoryScore.from_probabilities(
+        pd.Series(_category_arrays['truth'][category_index], copy=False),
+        pd.Series(_category_arrays['prediction'][category_index], copy=False),
+        pd.DataFrame(_category_arrays['weights'], columns=_category_weight_names, copy=False),
+        _category_roc_points,
+    )
 
 
 @dataclass(init=False)
 class ClassificationScore(Score):
-    per_category: pd.DataFrame
-    macro_average: pd.Series
-    rocs: dict[str, pd.DataFrame]
-    aggregate: pd.Series
+    """
+    A classification score.
+
+    Only "overall" is computed on construction; every other metric is computed on first access,
+    and then memoized.
+    """
 
     def __init__(
         self,
@@ -33,133 +258,177 @@ class ClassificationScore(Score):
         prediction_probabilities: pd.DataFrame,
         truth_weights: pd.DataFrame,
         target_metric: ClassificationMetric,
+        workers: int = 1,
+        roc_points: int | None = None,
     ) -> None:
-        categories = truth_probabilities.columns
-
-        self.per_category = pd.DataFrame(
-            [
-                self._category_score(
-                    truth_probabilities[category],
-                    prediction_probabilities[category],
-                    truth_weights['score_weight'],
-                    category,
+        self._truth_probabilities = truth_probabilities
+        self._prediction_probabilities = prediction_probabilities
+        self._truth_weights = truth_weights
+        self._target_metric = target_metric
+        self._workers = workers
+        self._roc_points = roc_points
+
+        self.overall = self.per_weight.at['score_weight']
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Compute every metric, so the inputs don't need to be pickled
+        self._compute_metrics()
+        return {name: value for name, value in self.__dict__.items() if not name.startswith('_')}
+
+    def _compute_metrics(self) -> None:
+        for name in lazy_score_fields(type(self)):
+            getattr(self, name)
+
+    @cached_property
+    def _category_scores(self) -> dict[str, _CategoryScore]:
+        with stage('ranking_metrics'):
+            return self._score_categories()
+
+    def _score_categories(self) -> dict[str, _CategoryScore]:
+        categories = self._truth_probabilities.columns
+        if self._workers > 1 and len(categories) > 1:
+            category_scores = _score_categories_parallel(
+                self._truth_probabilities,
+                self._prediction_probabilities,
+                self._truth_weights,
+                self._workers,
+                self._roc_points,
+            )
+        else:
+            category_scores = [
+                _CategoryScore.from_probabilities(
+                    self._truth_probabilities[category],
+                    self._prediction_probabilities[category],
+                    self._truth_weights,
+                    self._roc_points,
                 )
                 for category in categories
             ]
-        )
-        self.macro_average = self.per_category.mean(axis='index').rename('macro_average')
-        self.rocs = {
-            category: metrics.roc(
-                truth_probabilities[category],
-                prediction_probabilities[category],
-                truth_weights['score_weight'],
+        return dict(zip(categories, category_scores))
+
+    @cached_property
+    def _cms(self) -> dict[str, np.ndarray]:
+        # Every category's confusion matrix, for every weight column, is computed in a single pass
+        with stage('confusion_matrices'):
+            weighted_cms = create_binary_confusion_matrices(
+                self._truth_probabilities.to_numpy() > 0.5,
+                self._prediction_probabilities.to_numpy() > 0.5,
+                self._truth_weights.to_numpy(),
             )
-            for category in categories
-        }
-        # Multi-category aggregate metrics
-        self.aggregate = pd.Series(
-            {
-                'balanced_accuracy': metrics.balanced_multiclass_accuracy(
-                    truth_probabilities, prediction_probabilities, truth_weights['score_weight']
-                )
-            },
+        return dict(zip(self._truth_weights.columns, weighted_cms))
+
+    @cached_property
+    def _balanced_accuracies(self) -> pd.Series:
+        # Multi-category aggregate metrics, for all weight columns at once
+        with stage('balanced_accuracy'):
+            return metrics.batch_balanced_multiclass_accuracy(
+                self._truth_probabilities, self._prediction_probabilities, self._truth_weights
+            )
+
+    @cached_property
+    def per_category(self) -> pd.DataFrame:
+        return self._per_category_scores(
+            self._cms['score_weight'], self._category_scores, self._truth_probabilities.columns
+        )
+
+    @cached_property
+    def macro_average(self) -> pd.Series:
+        # Metrics which are undefined (NaN) for a category, such as the AUC of a category with no
+        # truly positive images, are excluded from the mean
+        return self.per_category.mean(axis='index').rename('macro_average')
+
+    @cached_property
+    def rocs(self) -> dict[str, pd.DataFrame]:
+        return {category: score.roc for category, score in self._category_scores.items()}
+
+    @cached_property
+    def aggregate(self) -> pd.Series:
+        return pd.Series(
+            {'balanced_accuracy': self._balanced_accuracies.at['score_weight']},
             index=['balanced_accuracy'],
             name='aggregate',
         )
 
-        if target_metric == ClassificationMetric.BALANCED_ACCURACY:
-            self.overall = self.aggregate.at['balanced_accuracy']
-            self.validation = metrics.balanced_multiclass_accuracy(
-                truth_probabilities, prediction_probabilities, truth_weights['validation_weight']
+    @cached_property
+    def per_weight(self) -> pd.Series:
+        """The target metric, for each weight column."""
+        categories = self._truth_probabilities.columns
+        weight_names = self._truth_weights.columns
+
+        if self._target_metric == ClassificationMetric.BALANCED_ACCURACY:
+            per_weight = self._balanced_accuracies
+        elif self._target_metric == ClassificationMetric.AVERAGE_PRECISION:
+            per_weight = pd.Series(
+                {
+                    weight_name: pd.Series(
+                        [self._category_scores[category].ap[weight_name] for category in categories]
+                    ).mean()
+                    for weight_name in weight_names
+                }
             )
-        elif target_metric == ClassificationMetric.AVERAGE_PRECISION:
-            self.overall = self.macro_average.at['ap']
-            per_category_ap = pd.Series(
-                [
-                    metrics.average_precision(
-                        truth_probabilities[category],
-                        prediction_probabilities[category],
-                        truth_weights['validation_weight'],
-                    )
-                    for category in categories
-                ]
+        elif self._target_metric == ClassificationMetric.AUC:
+            per_weight = pd.Series(
+                {
+                    weight_name: pd.Series(
+                        [
+                            self._category_scores[category].auc[weight_name]
+                            for category in categories
+                        ]
+                    ).mean()
+                    for weight_name in weight_names
+                }
             )
-            self.validation = per_category_ap.mean()
-        elif target_metric == ClassificationMetric.AUC:
-            self.overall = self.macro_average.at['auc']
-            per_category_auc = pd.Series(
-                [
-                    metrics.auc(
-                        truth_probabilities[category],
-                        prediction_probabilities[category],
-                        truth_weights['validation_weight'],
-                    )
-                    for category in categories
-                ]
+        elif self._target_metric == ClassificationMetric.DICE:
+            per_weight = pd.Series(
+                {
+                    weight_name: pd.Series(metrics.batch_binary_dice(self._cms[weight_name])).mean()
+                    for weight_name in weight_names
+                }
             )
-            self.validation = per_category_auc.mean()
-        elif target_metric == ClassificationMetric.DICE:
-            self.overall = self.macro_average.at['dice']
-            per_category_dice = pd.Series(
-                [
-                    metrics.binary_dice(
-                        create_binary_confusion_matrix(
-                            truth_binary_values=truth_probabilities[category].gt(0.5).to_numpy(),
-                            prediction_binary_values=prediction_probabilities[category]
-                            .gt(0.5)
-                            .to_numpy(),
-                            weights=truth_weights['validation_weight'].to_numpy(),
-                            name=category,
-                        )
-                    )
-                    for category in categories
-                ]
+        return per_weight.rename('per_weight')
+
+    @cached_property  # type: ignore[misc]
+    def validation(self) -> float:  # type: ignore[override]
+        return self.per_weight.at['validation_weight']
+
+    def bootstrap(
+        self, replicates: int, seed: int = 0, workers: int | None = None
+    ) -> ClassificationBootstrap:
+        """
+        Compute the target metric and each category's AUC and AP, over bootstrap replicates.
+
+        Each replicate resamples the scored rows with replacement, and is reproducible from the
+        seed. By default, replicates are scored with the same number of workers as this score.
+        """
+        with stage('bootstrap'):
+            return bootstrap_classification(
+                self._truth_probabilities,
+                self._prediction_probabilities,
+                self._truth_weights['score_weight'],
+                self._target_metric,
+                replicates,
+                seed,
+                self._workers if workers is None else workers,
             )
-            self.validation = per_category_dice.mean()
 
     @staticmethod
-    def _category_score(
-        truth_category_probabilities: pd.Series,
-        prediction_category_probabilities: pd.Series,
-        truth_score_weights: pd.Series,
-        category: str,
-    ) -> pd.Series:
-        truth_binary_values: pd.Series = truth_category_probabilities.gt(0.5)
-        prediction_binary_values: pd.Series = prediction_category_probabilities.gt(0.5)
-
-        category_cm = create_binary_confusion_matrix(
-            truth_binary_values=truth_binary_values.to_numpy(),
-            prediction_binary_values=prediction_binary_values.to_numpy(),
-            weights=truth_score_weights.to_numpy(),
-            name=category,
-        )
-
-        return pd.Series(
+    def _per_category_scores(
+        cms: np.ndarray, scores: dict[str, _CategoryScore], categories: pd.Index
+    ) -> pd.DataFrame:
+        return pd.DataFrame(
             {
-                'accuracy': metrics.binary_accuracy(category_cm),
-                'sensitivity': metrics.binary_sensitivity(category_cm),
-                'specificity': metrics.binary_specificity(category_cm),
-                'dice': metrics.binary_dice(category_cm),
-                'ppv': metrics.binary_ppv(category_cm),
-                'npv': metrics.binary_npv(category_cm),
-                'auc': metrics.auc(
-                    truth_category_probabilities,
-                    prediction_category_probabilities,
-                    truth_score_weights,
-                ),
-                'auc_sens_80': metrics.auc_above_sensitivity(
-                    truth_category_probabilities,
-                    prediction_category_probabilities,
-                    truth_score_weights,
-                    0.80,
-                ),
-                'ap': metrics.average_precision(
-                    truth_category_probabilities,
-                    prediction_category_probabilities,
-                    truth_score_weights,
-                ),
+                'accuracy': metrics.batch_binary_accuracy(cms),
+                'sensitivity': metrics.batch_binary_sensitivity(cms),
+                'specificity': metrics.batch_binary_specificity(cms),
+                'dice': metrics.batch_binary_dice(cms),
+                'ppv': metrics.batch_binary_ppv(cms),
+                'npv': metrics.batch_binary_npv(cms),
+                'auc': [scores[category].auc['score_weight'] for category in categories],
+                'auc_sens_80': [scores[category].auc_sens_80 for category in categories],
+                'ap': [scores[category].ap['score_weight'] for category in categories],
             },
-            index=[
+            index=categories,
+            columns=[
                 'accuracy',
                 'sensitivity',
                 'specificity',
@@ -170,7 +439,6 @@ class ClassificationScore(Score):
                 'auc_sens_80',
                 'ap',
             ],
-            name=category,
         )
 
     def to_string(self) -> str:
@@ -181,6 +449,8 @@ class ClassificationScore(Score):
         output += self.macro_average.to_string()
         output += '\n\nAggregate metrics:\n'
         output += self.aggregate.to_string()
+        output += '\n\nTarget metric per weight:\n'
+        output += self.per_weight.to_string()
         return output
 
     def to_dict(self, rocs: bool = True) -> ScoreDict:
@@ -190,6 +460,7 @@ class ClassificationScore(Score):
                 'per_category': cast(DataFrameDict, self.per_category.to_dict()),
                 'macro_average': cast(SeriesDict, self.macro_average.to_dict()),
                 'aggregate': cast(SeriesDict, self.aggregate.to_dict()),
+                'per_weight': cast(SeriesDict, self.per_weight.to_dict()),
             }
         )
         if rocs:
@@ -204,37 +475,205 @@ class ClassificationScore(Score):
         return output
 
     @classmethod
-    def from_stream(
+    def from_truth(
         cls,
-        truth_file_stream: TextIO,
+        truth: ClassificationTruth,
         prediction_file_stream: TextIO,
         target_metric: ClassificationMetric,
+        chunk_size: int | None = None,
+        prediction_buffer: np.ndarray | None = None,
+        workers: int = 1,
+        roc_points: int | None = None,
     ) -> ClassificationScore:
-        truth_probabilities, truth_weights = parse_truth_csv(truth_file_stream)
-        categories = truth_probabilities.columns
-        prediction_probabilities = parse_csv(prediction_file_stream, categories)
+        """
+        Score a prediction CSV stream against already loaded ground truth.
 
-        validate_rows(truth_probabilities, prediction_probabilities)
+        If chunk_size is set, the prediction CSV is read that many rows at a time, directly into
+        prediction_buffer (e.g. an np.memmap) if it is provided, to bound peak memory usage.
 
-        sort_rows(truth_probabilities)
-        sort_rows(prediction_probabilities)
+        If workers is greater than 1, categories are scored in that many parallel processes.
 
-        score = cls(truth_probabilities, prediction_probabilities, truth_weights, target_metric)
+        If roc_points is set, ROCs are downsampled to at most that many points, rather than
+        simplified with the Ramer-Douglas-Peucker algorithm.
+        """
+        if chunk_size is None:
+            prediction_probabilities = parse_csv(
+                prediction_file_stream, truth.probabilities.columns
+            )
+            prediction_probabilities = align_rows(
+                truth.probabilities.index, prediction_probabilities
+            )
+        else:
+            prediction_probabilities = parse_aligned_csv(
+                prediction_file_stream,
+                truth.probabilities.index,
+                truth.probabilities.columns,
+                chunk_size,
+                prediction_buffer,
+            )
+
+        score = cls(
+            truth.probabilities,
+            prediction_probabilities,
+            truth.weights,
+            target_metric,
+            workers,
+            roc_points,
+        )
         return score
 
+    @classmethod
+    def from_stream(
+        cls,
+        truth_file_stream: TextIO,
+        prediction_file_stream: TextIO,
+        target_metric: ClassificationMetric,
+        chunk_size: int | None = None,
+        workers: int = 1,
+        roc_points: int | None = None,
+    ) -> ClassificationScore:
+        truth = ClassificationTruth.from_stream(truth_file_stream)
+        return cls.from_truth(
+            truth,
+            prediction_file_stream,
+            target_metric,
+            chunk_size,
+            workers=workers,
+            roc_points=roc_points,
+        )
+
     @classmethod
     def from_file(
         cls,
         truth_file: pathlib.Path,
         prediction_file: pathlib.Path,
         target_metric: ClassificationMetric,
+        chunk_size: int | None = None,
+        workers: int = 1,
+        roc_points: int | None = None,
+        memmap: bool = False,
     ) -> ClassificationScore:
-        with (
-            truth_file.open('r') as truth_file_stream,
-            prediction_file.open('r') as prediction_file_stream,
-        ):
-            return cls.from_stream(
-                truth_file_stream,
+        """
+        Score a prediction CSV file, against either a truth CSV file or a truth bundle.
+
+        If memmap is set, the prediction CSV is read in chunks (of chunk_size rows) into a
+        temporary memory-mapped file, rather than into memory, so very large predictions can be
+        paged out.
+        """
+        if memmap and chunk_size is None:
+            raise ValueError('A memory-mapped prediction buffer requires a chunk_size.')
+
+        truth = ClassificationTruth.from_file(truth_file)
+        prediction_buffer = (
+            _temporary_memmap((len(truth.probabilities.index), len(truth.probabilities.columns)))
+            if memmap
+            else None
+        )
+        with prediction_file.open('r') as prediction_file_stream:
+            return cls.from_truth(
+                truth,
                 prediction_file_stream,
                 target_metric,
+                chunk_size,
+                prediction_buffer,
+                workers=workers,
+                roc_points=roc_points,
+            )
+
+    @classmethod
+    def score_many(
+        cls,
+        truth_file: pathlib.Path,
+        prediction_files: Iterable[pathlib.Path],
+        target_metric: ClassificationMetric,
+        workers: int | None = None,
+    ) -> Iterator[tuple[pathlib.Path, ClassificationScore | ScoreError]]:
+        """
+        Score many prediction CSV files against the same ground truth.
+
+        The ground truth is loaded only once, then memory-mapped from a bundle by each worker
+        process. Results are yielded as each submission finishes, so not necessarily in the order
+        of "prediction_files". A submission which fails to score yields its ScoreError, rather
+        than raising it.
+        """
+        prediction_files = list(prediction_files)
+        # Any problem with the ground truth is raised immediately, rather than by the first result
+        truth = ClassificationTruth.from_file(truth_file)
+
+        if workers == 1:
+            return (
+                (prediction_file, _score_prediction(truth, prediction_file, target_metric))
+                for prediction_file in prediction_files
             )
+        return _score_many_parallel(truth, truth_file, prediction_files, target_metric, workers)
+
+
+def _score_many_parallel(
+    truth: ClassificationTruth,
+    truth_file: pathlib.Path,
+    prediction_files: list[pathlib.Path],
+    target_metric: ClassificationMetric,
+    workers: int | None,
+) -> Iterator[tuple[pathlib.Path, ClassificationScore | ScoreError]]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Workers memory-map a bundle, rather than each being sent a copy of the ground truth
+        if is_truth_bundle(truth_file):
+            bundle_file = truth_file
+        else:
+            bundle_file = pathlib.Path(temp_dir) / 'truth.bundle'
+            truth.to_bundle(bundle_file)
+
+        with spawn_pool(
+            workers, _init_batch_worker, (bundle_file, tracing.current_file())
+        ) as executor:
+            futures = {
+                executor.submit(_score_batch_prediction, prediction_file, target_metric): (
+                    prediction_file
+                )
+                for prediction_file in prediction_files
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+
+def _temporary_memmap(shape: tuple[int, int]) -> np.memmap:
+    """Create a float64 array, backed by an anonymous temporary file."""
+    with tempfile.TemporaryFile() as buffer_file:
+        # The mapping remains valid after the file is closed, and deleted
+        return np.memmap(buffer_file, dtype=np.float64, mode='w+', shape=shape)
+
+
+def _score_prediction(
+    truth: ClassificationTruth,
+    prediction_file: pathlib.Path,
+    target_metric: ClassificationMetric,
+) -> ClassificationScore | ScoreError:
+    with (
+        tracing.span_args(submission=prediction_file.name),
+        stage('score_submission'),
+    ):
+        try:
+            with prediction_file.open('r') as prediction_file_stream:
+                score = ClassificationScore.from_truth(truth, prediction_file_stream, target_metric)
+        except ScoreError as e:
+            return e
+        # Compute every metric within the submission's stage, rather than lazily
+        score._compute_metrics()
+    return score
+
+
+# The ground truth of each ClassificationScore.score_many worker process
+_batch_truth: ClassificationTruth | None = None
+
+
+def _init_batch_worker(bundle_file: pathlib.Path, trace_file: pathlib.Path | None) -> None:
+    global _batch_truth
+    _batch_truth = ClassificationTruth.from_bundle(bundle_file)
+    tracing.attach(trace_file, {})
+
+
+def _score_batch_prediction(
+    prediction_file: pathlib.Path, target_metric: ClassificationMetric
+) -> ClassificationScore | ScoreError:
+    assert _batch_truth is not None
+    return _score_prediction(_batch_truth, prediction_file, target_metric)
@@ -46,5 +46,96 @@ def create_binary_confusion_matrix(
     return cm
 
 
+class MaskConfusionKernel:
+    """
+    Compute the confusion matrices of segmentation images, thresholded into binary masks.
+
+    Masks are thresholded into scratch buffers, which are reused for every pair of images (and
+    only grown for a larger image), and then only counted, so scoring a pair allocates no
+    image-sized arrays. Since the buffers are shared, an instance must not be used concurrently.
+    """
+
+    def __init__(self) -> None:
+        self._truth_mask = np.empty(0, dtype=bool)
+        self._prediction_mask = np.empty(0, dtype=bool)
+
+    def __call__(
+        self,
+        truth_image: np.ndarray,
+        prediction_image: np.ndarray,
+        threshold: int = 128,
+        name: str | tuple[str, ...] | None = None,
+    ) -> pd.Series:
+        """
+        Compute the confusion matrix of pixels greater than threshold, from uint8 images.
+
+        The result is the same as "create_binary_confusion_matrix" of the thresholded images.
+        """
+        pixel_count = truth_image.size
+        if self._truth_mask.size < pixel_count:
+            self._truth_mask = np.empty(pixel_count, dtype=bool)
+            self._prediction_mask = np.empty(pixel_count, dtype=bool)
+        truth_mask = np.greater(truth_image.ravel(), threshold, out=self._truth_mask[:pixel_count])
+        prediction_mask = np.greater(
+            prediction_image.ravel(), threshold, out=self._prediction_mask[:pixel_count]
+        )
+
+        truth_positive = np.count_nonzero(truth_mask)
+        prediction_positive = np.count_nonzero(prediction_mask)
+        # The truth mask is no longer needed, so is overwritten
+        true_positive = np.count_nonzero(
+            np.logical_and(truth_mask, prediction_mask, out=truth_mask)
+        )
+        # Every other count follows from the marginal counts
+        false_positive = prediction_positive - true_positive
+        false_negative = truth_positive - true_positive
+        true_negative = pixel_count - true_positive - false_positive - false_negative
+
+        return pd.Series(
+            {'TP': true_positive, 'TN': true_negative, 'FP': false_positive, 'FN': false_negative},
+            name=name,
+        )
+
+
 def normalize_confusion_matrix(cm: pd.Series) -> pd.Series:
     return cm / cm.sum()
+
+
+def create_binary_confusion_matrices(
+    truth_binary_values: np.ndarray,
+    prediction_binary_values: np.ndarray,
+    weights: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute the weighted confusion matrices of many categories at once.
+
+    The binary values are (rows x categories) matrices. Weights may be a single vector, or a
+    (rows x weight vectors) matrix to compute the matrices for several weightings at once.
+
+    Returns an array of shape (categories, 4) or (weight vectors, categories, 4), where the last
+    axis is ordered as 'TP', 'TN', 'FP', 'FN'.
+    """
+    row_count, category_count = truth_binary_values.shape
+    weight_matrix = weights.reshape(row_count, -1)
+
+    # Encode each cell as 0=TN, 1=FP, 2=FN, 3=TP, offset by 4 for each category, so a single
+    # bincount accumulates every category's matrix without any per-outcome temporaries
+    cell_indices = truth_binary_values.astype(np.intp) << 1
+    cell_indices |= prediction_binary_values
+    cell_indices += np.arange(0, 4 * category_count, 4, dtype=np.intp)
+    cell_indices = cell_indices.ravel()
+
+    cms = np.stack(
+        [
+            np.bincount(
+                cell_indices,
+                weights=np.repeat(weight_vector, category_count),
+                minlength=4 * category_count,
+            ).reshape(category_count, 4)
+            for weight_vector in weight_matrix.T
+        ]
+    )
+    # Reorder to 'TP', 'TN', 'FP', 'FN'
+    cms = cms[..., [3, 0, 1, 2]]
+
+    return cms if weights.ndim > 1 else cms[0]
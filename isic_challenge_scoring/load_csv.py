@@ -1,13 +1,16 @@
+from collections.abc import Iterator
 from typing import TextIO
 
 import numpy as np
 import pandas as pd
 
+from isic_challenge_scoring.timings import stage
 from isic_challenge_scoring.types import ScoreError
 
 
 def parse_truth_csv(csv_file_stream: TextIO) -> tuple[pd.DataFrame, pd.DataFrame]:
-    table = pd.read_csv(csv_file_stream, header=0, index_col=False)
+    with stage('read_truth_csv'):
+        table = pd.read_csv(csv_file_stream, header=0, index_col=False)
 
     if 'image' in table.columns:
         index_name = 'image'
@@ -27,13 +30,181 @@ def parse_truth_csv(csv_file_stream: TextIO) -> tuple[pd.DataFrame, pd.DataFrame
         # TODO: Move this to ground truth
         table.loc['ISIC_0035068', ['score_weight', 'validation_weight']] = 0.0
 
-    probabilities = table.drop(columns=['score_weight', 'validation_weight'])
-    weights = table[['score_weight', 'validation_weight']]
+    # Any additional weight columns (e.g. for public / private splits) are scored too
+    weight_columns = ['score_weight', 'validation_weight'] + [
+        column
+        for column in table.columns
+        if column.endswith('_weight') and column not in {'score_weight', 'validation_weight'}
+    ]
+
+    probabilities = table.drop(columns=weight_columns)
+    weights = table[weight_columns]
 
     return probabilities, weights
 
 
 def parse_csv(csv_file_stream: TextIO, categories: pd.Index) -> pd.DataFrame:
+    probabilities = next(_read_csv_chunks(csv_file_stream, chunk_size=None))
+
+    with stage('validate_csv'):
+        return _validate_csv(probabilities, categories)
+
+
+def _validate_csv(probabilities: pd.DataFrame, categories: pd.Index) -> pd.DataFrame:
+    index_name = _get_index_name(probabilities.columns)
+
+    images = _normalize_images(probabilities[index_name])
+
+    if not images.is_unique:
+        duplicate_images = images[images.duplicated()].unique()
+        raise ScoreError(f'Duplicate image rows detected in CSV: {duplicate_images.tolist()}.')
+
+    # The duplicate check is the same as performed by 'verify_integrity'
+    probabilities = probabilities.drop(columns=index_name).set_axis(images, axis='index')
+
+    _validate_columns(probabilities.columns, categories)
+
+    # sort by the order in categories
+    probabilities = probabilities.reindex(categories, axis='columns')
+
+    # Validate the whole matrix at once, using boolean masks over its underlying values
+    non_float_columns = probabilities.columns[
+        [dtype != np.float64 for dtype in probabilities.dtypes]
+    ]
+    if not non_float_columns.empty:
+        # Missing values are reported first, even alongside non-floating-point values
+        _check_missing_values(probabilities.index, probabilities.isnull().to_numpy())
+        raise ScoreError(
+            f'CSV contains non-floating-point value(s) in columns: {non_float_columns.tolist()}.'
+        )
+    # TODO: identify specific failed rows
+
+    values = probabilities.to_numpy()
+    _check_missing_values(probabilities.index, np.isnan(values))
+
+    out_of_range_mask = np.any((values < 0.0) | (values > 1.0), axis=1)
+    if out_of_range_mask.any():
+        out_of_range_rows = probabilities.index[out_of_range_mask]
+        raise ScoreError(
+            f'Values in CSV are outside the interval [0.0, 1.0] for images: '
+            f'{out_of_range_rows.tolist()}.'
+        )
+
+    # TODO: fail on extra columns in data rows
+
+    return probabilities
+
+
+def _check_missing_values(images: pd.Index, missing_values: np.ndarray) -> None:
+    missing_mask = np.any(missing_values, axis=1)
+    if missing_mask.any():
+        missing_rows = images[missing_mask]
+        raise ScoreError(f'Missing value(s) in CSV for images: {missing_rows.tolist()}.')
+
+
+def parse_aligned_csv(
+    csv_file_stream: TextIO,
+    truth_index: pd.Index,
+    categories: pd.Index,
+    chunk_size: int,
+    out: np.ndarray | None = None,
+) -> pd.DataFrame:
+    """
+    Parse and align a prediction CSV to truth rows, reading only chunk_size rows at a time.
+
+    Each chunk is validated and stored into "out" (which may be an np.memmap) as it is read, so
+    only the truth position of each row is retained. The result, and any ScoreError, is the same
+    as "align_rows(truth_index, parse_csv(...))".
+    """
+    if out is None:
+        out = np.empty((len(truth_index), len(categories)), dtype=np.float64)
+
+    index_name: str | None = None
+    column_error: ScoreError | None = None
+    is_present = np.zeros(len(truth_index), dtype=bool)
+    extra_images: set[str] = set()
+    # Dicts are used as ordered sets, to report images in file order
+    duplicate_images: dict[str, None] = {}
+    missing_value_images: list[str] = []
+    out_of_range_images: list[str] = []
+    # Integer chunks are only non-float columns if every chunk of the column is integer, as
+    # integer and floating-point chunks of the whole file would be parsed as floating-point
+    is_non_float = np.zeros(len(categories), dtype=bool)
+    is_integer = np.ones(len(categories), dtype=bool)
+
+    for chunk in _read_csv_chunks(csv_file_stream, chunk_size):
+        with stage('validate_csv'):
+            if index_name is None:
+                index_name = _get_index_name(chunk.columns)
+                try:
+                    _validate_columns(chunk.columns.drop(index_name), categories)
+                except ScoreError as e:
+                    # Duplicate rows take precedence, so must be searched for first
+                    column_error = e
+
+            images = _normalize_images(chunk[index_name])
+            truth_positions = truth_index.get_indexer(images)
+            is_extra = truth_positions == -1
+
+            is_duplicate = images.duplicated()
+            is_duplicate[~is_extra] |= is_present[truth_positions[~is_extra]]
+            is_duplicate[is_extra] |= images[is_extra].isin(extra_images)
+            duplicate_images.update(dict.fromkeys(images[is_duplicate]))
+            is_present[truth_positions[~is_extra]] = True
+            extra_images.update(images[is_extra])
+
+            if column_error is not None:
+                continue
+
+            probabilities = chunk.drop(columns=index_name).reindex(categories, axis='columns')
+            kinds = np.array([dtype.kind for dtype in probabilities.dtypes])
+            is_numeric = np.isin(kinds, ['f', 'i', 'u'])
+            is_non_float |= ~is_numeric
+            is_integer &= np.isin(kinds, ['i', 'u'])
+
+            if is_numeric.all():
+                values = probabilities.to_numpy(dtype=np.float64)
+                missing_mask = np.any(np.isnan(values), axis=1)
+                out_of_range_images.extend(images[np.any((values < 0.0) | (values > 1.0), axis=1)])
+
+                is_stored = ~is_extra & ~is_duplicate
+                out[truth_positions[is_stored]] = values[is_stored]
+            else:
+                missing_mask = probabilities.isnull().to_numpy().any(axis=1)
+            missing_value_images.extend(images[missing_mask])
+
+    if duplicate_images:
+        raise ScoreError(f'Duplicate image rows detected in CSV: {list(duplicate_images.keys())}.')
+    if column_error is not None:
+        raise column_error
+
+    if missing_value_images:
+        raise ScoreError(f'Missing value(s) in CSV for images: {missing_value_images}.')
+
+    non_float_columns = categories[is_non_float | is_integer]
+    if not non_float_columns.empty:
+        raise ScoreError(
+            f'CSV contains non-floating-point value(s) in columns: {non_float_columns.tolist()}.'
+        )
+
+    if out_of_range_images:
+        raise ScoreError(
+            f'Values in CSV are outside the interval [0.0, 1.0] for images: '
+            f'{out_of_range_images}.'
+        )
+
+    if not is_present.all():
+        missing_images = truth_index[~is_present].sort_values()
+        raise ScoreError(f'Missing images in CSV: {missing_images.tolist()}.')
+
+    if extra_images:
+        raise ScoreError(f'Extra images in CSV: {sorted(extra_images)}.')
+
+    return pd.DataFrame(out, index=truth_index, columns=categories, copy=False)
+
+
+def _read_csv_chunks(csv_file_stream: TextIO, chunk_size: int | None) -> Iterator[pd.DataFrame]:
+    """Read a CSV, as a single chunk if chunk_size is None."""
     try:
         if csv_file_stream.read(2000).count('\n') < 2:
             # Heuristic: if there aren't 2 newlines in the first 2000 characters, it's probably
@@ -42,76 +213,55 @@ def parse_csv(csv_file_stream: TextIO, categories: pd.Index) -> pd.DataFrame:
         csv_file_stream.seek(0)
 
         try:
-            probabilities = pd.read_csv(csv_file_stream, header=0, index_col=False)
+            if chunk_size is None:
+                with stage('read_csv'):
+                    table = pd.read_csv(csv_file_stream, header=0, index_col=False)
+                yield table
+            else:
+                with pd.read_csv(
+                    csv_file_stream, header=0, index_col=False, chunksize=chunk_size
+                ) as reader:
+                    while True:
+                        with stage('read_csv'):
+                            chunk = next(reader, None)
+                        if chunk is None:
+                            break
+                        yield chunk
         except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
             # TODO: Test something that generates a ParserError
             raise ScoreError(f'Could not parse CSV: "{str(e)}".')
     except UnicodeDecodeError:
         raise ScoreError('Could not parse CSV: could not decode file as UTF-8.')
 
-    if 'image' in probabilities.columns:
-        index_name = 'image'
-    elif 'lesion_id' in probabilities.columns:
-        index_name = 'lesion_id'
+
+def _get_index_name(columns: pd.Index) -> str:
+    if 'image' in columns:
+        return 'image'
+    elif 'lesion_id' in columns:
+        return 'lesion_id'
     else:
         raise ScoreError('Missing column in CSV: "image" or "lesion_id".')
 
+
+def _normalize_images(images: pd.Series) -> pd.Index:
     # Pandas represents strings as 'O' (object)
-    if probabilities[index_name].dtype != np.dtype('O'):
+    if images.dtype != np.dtype('O'):
         # Coercing to 'U' (unicode) ensures that even NaN values are converted;
         # however, the resulting type is still 'O'
-        probabilities[index_name] = probabilities[index_name].astype(np.dtype('U'))
-
-    probabilities[index_name] = probabilities[index_name].str.replace(
-        r'\.jpg$', '', case=False, regex=True
-    )
+        images = images.astype(np.dtype('U'))
 
-    if not probabilities[index_name].is_unique:
-        duplicate_images = probabilities[index_name][
-            probabilities[index_name].duplicated()
-        ].unique()
-        raise ScoreError(f'Duplicate image rows detected in CSV: {duplicate_images.tolist()}.')
+    return pd.Index(images.str.replace(r'\.jpg$', '', case=False, regex=True))
 
-    # The duplicate check is the same as performed by 'verify_integrity'
-    probabilities.set_index(index_name, drop=True, inplace=True, verify_integrity=False)
 
-    missing_columns = categories.difference(probabilities.columns)
+def _validate_columns(columns: pd.Index, categories: pd.Index) -> None:
+    missing_columns = categories.difference(columns)
     if not missing_columns.empty:
         raise ScoreError(f'Missing columns in CSV: {missing_columns.tolist()}.')
 
-    extra_columns = probabilities.columns.difference(categories)
+    extra_columns = columns.difference(categories)
     if not extra_columns.empty:
         raise ScoreError(f'Extra columns in CSV: {extra_columns.tolist()}.')
 
-    # sort by the order in categories
-    probabilities = probabilities.reindex(categories, axis='columns')
-
-    missing_rows = probabilities[probabilities.isnull().any(axis='columns')].index
-    if not missing_rows.empty:
-        raise ScoreError(f'Missing value(s) in CSV for images: {missing_rows.tolist()}.')
-
-    non_float_columns = probabilities.dtypes[
-        probabilities.dtypes.apply(lambda x: x != np.float64)
-    ].index
-    if not non_float_columns.empty:
-        raise ScoreError(
-            f'CSV contains non-floating-point value(s) in columns: {non_float_columns.tolist()}.'
-        )
-    # TODO: identify specific failed rows
-
-    out_of_range_rows = probabilities[
-        probabilities.map(lambda x: x < 0.0 or x > 1.0).any(axis='columns')
-    ].index
-    if not out_of_range_rows.empty:
-        raise ScoreError(
-            f'Values in CSV are outside the interval [0.0, 1.0] for images: '
-            f'{out_of_range_rows.tolist()}.'
-        )
-
-    # TODO: fail on extra columns in data rows
-
-    return probabilities
-
 
 def validate_rows(
     truth_probabilities: pd.DataFrame, prediction_probabilities: pd.DataFrame
@@ -122,15 +272,48 @@ def validate_rows(
     Fail when predictionProbabilities is missing rows or has extra rows compared to
     truthProbabilities.
     """
-    missing_images = truth_probabilities.index.difference(prediction_probabilities.index)
-    if not missing_images.empty:
+    align_rows(truth_probabilities.index, prediction_probabilities)
+
+
+def align_rows(truth_index: pd.Index, prediction_probabilities: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reorder prediction rows to correspond to truth rows, in a single hash join.
+
+    Fail when predictionProbabilities is missing rows or has extra rows compared to truthIndex.
+    Pandas caches the hash table of truthIndex on the index itself, so it is only built once for
+    any number of predictions which are aligned to the same truth.
+    """
+    with stage('align_rows'):
+        return _align_rows(truth_index, prediction_probabilities)
+
+
+def _align_rows(truth_index: pd.Index, prediction_probabilities: pd.DataFrame) -> pd.DataFrame:
+    # The truth position of each prediction row, or -1 if it is not in the truth
+    truth_positions = truth_index.get_indexer(prediction_probabilities.index)
+    is_extra = truth_positions == -1
+
+    is_present = np.zeros(len(truth_index), dtype=bool)
+    is_present[truth_positions[~is_extra]] = True
+    if not is_present.all():
+        missing_images = truth_index[~is_present].sort_values()
         raise ScoreError(f'Missing images in CSV: {missing_images.tolist()}.')
 
-    extra_images = prediction_probabilities.index.difference(truth_probabilities.index)
-    if not extra_images.empty:
+    if is_extra.any():
+        extra_images = prediction_probabilities.index[is_extra].sort_values()
         raise ScoreError(f'Extra images in CSV: {extra_images.tolist()}.')
 
+    # Prediction rows are unique, so this is a permutation, which can be inverted by scattering
+    prediction_positions = np.empty(len(truth_index), dtype=np.intp)
+    prediction_positions[truth_positions] = np.arange(len(truth_positions))
+
+    return pd.DataFrame(
+        prediction_probabilities.to_numpy()[prediction_positions],
+        index=truth_index,
+        columns=prediction_probabilities.columns,
+    )
+
 
 def sort_rows(probabilities: pd.DataFrame) -> None:
     """Sort rows by labels, in-place."""
-    probabilities.sort_index(axis='index', inplace=True)
+    with stage('sort_rows'):
+        probabilities.sort_index(axis='index', inplace=True)
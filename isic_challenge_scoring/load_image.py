@@ -1,5 +1,6 @@
 from collections.abc import Generator
 from dataclasses import dataclass, field
+import io
 import pathlib
 import re
 from re import Match
@@ -7,14 +8,49 @@ from re import Match
 from PIL import Image, UnidentifiedImageError
 import numpy as np
 
+from isic_challenge_scoring.timings import stage
 from isic_challenge_scoring.types import ScoreError
+from isic_challenge_scoring.unzip import ZipImageSource, ZipMember
+
+# Images may be read from either a directory or a ZIP file, without extracting it
+ImageSource = pathlib.Path | ZipImageSource
+ImageFile = pathlib.Path | ZipMember
+
+# Image numbers are the 7 digits of an ISIC image id
+_IMAGE_NUMBER_LENGTH = 7
+
+
+class PredictionFileIndex:
+    """
+    The files of a prediction directory, indexed by every image number in their names.
+
+    The directory is listed only once, and each file is indexed by every run of 7 digits within its
+    stem, so finding the files whose stem contains an image number is a single lookup.
+    """
+
+    def __init__(self, prediction_path: ImageSource) -> None:
+        self._files_by_image_number: dict[str, list[ImageFile]] = {}
+        for prediction_file in prediction_path.iterdir():
+            stem = prediction_file.stem
+            # Overlapping runs are also indexed, as a longer run of digits contains several
+            image_numbers = {
+                stem[start : start + _IMAGE_NUMBER_LENGTH]
+                for start in range(len(stem) - _IMAGE_NUMBER_LENGTH + 1)
+                if stem[start : start + _IMAGE_NUMBER_LENGTH].isdigit()
+            }
+            for image_number in image_numbers:
+                self._files_by_image_number.setdefault(image_number, []).append(prediction_file)
+
+    def find(self, image_number: str) -> list[ImageFile]:
+        """Find every prediction file whose stem contains an image number."""
+        return self._files_by_image_number.get(image_number, [])
 
 
 @dataclass
 class ImagePair:
-    truth_file: pathlib.Path
+    truth_file: ImageFile
     truth_image: np.ndarray = field(init=False)
-    prediction_file: pathlib.Path = field(init=False)
+    prediction_file: ImageFile = field(init=False)
     prediction_image: np.ndarray = field(init=False)
     image_id: str = field(init=False)
     attribute_id: str | None = field(default=None, init=False)
@@ -31,21 +67,15 @@ class ImagePair:
         if attribute_id_match:
             self.attribute_id = attribute_id_match.group(1)
 
-    def find_prediction_file(self, prediction_path: pathlib.Path) -> None:
+    def find_prediction_file(self, prediction_files: PredictionFileIndex) -> None:
         image_number: str = self.image_id.split('_')[1]
 
-        if not self.attribute_id:
+        prediction_file_candidates = prediction_files.find(image_number)
+        if self.attribute_id:
             prediction_file_candidates = [
                 prediction_file
-                for prediction_file in prediction_path.iterdir()
-                if image_number in prediction_file.stem
-            ]
-        else:
-            prediction_file_candidates = [
-                prediction_file
-                for prediction_file in prediction_path.iterdir()
-                if image_number in prediction_file.stem
-                and self.attribute_id in prediction_file.stem
+                for prediction_file in prediction_file_candidates
+                if self.attribute_id in prediction_file.stem
             ]
 
         if not prediction_file_candidates:
@@ -55,6 +85,21 @@ class ImagePair:
 
         self.prediction_file = prediction_file_candidates[0]
 
+    def check_image_headers(self) -> None:
+        """Check the mode and dimensions of both images, reading only their headers."""
+        truth_dimensions = read_segmentation_image_dimensions(self.truth_file)
+        prediction_dimensions = read_segmentation_image_dimensions(self.prediction_file)
+        if prediction_dimensions != truth_dimensions:
+            raise ScoreError(
+                f'Image {self.prediction_file.name} has dimensions '
+                f'{prediction_dimensions}; expected {truth_dimensions}.'
+            )
+
+    def load_images(self) -> None:
+        with stage('load_image_pair', image=self.image_id):
+            self.load_truth_image()
+            self.load_prediction_image()
+
     def load_truth_image(self) -> None:
         self.truth_image = load_segmentation_image(self.truth_file)
         # TODO: Validate all ground truth as binary before upload
@@ -69,10 +114,29 @@ class ImagePair:
             )
 
 
-def load_segmentation_image(image_path: pathlib.Path) -> np.ndarray:
+def read_segmentation_image_dimensions(image_path: ImageFile) -> tuple[int, int]:
+    """Read the (height, width) of a segmentation image, and check its mode, from its header."""
+    try:
+        # Opening an image only reads its header, and does not decode it
+        with image_path.open('rb') as image_stream, Image.open(image_stream) as image:
+            if image.mode not in {'1', 'L'}:
+                raise ScoreError(f'Image {image_path.name} is not single-channel (greyscale).')
+            return image.height, image.width
+    except UnidentifiedImageError:
+        raise ScoreError(f'Could not decode image "{image_path.name}"')
+
+
+def load_segmentation_image(image_path: ImageFile) -> np.ndarray:
     """Load a segmentation image as a NumPy array, given a file path."""
+    with stage('decode_image', image=image_path.name):
+        return _load_segmentation_image(image_path)
+
+
+def _load_segmentation_image(image_path: ImageFile) -> np.ndarray:
     try:
-        with Image.open(image_path) as image:
+        # Images are read fully into memory before decoding, so ZIP members are decompressed in a
+        # single pass
+        with Image.open(io.BytesIO(image_path.read_bytes())) as image:
             # Ensure the image is loaded, sometimes NumPy fails to get the "__array_interface__"
             image.load()
 
@@ -111,17 +175,47 @@ def assert_binary_image(image: np.ndarray, image_path: pathlib.Path) -> np.ndarr
     return image
 
 
-def iter_image_pairs(
-    truth_path: pathlib.Path, prediction_path: pathlib.Path
-) -> Generator[ImagePair]:
-    for truth_file in sorted(truth_path.iterdir()):
+def match_image_pairs(truth_path: ImageSource, prediction_path: ImageSource) -> list[ImagePair]:
+    """
+    Match each ground truth file to its prediction file, and check each pair's image headers.
+
+    No image is decoded, so a submission with problems is rejected quickly. Rather than stopping at
+    the first, every problem is reported, in a single ScoreError.
+    """
+    with stage('index_predictions'):
+        prediction_files = PredictionFileIndex(prediction_path)
+
+    image_pairs = []
+    problems = []
+    truth_files: list[ImageFile] = list(truth_path.iterdir())
+    for truth_file in sorted(truth_files, key=lambda truth_file: truth_file.name):
         if truth_file.name in {'ATTRIBUTION.txt', 'LICENSE.txt'}:
             continue
 
         image_pair = ImagePair(truth_file=truth_file)
         image_pair.parse_image_id()
-        image_pair.find_prediction_file(prediction_path)
-        image_pair.load_truth_image()
-        image_pair.load_prediction_image()
+        try:
+            with stage('match_images', image=image_pair.image_id):
+                image_pair.find_prediction_file(prediction_files)
+            with stage('check_image_headers', image=image_pair.image_id):
+                image_pair.check_image_headers()
+        except ScoreError as e:
+            problems.append(str(e))
+        else:
+            image_pairs.append(image_pair)
+
+    if len(problems) == 1:
+        raise ScoreError(problems[0])
+    elif problems:
+        raise ScoreError(
+            f'{len(problems)} problems with the submission:\n'
+            + '\n'.join(f'- {problem}' for problem in problems)
+        )
+
+    return image_pairs
+
 
+def iter_image_pairs(truth_path: ImageSource, prediction_path: ImageSource) -> Generator[ImagePair]:
+    for image_pair in match_image_pairs(truth_path, prediction_path):
+        image_pair.load_images()
         yield image_pair
@@ -1,100 +1,134 @@
-import warnings
+from __future__ import annotations
+
+from dataclasses import dataclass
 
 import numpy as np
 import pandas as pd
-from rdp import rdp
-import sklearn.metrics
+
+from isic_challenge_scoring.timings import stage
 
 
-def _to_labels(probabilities: pd.DataFrame) -> pd.Series:
-    labels = probabilities.idxmax(axis='columns')
+def _to_labels(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Convert a (rows x categories) probability matrix to integer category labels.
+
+    Rows with multiple maximum values get an 'undecided' label, which is equal to the number of
+    categories.
+    """
+    labels = probabilities.argmax(axis=1)
 
     # Find places where there are multiple maximum values
-    max_probabilities = probabilities.max(axis='columns')
-    is_max: pd.DataFrame = probabilities.eq(max_probabilities, axis='index')
-    number_of_max: pd.Series = is_max.sum(axis='columns')
-    multiple_max: pd.Series = number_of_max.gt(1)
+    max_probabilities = np.take_along_axis(probabilities, labels[:, np.newaxis], axis=1)
+    number_of_max = np.count_nonzero(probabilities == max_probabilities, axis=1)
     # Set those locations as an 'undecided' label
-    labels[multiple_max] = 'undecided'
+    labels[number_of_max > 1] = probabilities.shape[1]
     # TODO: emit a warning if any are set to 'undecided'
 
     return labels
 
 
-def _get_frequencies(labels: pd.Series, weights: pd.Series, categories: pd.Index) -> pd.Series:
-    # Directly sum the weights, grouping them by label
-    # .reindex sorts this by the order in categories
-    return weights.groupby(labels, sort=False).sum().reindex(categories, fill_value=0)
+def _weighted_label_counts(
+    cell_labels: np.ndarray, weights: np.ndarray, cell_count: int
+) -> np.ndarray:
+    """Sum the weights of each label, for each column of a (rows x weight vectors) matrix."""
+    weight_vector_count = weights.shape[1]
+    # Offset the labels of each weight vector, so a single bincount handles all of them
+    cell_labels = cell_labels[:, np.newaxis] + np.arange(
+        0, cell_count * weight_vector_count, cell_count
+    )
+    return np.bincount(
+        cell_labels.ravel(), weights=weights.ravel(), minlength=cell_count * weight_vector_count
+    ).reshape(weight_vector_count, cell_count)
+
+
+def _get_frequencies(labels: np.ndarray, weights: np.ndarray, category_count: int) -> np.ndarray:
+    """
+    Directly sum the weights, grouping them by label.
+
+    Weights are a (rows x weight vectors) matrix. The 'undecided' label is excluded.
+    """
+    return _weighted_label_counts(labels, weights, category_count + 1)[:, :category_count]
 
 
 def _label_balanced_multiclass_accuracy(
-    truth_labels: pd.Series, prediction_labels: pd.Series, weights: pd.Series, categories: pd.Index
-) -> float:
+    truth_labels: np.ndarray,
+    prediction_labels: np.ndarray,
+    weights: np.ndarray,
+    category_count: int,
+) -> np.ndarray:
+    """Compute balanced accuracy for each column of a (rows x weight vectors) weight matrix."""
     # See http://scikit-learn.org/dev/modules/model_evaluation.html#balanced-accuracy-score ; in
     # summary, 'sklearn.metrics.balanced_accuracy_score' is for binary classification only, so we
     # need to implement our own; here, we implement a simpler version of "balanced accuracy" than
     # the definitions mentioned by SciKit learn, as it's just a normalization of TP scores by true
     # class proportions
-    confusion_matrix = sklearn.metrics.confusion_matrix(
-        truth_labels, prediction_labels, labels=categories, sample_weight=weights
-    )
-    # TODO: try to convert to a DataFrame, for useful debugging labels
-    # confusion_matrix = pd.DataFrame(
-    #     confusion_matrix,
-    #     index=LABELS.map(lambda label: f'true_{label}'),
-    #     columns=LABELS.map(lambda label: f'predicted_{label}')
-    # )
-
-    tp_counts = pd.Series(confusion_matrix.diagonal(), index=categories)
 
-    # These are equal to rows of the confusion matrix
-    true_label_frequencies = _get_frequencies(truth_labels, weights, categories)
-
-    balanced_accuracy = tp_counts.divide(true_label_frequencies).mean()
+    # Like sklearn.metrics.confusion_matrix, ignore rows with an 'undecided' label
+    decided = (truth_labels < category_count) & (prediction_labels < category_count)
+    confusion_matrices = _weighted_label_counts(
+        truth_labels[decided] * category_count + prediction_labels[decided],
+        weights[decided],
+        category_count * category_count,
+    ).reshape(-1, category_count, category_count)
+
+    tp_counts = np.diagonal(confusion_matrices, axis1=1, axis2=2)
+
+    # These are equal to rows of the confusion matrix, but also include 'undecided' predictions
+    true_label_frequencies = _get_frequencies(truth_labels, weights, category_count)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recalls = tp_counts / true_label_frequencies
+    # Categories which are absent from the truth are undefined (NaN), so exclude them from the
+    # mean; this is the same as the default behavior of pandas.Series.mean
+    present = ~np.isnan(recalls)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        balanced_accuracy = np.where(present, recalls, 0.0).sum(axis=1) / present.sum(axis=1)
     return balanced_accuracy
 
 
-def _roc_curve(
-    truth_probabilities: pd.Series,
-    prediction_probabilities: pd.Series,
-    weights: pd.Series,
-    drop_intermediate: bool = True,
-) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
-    """Call sklearn.metrics.roc_curve in a more performant way."""
-    # This is much faster to compute if the zero-weighted probabilities are eliminated first
-    nonzero_weights = weights.ne(0.0)
-    truth_probabilities = truth_probabilities[nonzero_weights]
-    prediction_probabilities = prediction_probabilities[nonzero_weights]
-    weights = weights[nonzero_weights]
-
-    # An additional minor optimization
-    sample_weight = None if weights.eq(1.0).all() else weights
-
-    fp_rates, tp_rates, thresholds = sklearn.metrics.roc_curve(
-        truth_probabilities,
-        prediction_probabilities,
-        sample_weight=sample_weight,
-        drop_intermediate=drop_intermediate,
+def balanced_multiclass_accuracy(
+    truth_probabilities: pd.DataFrame, prediction_probabilities: pd.DataFrame, weights: pd.Series
+) -> float:
+    weight_values = weights.to_numpy(dtype=np.float64)[:, np.newaxis]
+    return float(
+        _probability_balanced_multiclass_accuracy(
+            truth_probabilities, prediction_probabilities, weight_values
+        )[0]
     )
-    # This can contain infinity values so replace them with 1.0.
-    # https://github.com/scikit-learn/scikit-learn/pull/26194
-    thresholds = np.nan_to_num(thresholds, posinf=1.0)
 
-    return fp_rates, tp_rates, thresholds
 
+def batch_balanced_multiclass_accuracy(
+    truth_probabilities: pd.DataFrame,
+    prediction_probabilities: pd.DataFrame,
+    weights: pd.DataFrame,
+) -> pd.Series:
+    """
+    Compute the balanced multiclass accuracy for every weight column at once.
+
+    The result is indexed by the weight column names.
+    """
+    weight_values = weights.to_numpy(dtype=np.float64)
+    return pd.Series(
+        _probability_balanced_multiclass_accuracy(
+            truth_probabilities, prediction_probabilities, weight_values
+        ),
+        index=weights.columns,
+    )
 
-def balanced_multiclass_accuracy(
-    truth_probabilities: pd.DataFrame, prediction_probabilities: pd.DataFrame, weights: pd.Series
-) -> float:
-    truth_labels = _to_labels(truth_probabilities)
-    prediction_labels = _to_labels(prediction_probabilities)
-    categories = truth_probabilities.columns
+
+def _probability_balanced_multiclass_accuracy(
+    truth_probabilities: pd.DataFrame,
+    prediction_probabilities: pd.DataFrame,
+    weight_values: np.ndarray,
+) -> np.ndarray:
+    truth_labels = _to_labels(truth_probabilities.to_numpy())
+    prediction_labels = _to_labels(prediction_probabilities.to_numpy())
+    category_count = len(truth_probabilities.columns)
 
     # This is easier to test
-    balanced_accuracy = _label_balanced_multiclass_accuracy(
-        truth_labels, prediction_labels, weights, categories
+    return _label_balanced_multiclass_accuracy(
+        truth_labels, prediction_labels, weight_values, category_count
     )
-    return balanced_accuracy
 
 
 def binary_accuracy(cm: pd.Series) -> float:
@@ -161,13 +195,417 @@ def binary_npv(cm: pd.Series) -> float:
         return cm.at['TN'] / (cm.at['TN'] + cm.at['FN'])
 
 
+def _unpack_confusion_matrices(
+    cms: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    tp, tn, fp, fn = np.moveaxis(cms, -1, 0)
+    return tp, tn, fp, fn
+
+
+def _divide_or_freebie(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    # Where the denominator is 0, the metric is ill-defined; score it as perfect, with the same
+    # rationale as the corresponding scalar "binary_*" function
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator == 0, 1.0, numerator / denominator)
+
+
+# These are equivalent to the scalar "binary_*" functions, but operate on an array of confusion
+# matrices (as returned by "create_binary_confusion_matrices"), whose last axis is 'TP', 'TN',
+# 'FP', 'FN'
+
+
+def batch_binary_accuracy(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (tp + tn) / (tp + tn + fp + fn)
+
+
+def batch_binary_sensitivity(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    return _divide_or_freebie(tp, tp + fn)
+
+
+def batch_binary_specificity(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    return _divide_or_freebie(tn, tn + fp)
+
+
+def batch_binary_jaccard(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    return _divide_or_freebie(tp, tp + fp + fn)
+
+
+def batch_binary_threshold_jaccard(cms: np.ndarray, threshold: float = 0.65) -> np.ndarray:
+    jaccard = batch_binary_jaccard(cms)
+    return np.where(jaccard >= threshold, jaccard, 0.0)
+
+
+def batch_binary_dice(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    return _divide_or_freebie(2 * tp, (2 * tp) + fp + fn)
+
+
+def batch_binary_ppv(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    return _divide_or_freebie(tp, tp + fp)
+
+
+def batch_binary_npv(cms: np.ndarray) -> np.ndarray:
+    tp, tn, fp, fn = _unpack_confusion_matrices(cms)
+    return _divide_or_freebie(tn, tn + fn)
+
+
+@dataclass
+class CategoryRanking:
+    """
+    Cumulative weighted true and false positive counts at each distinct prediction threshold.
+
+    This is computed from a single sort of a category's predictions, and every ranking metric
+    (AUC, partial AUC, average precision and the ROC curve) is derived from it, so the predictions
+    never need to be re-sorted. The arithmetic mirrors "sklearn.metrics", so results are the same.
+
+    Unlike "sklearn.metrics.roc_auc_score", which raises a ValueError, AUC and partial AUC are NaN
+    if the weighted rows of a category are all truly positive or all truly negative. Average
+    precision is always defined, as in sklearn (e.g. 0.0 if there are no positives).
+    """
+
+    # Counts are ordered by decreasing threshold
+    fps: np.ndarray
+    tps: np.ndarray
+    thresholds: np.ndarray
+
+    @classmethod
+    def from_probabilities(
+        cls,
+        truth_probabilities: pd.Series,
+        prediction_probabilities: pd.Series,
+        weights: pd.Series,
+    ) -> CategoryRanking:
+        (ranking,) = cls.from_weights(
+            truth_probabilities, prediction_probabilities, weights.to_frame()
+        ).values()
+        return ranking
+
+    @classmethod
+    def from_weights(
+        cls,
+        truth_probabilities: pd.Series,
+        prediction_probabilities: pd.Series,
+        weights: pd.DataFrame,
+    ) -> dict[str, CategoryRanking]:
+        """
+        Compute a ranking for each weight column, from a single sort and cumulative sum.
+
+        The result is keyed by the weight column names.
+        """
+        with stage('rank_category'):
+            return cls._from_weights(truth_probabilities, prediction_probabilities, weights)
+
+    @classmethod
+    def _from_weights(
+        cls,
+        truth_probabilities: pd.Series,
+        prediction_probabilities: pd.Series,
+        weights: pd.DataFrame,
+    ) -> dict[str, CategoryRanking]:
+        weight_values = weights.to_numpy(dtype=np.float64)
+        nonzero_weights = weight_values != 0.0
+        # This is much faster to compute if the zero-weighted probabilities are eliminated first
+        any_nonzero_weights = nonzero_weights.any(axis=1)
+        truth_values = truth_probabilities.to_numpy()[any_nonzero_weights] > 0.5
+        prediction_values = prediction_probabilities.to_numpy(dtype=np.float64)[any_nonzero_weights]
+        weight_values = weight_values[any_nonzero_weights]
+        nonzero_weights = nonzero_weights[any_nonzero_weights]
+
+        # The one sort; a reversed stable sort matches the tie order used by sklearn
+        descending_indices = np.argsort(prediction_values, kind='mergesort')[::-1]
+        prediction_values = prediction_values[descending_indices]
+        truth_values = truth_values[descending_indices, np.newaxis]
+        weight_values = weight_values[descending_indices]
+        nonzero_weights = nonzero_weights[descending_indices]
+
+        # The one cumulative sum pass, for all weight columns at once; since zero-weighted rows
+        # add exactly 0.0, these equal the sums over only each column's nonzero-weighted rows
+        cumulative_tps = np.cumsum(truth_values * weight_values, axis=0, dtype=np.float64)
+        # Express fps as a cumulative sum too, so it is increasing even with floating point error
+        cumulative_fps = np.cumsum(~truth_values * weight_values, axis=0, dtype=np.float64)
+
+        rankings = {}
+        for weight_index, weight_name in enumerate(weights.columns):
+            weighted_indices = np.flatnonzero(nonzero_weights[:, weight_index])
+            weighted_prediction_values = prediction_values[weighted_indices]
+            # Predictions typically have many tied values, so only keep the last index of each
+            distinct_value_indices = np.flatnonzero(np.diff(weighted_prediction_values))
+            threshold_indices = weighted_indices[
+                (
+                    np.r_[distinct_value_indices, weighted_indices.size - 1]
+                    if weighted_indices.size
+                    else distinct_value_indices
+                )
+            ]
+
+            rankings[weight_name] = cls(
+                fps=cumulative_fps[threshold_indices, weight_index],
+                tps=cumulative_tps[threshold_indices, weight_index],
+                thresholds=prediction_values[threshold_indices],
+            )
+        return rankings
+
+    @property
+    def _is_defined(self) -> bool:
+        # Ranking metrics are not defined unless both classes are present
+        return bool(self.fps.size and self.fps[-1] > 0 and self.tps[-1] > 0)
+
+    def roc_curve(
+        self, drop_intermediate: bool = True
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the ROC curve, equivalent to sklearn.metrics.roc_curve."""
+        fps, tps, thresholds = self.fps, self.tps, self.thresholds
+
+        if drop_intermediate and len(fps) > 2:
+            # Drop points which are collinear with both of their neighbors
+            optimal_indices = np.flatnonzero(
+                np.r_[True, np.logical_or(np.diff(fps, 2), np.diff(tps, 2)), True]
+            )
+            fps = fps[optimal_indices]
+            tps = tps[optimal_indices]
+            thresholds = thresholds[optimal_indices]
+
+        fps = np.r_[0.0, fps]
+        tps = np.r_[0.0, tps]
+        # sklearn uses an infinite first threshold, which does not serialize, so use 1.0 instead
+        # https://github.com/scikit-learn/scikit-learn/pull/26194
+        thresholds = np.r_[1.0, thresholds]
+
+        # Rates are undefined if only one class has weight
+        fp_rates = fps / fps[-1] if fps[-1] > 0 else np.full(fps.shape, np.nan)
+        tp_rates = tps / tps[-1] if tps[-1] > 0 else np.full(tps.shape, np.nan)
+
+        return fp_rates, tp_rates, thresholds
+
+    def auc(self) -> float:
+        if not self._is_defined:
+            return float('nan')
+        fp_rates, tp_rates, _ = self.roc_curve()
+        return float(np.trapezoid(tp_rates, fp_rates))
+
+    def auc_above_sensitivity(self, sensitivity_threshold: float) -> float:
+        if not (0 < sensitivity_threshold <= 1.0):
+            raise Exception(f'Out of bounds sensitivity_threshold: {sensitivity_threshold}.')
+
+        if not self._is_defined:
+            return float('nan')
+
+        # Get the ROC curve points
+        fp_rates, tp_rates, _ = self.roc_curve(drop_intermediate=False)
+
+        # Calling sklearn.metrics.roc_auc_score with max_fpr always applies the McClish correction,
+        # which is a transform to normalize partial AUC values into the range [0.5, 1] (for a given
+        # FPR interval): http://www.ncbi.nlm.nih.gov/pubmed/2668680
+        # McClish-normalized partial AUC values may be a helpful metric to evaluate on their own,
+        # but they are incompatible with the overall AUC, and SciKit learn (unlike R) does not
+        # provide a flag to return the raw partial AUC, so just compute the desired metric directly
+
+        # Search for the index along the curve where sensitivity_threshold (i.e. tp_rate
+        # threshold) occurs
+        # Since tp_rates is ordered, searchsorted provides better performance than np.argmax
+        # Use side='left' to include any following points with exactly the target value
+        threshold_index = tp_rates.searchsorted(sensitivity_threshold, side='left')
+
+        # Take only the segment >= the value at threshold_index
+        tp_rates_segment = tp_rates[threshold_index:]
+        fp_rates_segment = fp_rates[threshold_index:]
+
+        # Create an additional ROC point at exactly the threshold value
+        tp_rate_threshold = sensitivity_threshold
+        # It will be the case that fp_rate_threshold <= tp_rates[threshold_index]
+        # Since tp_rates may have repeated values (which is disallowed by np.interp), use a 2-value
+        # segment directly around the threshold value
+        # If fp_rate_threshold < tp_rates[threshold_index], the 2-value segment needs to start from
+        # the location at threshold_index-1, so that it straddles fp_rate_threshold
+        # Even if fp_rate_threshold == tp_rates[threshold_index], a 2-value segment starting before
+        # threshold_index is guaranteed to have no duplicates, as threshold_index is the left
+        # side of any series of duplicates (since it was found with searchsorted(..., side='left'))
+        fp_rate_threshold = np.interp(
+            tp_rate_threshold,
+            tp_rates[threshold_index - 1 : threshold_index + 1],
+            fp_rates[threshold_index - 1 : threshold_index + 1],
+        )
+
+        # Prepend the point to the segment
+        tp_rates_segment = np.insert(tp_rates_segment, 0, tp_rate_threshold)
+        fp_rates_segment = np.insert(fp_rates_segment, 0, fp_rate_threshold)
+
+        partial_auc = np.trapezoid(tp_rates_segment, fp_rates_segment)
+        return float(partial_auc)
+
+    def average_precision(self) -> float:
+        if not self.tps.size:
+            return float('nan')
+        predicted_positives = self.tps + self.fps
+        precision = np.zeros_like(self.tps)
+        np.divide(self.tps, predicted_positives, out=precision, where=(predicted_positives != 0))
+        if self.tps[-1] == 0:
+            # Like sklearn, set recall to one for all thresholds if there are no positives
+            recall = np.ones_like(self.tps)
+        else:
+            recall = self.tps / self.tps[-1]
+
+        # Integrate the step function in order of increasing threshold, exactly as
+        # sklearn.metrics.average_precision_score does
+        precision = np.r_[precision[::-1], 1.0]
+        recall = np.r_[recall[::-1], 0.0]
+        # Due to numerical error, this can be -0.0, so clip it
+        return float(max(0.0, -np.sum(np.diff(recall) * precision[:-1])))
+
+    def roc(self, max_points: int | None = None) -> pd.DataFrame:
+        """
+        Compute the ROC curve, indexed by threshold.
+
+        By default, the curve is simplified with the Ramer-Douglas-Peucker algorithm. If
+        max_points is set, it is instead downsampled to at most that many points.
+        """
+        fp_rates, tp_rates, thresholds = self.roc_curve()
+
+        roc = pd.DataFrame(
+            {'fpr': fp_rates, 'tpr': tp_rates}, index=thresholds, columns=['fpr', 'tpr']
+        )
+
+        if max_points is not None:
+            with stage('simplify_roc'):
+                roc = downsample_roc(roc, max_points)
+        elif len(fp_rates) > 100:
+            # simplify line using Ramer-Douglas-Peucker algorithm if more than 100 points
+            points = np.vstack((fp_rates, tp_rates)).T
+            # a simple test reduced a roc curve of 2161 items to
+            # epsilon 0      ... 660
+            # epsilon 0.0001 ... 573
+            # epsilon 0.0005 ... 344
+            # epsilon 0.001  ... 197
+            # epsilon 0.005  ...  17
+            with stage('simplify_roc'):
+                mask = _rdp_mask(points, epsilon=0.001)
+            roc = roc[mask]
+
+        return roc
+
+
+def downsample_roc(roc: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """
+    Downsample a ROC curve to at most max_points of its points, including both ends.
+
+    Points are chosen at even intervals of distance along the curve, which for a ROC curve is
+    just the sum of its rates, so this is a single linear-time pass.
+    """
+    if max_points < 2:
+        raise ValueError('A ROC curve must be downsampled to at least 2 points.')
+    if len(roc) <= max_points:
+        return roc
+
+    # Undefined rates (when a category has no positives or negatives) do not advance the curve
+    distances = np.nan_to_num(roc['fpr'].to_numpy()) + np.nan_to_num(roc['tpr'].to_numpy())
+    targets = np.linspace(distances[0], distances[-1], max_points)
+    indices = np.searchsorted(distances, targets)
+    indices[0] = 0
+    indices[-1] = len(roc) - 1
+    # Indices are non-decreasing, so duplicates (where the curve jumps) are adjacent
+    indices = indices[np.r_[True, np.diff(indices) > 0]]
+
+    return roc.iloc[indices]
+
+
+def _rdp_mask(points: np.ndarray, epsilon: float) -> np.ndarray:
+    """
+    Simplify a 2-dimensional curve using the Ramer-Douglas-Peucker algorithm.
+
+    Return a mask of the points to keep. This is an iterative, stack-based implementation, which
+    computes the distances of all of a segment's points at once, but otherwise exactly matches
+    the arithmetic of "rdp.rdp(points, epsilon=epsilon, return_mask=True)", so produces the same
+    mask.
+    """
+    mask = np.zeros(len(points), dtype=bool)
+    mask[[0, -1]] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start_index, last_index = stack.pop()
+        if last_index - start_index < 2:
+            continue
+        start = points[start_index]
+        end = points[last_index]
+        interior = points[start_index + 1 : last_index]
+
+        if np.all(np.equal(start, end)):
+            distances = np.array([np.linalg.norm(point - start) for point in interior])
+        else:
+            line = end - start
+            offsets = start - interior
+            # The 2-dimensional cross product, computed as "numpy.cross" does
+            cross = line[0] * offsets[:, 1] - line[1] * offsets[:, 0]
+            # The norm of a scalar is computed as the root of its square
+            distances = np.sqrt(cross * cross) / np.linalg.norm(line)
+
+        # The first point strictly farthest from the line, where NaN distances are never farthest
+        distances = np.where(distances > 0.0, distances, 0.0)
+        farthest_index = int(np.argmax(distances))
+        if distances[farthest_index] > epsilon:
+            split_index = start_index + 1 + farthest_index
+            mask[split_index] = True
+            stack.append((start_index, split_index))
+            stack.append((split_index, last_index))
+
+    return mask
+
+
+def batch_ranking_metrics(
+    truth_values: np.ndarray, threshold_indices: np.ndarray, weights: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the AUC and average precision of a category for each row of a weight matrix.
+
+    The elements of truth_values (a boolean vector) and the columns of weights (a weight vectors x
+    rows matrix, so each cumulative sum is over contiguous memory) must already be sorted by
+    decreasing prediction, and threshold_indices must be the last position of each distinct
+    prediction value. Many weightings of the same predictions (e.g. bootstrap resampling counts)
+    can then be scored without re-sorting them. As with CategoryRanking, zero-weighted rows are
+    equivalent to absent rows.
+
+    Returns a pair of arrays, each with a value per weight vector.
+    """
+    tps = np.cumsum(truth_values * weights, axis=1, dtype=np.float64)[:, threshold_indices]
+    fps = np.cumsum(~truth_values * weights, axis=1, dtype=np.float64)[:, threshold_indices]
+    total_tps = tps[:, -1:]
+    total_fps = fps[:, -1:]
+
+    # Thresholds which only zero-weighted rows pass add points which repeat their predecessor, so
+    # these integrate to the same values as with the rows removed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tp_rates = np.hstack([np.zeros_like(total_tps), tps]) / total_tps
+        fp_rates = np.hstack([np.zeros_like(total_fps), fps]) / total_fps
+    auc = np.trapezoid(tp_rates, fp_rates, axis=1)
+    # Ranking metrics are not defined unless both classes are present
+    auc[(total_tps[:, 0] == 0) | (total_fps[:, 0] == 0)] = np.nan
+
+    predicted_positives = tps + fps
+    precision = np.zeros_like(tps)
+    np.divide(tps, predicted_positives, out=precision, where=(predicted_positives != 0))
+    # Like sklearn, set recall to one for all thresholds if there are no positives
+    recall = np.ones_like(tps)
+    np.divide(tps, total_tps, out=recall, where=(total_tps != 0))
+    # Integrate the precision at each step of recall; due to numerical error, this can be -0.0
+    average_precision = np.maximum(
+        0.0, np.sum(np.diff(recall, axis=1, prepend=0.0) * precision, axis=1)
+    )
+
+    return auc, average_precision
+
+
 def auc(
     truth_probabilities: pd.Series, prediction_probabilities: pd.Series, weights: pd.Series
 ) -> float:
-    auc = sklearn.metrics.roc_auc_score(
-        truth_probabilities, prediction_probabilities, sample_weight=weights
-    )
-    return float(auc)
+    return CategoryRanking.from_probabilities(
+        truth_probabilities, prediction_probabilities, weights
+    ).auc()
 
 
 def auc_above_sensitivity(
@@ -176,93 +614,25 @@ def auc_above_sensitivity(
     weights: pd.Series,
     sensitivity_threshold: float,
 ) -> float:
-    if not (0 < sensitivity_threshold <= 1.0):
-        raise Exception(f'Out of bounds sensitivity_threshold: {sensitivity_threshold}.')
-
-    # Get the ROC curve points
-    # TODO: We must have both some true and false instances in truthProbabilities
-    fp_rates, tp_rates, thresholds = _roc_curve(
-        truth_probabilities,
-        prediction_probabilities,
-        weights,
-        drop_intermediate=False,
-    )
-
-    # Calling sklearn.metrics.roc_auc_score with max_fpr always applies the McClish correction,
-    # which is a transform to normalize partial AUC values into the range [0.5, 1] (for a given FPR
-    # interval): http://www.ncbi.nlm.nih.gov/pubmed/2668680
-    # McClish-normalized partial AUC values may be a helpful metric to evaluate on their own,
-    # but they are incompatible with the overall AUC, and SciKit learn (unlike R) does not
-    # provide a flag to return the raw partial AUC, so just compute the desired metric directly
-
-    # Search for the index along the curve where sensitivity_threshold (i.e. tp_rate threshold)
-    # occurs
-    # Since tp_rates is ordered, searchsorted provides better performance than np.argmax
-    # Use side='left' to include any following points with exactly the target value
-    threshold_index = tp_rates.searchsorted(sensitivity_threshold, side='left')
-
-    # Take only the segment >= the value at threshold_index
-    tp_rates_segment = tp_rates[threshold_index:]
-    fp_rates_segment = fp_rates[threshold_index:]
-
-    # Create an additional ROC point at exactly the threshold value
-    tp_rate_threshold = sensitivity_threshold
-    # It will be the case that fp_rate_threshold <= tp_rates[threshold_index]
-    # Since tp_rates may have repeated values (which is disallowed by np.interp), use a 2-value
-    # segment directly around the threshold value
-    # If fp_rate_threshold < tp_rates[threshold_index], the 2-value segment needs to start from the
-    # location at threshold_index-1, so that it straddles fp_rate_threshold
-    # Even if fp_rate_threshold == tp_rates[threshold_index], a 2-value segment starting before
-    # threshold_index is guaranteed to have no duplicates, as threshold_index is the left
-    # side of any series of duplicates (since it was found with searchsorted(..., side='left'))
-    fp_rate_threshold = np.interp(
-        tp_rate_threshold,
-        tp_rates[threshold_index - 1 : threshold_index + 1],
-        fp_rates[threshold_index - 1 : threshold_index + 1],
-    )
-
-    # Prepend the point to the segment
-    tp_rates_segment = np.insert(tp_rates_segment, 0, tp_rate_threshold)
-    fp_rates_segment = np.insert(fp_rates_segment, 0, fp_rate_threshold)
-
-    partial_auc = sklearn.metrics.auc(fp_rates_segment, tp_rates_segment)
-    return float(partial_auc)
+    return CategoryRanking.from_probabilities(
+        truth_probabilities, prediction_probabilities, weights
+    ).auc_above_sensitivity(sensitivity_threshold)
 
 
 def average_precision(
     truth_probabilities: pd.Series, prediction_probabilities: pd.Series, weights: pd.Series
 ) -> float:
-    with warnings.catch_warnings():
-        # sklearn.metrics.average_precision_score sometimes causes warnings internally, but they
-        # appear to be harmless
-        warnings.filterwarnings(
-            'ignore', category=RuntimeWarning, message=r'^invalid value encountered in true_divide$'
-        )
-        ap = sklearn.metrics.average_precision_score(
-            truth_probabilities, prediction_probabilities, sample_weight=weights
-        )
-    return float(ap)
+    return CategoryRanking.from_probabilities(
+        truth_probabilities, prediction_probabilities, weights
+    ).average_precision()
 
 
 def roc(
-    truth_probabilities: pd.Series, prediction_probabilities: pd.Series, weights: pd.Series
+    truth_probabilities: pd.Series,
+    prediction_probabilities: pd.Series,
+    weights: pd.Series,
+    max_points: int | None = None,
 ) -> pd.DataFrame:
-    fp_rates, tp_rates, thresholds = _roc_curve(
+    return CategoryRanking.from_probabilities(
         truth_probabilities, prediction_probabilities, weights
-    )
-
-    roc = pd.DataFrame({'fpr': fp_rates, 'tpr': tp_rates}, index=thresholds, columns=['fpr', 'tpr'])
-
-    if len(fp_rates) > 100:
-        # simplify line using Ramer-Douglas-Peucker algorithm if more than 100 points
-        points = np.vstack((fp_rates, tp_rates)).T
-        # a simple test reduced a roc curve of 2161 items to
-        # epsilon 0      ... 660
-        # epsilon 0.0001 ... 573
-        # epsilon 0.0005 ... 344
-        # epsilon 0.001  ... 197
-        # epsilon 0.005  ...  17
-        mask = rdp(points, return_mask=True, epsilon=0.001)
-        roc = roc[mask]
-
-    return roc
+    ).roc(max_points)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import TypeVarTuple, Unpack
+
+InitArgs = TypeVarTuple('InitArgs')
+
+
+def spawn_pool(
+    workers: int | None,
+    initializer: Callable[[Unpack[InitArgs]], object],
+    initargs: tuple[Unpack[InitArgs]],
+) -> ProcessPoolExecutor:
+    """
+    Create a pool of worker processes, each started by running "initializer" with "initargs".
+
+    Workers are spawned, rather than forked: scoring may already have started threads (e.g. a
+    server's request handlers, or a numerical library's), and forking a process with threads can
+    leave locks that those threads held permanently locked in the child. Since spawned workers
+    start a fresh interpreter, the initializer must pass them any state they need.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer,
+        initargs=initargs,
+    )
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import dataclasses
+import io
+import json
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from isic_challenge_scoring.types import Score, lazy_score_fields
+
+# A compact binary format for scores. It is an uncompressed NumPy ".npz" archive, with:
+# * a "header" array, of a UTF-8 JSON header describing the score's type and each of its fields
+# * for each Series or DataFrame field, a float32 array of its values; labels are in the header
+# * for each dict of DataFrames field (e.g. ROCs), a single contiguous float32 array of all the
+#   DataFrames' rows, with their index as the first column, and an array of row offsets
+# Scalar fields are kept as float64, so "overall" and "validation" are exact.
+
+
+def score_to_bytes(score: Score) -> bytes:
+    field_headers: dict[str, dict[str, Any]] = {}
+    arrays: dict[str, np.ndarray] = {}
+
+    # Lazily computed metrics must be serialized too
+    names = dict.fromkeys(
+        [field.name for field in dataclasses.fields(score)] + lazy_score_fields(type(score))
+    )
+    for name in names:
+        value = getattr(score, name)
+        if value is None:
+            field_headers[name] = {'kind': 'none'}
+        elif isinstance(value, pd.DataFrame):
+            field_headers[name] = {
+                'kind': 'frame',
+                'index': value.index.tolist(),
+                'index_name': value.index.name,
+                'columns': value.columns.tolist(),
+            }
+            arrays[name] = value.to_numpy(dtype=np.float32)
+        elif isinstance(value, pd.Series):
+            field_headers[name] = {
+                'kind': 'series',
+                'index': value.index.tolist(),
+                'index_name': value.index.name,
+                'name': value.name,
+            }
+            arrays[name] = value.to_numpy(dtype=np.float32)
+        elif isinstance(value, dict):
+            frames = [frame.reset_index() for frame in value.values()]
+            field_headers[name] = {
+                'kind': 'frames',
+                'keys': list(value.keys()),
+                'index_name': next(iter(value.values())).index.name if value else None,
+                'columns': frames[0].columns.tolist()[1:] if frames else [],
+            }
+            arrays[name] = (
+                np.concatenate([frame.to_numpy(dtype=np.float32) for frame in frames])
+                if frames
+                else np.empty((0, 0), dtype=np.float32)
+            )
+            arrays[f'{name}.offsets'] = np.cumsum(
+                [0] + [len(frame) for frame in frames], dtype=np.int64
+            )
+        else:
+            field_headers[name] = {'kind': 'scalar'}
+            arrays[name] = np.array(value, dtype=np.float64)
+
+    header = json.dumps({'type': type(score).__name__, 'fields': field_headers}).encode()
+
+    arrays = {'header': np.frombuffer(header, dtype=np.uint8), **arrays}
+
+    stream = io.BytesIO()
+    # Scores are only made of numeric arrays, which are also loaded without pickling
+    np.savez(stream, allow_pickle=False, **arrays)
+    return stream.getvalue()
+
+
+def score_from_bytes(score_class: type[Score], data: bytes) -> Score:
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        header = json.loads(archive['header'].tobytes())
+
+        decoded_class = _find_subclass(score_class, header['type'])
+        # Scores are computed by their constructors, so bypass them
+        score = decoded_class.__new__(decoded_class)
+
+        for name, field_header in header['fields'].items():
+            kind = field_header['kind']
+            value: Any
+            if kind == 'none':
+                value = None
+            elif kind == 'frame':
+                value = pd.DataFrame(
+                    archive[name],
+                    index=pd.Index(field_header['index'], name=field_header['index_name']),
+                    columns=field_header['columns'],
+                )
+            elif kind == 'series':
+                value = pd.Series(
+                    archive[name],
+                    index=pd.Index(field_header['index'], name=field_header['index_name']),
+                    name=field_header['name'],
+                )
+            elif kind == 'frames':
+                rows = archive[name]
+                offsets = archive[f'{name}.offsets']
+                value = {
+                    key: pd.DataFrame(
+                        rows[start:end, 1:],
+                        index=pd.Index(rows[start:end, 0], name=field_header['index_name']),
+                        columns=field_header['columns'],
+                    )
+                    for key, start, end in zip(field_header['keys'], offsets[:-1], offsets[1:])
+                }
+            elif kind == 'scalar':
+                value = float(archive[name])
+            setattr(score, name, value)
+
+    return score
+
+
+def _find_subclass(score_class: type[Score], name: str) -> type[Score]:
+    if score_class.__name__ == name:
+        return score_class
+    for subclass in score_class.__subclasses__():
+        try:
+            return _find_subclass(subclass, name)
+        except ValueError:
+            pass
+    raise ValueError(f'Cannot decode a "{name}" as a "{score_class.__name__}".')
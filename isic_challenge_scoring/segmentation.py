@@ -1,17 +1,22 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future
 from dataclasses import dataclass
 import pathlib
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
 import pandas as pd
 
-from isic_challenge_scoring import metrics
-from isic_challenge_scoring.confusion import create_binary_confusion_matrix
-from isic_challenge_scoring.load_image import ImagePair, iter_image_pairs
+from isic_challenge_scoring import metrics, tracing
+from isic_challenge_scoring.confusion import MaskConfusionKernel
+from isic_challenge_scoring.pool import spawn_pool
+from isic_challenge_scoring.timings import stage
 from isic_challenge_scoring.types import Score, ScoreDict, SeriesDict
-from isic_challenge_scoring.unzip import unzip_all
+
+if TYPE_CHECKING:
+    from isic_challenge_scoring.load_image import ImagePair, ImageSource
 
 
 @dataclass(init=False)
@@ -19,44 +24,60 @@ class SegmentationScore(Score):
     macro_average: pd.Series
 
     def __init__(self, image_pairs: Iterable[ImagePair]) -> None:
-        # TODO: Add weighting
-        confusion_matrics = pd.DataFrame(
-            [
-                create_binary_confusion_matrix(
-                    truth_binary_values=image_pair.truth_image > 128,
-                    prediction_binary_values=image_pair.prediction_image > 128,
-                    name=image_pair.image_id,
-                )
-                for image_pair in image_pairs
-            ]
+        mask_confusion = MaskConfusionKernel()
+        self._score_confusion_matrices(
+            self._confusion_matrix(image_pair, mask_confusion) for image_pair in image_pairs
         )
 
-        per_image = pd.DataFrame(
-            {
-                'accuracy': confusion_matrics.apply(metrics.binary_accuracy, axis='columns'),
-                'sensitivity': confusion_matrics.apply(metrics.binary_sensitivity, axis='columns'),
-                'specificity': confusion_matrics.apply(metrics.binary_specificity, axis='columns'),
-                'jaccard': confusion_matrics.apply(metrics.binary_jaccard, axis='columns'),
-                'threshold_jaccard': confusion_matrics.apply(
-                    metrics.binary_threshold_jaccard, threshold=0.65, axis='columns'
-                ),
-                'dice': confusion_matrics.apply(metrics.binary_dice, axis='columns'),
-            },
-            columns=[
-                'accuracy',
-                'sensitivity',
-                'specificity',
-                'jaccard',
-                'threshold_jaccard',
-                'dice',
-            ],
-        )
+    @classmethod
+    def from_confusion_matrices(cls, confusion_matrices: Iterable[pd.Series]) -> SegmentationScore:
+        """Score the already computed confusion matrix of each image."""
+        score = cls.__new__(cls)
+        score._score_confusion_matrices(confusion_matrices)
+        return score
+
+    def _score_confusion_matrices(self, confusion_matrices: Iterable[pd.Series]) -> None:
+        # TODO: Add weighting
+        confusion_matrics = pd.DataFrame(list(confusion_matrices))
+
+        with stage('segmentation_metrics'):
+            per_image = pd.DataFrame(
+                {
+                    'accuracy': confusion_matrics.apply(metrics.binary_accuracy, axis='columns'),
+                    'sensitivity': confusion_matrics.apply(
+                        metrics.binary_sensitivity, axis='columns'
+                    ),
+                    'specificity': confusion_matrics.apply(
+                        metrics.binary_specificity, axis='columns'
+                    ),
+                    'jaccard': confusion_matrics.apply(metrics.binary_jaccard, axis='columns'),
+                    'threshold_jaccard': confusion_matrics.apply(
+                        metrics.binary_threshold_jaccard, threshold=0.65, axis='columns'
+                    ),
+                    'dice': confusion_matrics.apply(metrics.binary_dice, axis='columns'),
+                },
+                columns=[
+                    'accuracy',
+                    'sensitivity',
+                    'specificity',
+                    'jaccard',
+                    'threshold_jaccard',
+                    'dice',
+                ],
+            )
 
         self.macro_average = per_image.mean(axis='index').rename('macro_average')
 
         self.overall = self.macro_average.at['threshold_jaccard']
         self.validation = self.macro_average.at['threshold_jaccard']
 
+    @staticmethod
+    def _confusion_matrix(image_pair: ImagePair, mask_confusion: MaskConfusionKernel) -> pd.Series:
+        with stage('confusion_matrix', image=image_pair.image_id):
+            return mask_confusion(
+                image_pair.truth_image, image_pair.prediction_image, name=image_pair.image_id
+            )
+
     def to_string(self) -> str:
         output = super().to_string()
         output += '\n\nMacro averaged metrics:\n'
@@ -69,23 +90,65 @@ class SegmentationScore(Score):
         return output
 
     @classmethod
-    def from_dir(cls, truth_path: pathlib.Path, prediction_path: pathlib.Path) -> SegmentationScore:
-        image_pairs = iter_image_pairs(truth_path, prediction_path)
-        return cls(image_pairs)
+    def from_dir(
+        cls, truth_path: ImageSource, prediction_path: ImageSource, workers: int = 1
+    ) -> SegmentationScore:
+        """
+        Score a directory (or an opened ZIP file) of prediction images.
+
+        If workers is greater than 1, image pairs are decoded and reduced to confusion matrices in
+        that many parallel processes.
+        """
+        # Image decoding dependencies are only needed to score images from disk
+        from isic_challenge_scoring.load_image import iter_image_pairs, match_image_pairs
+
+        if workers > 1:
+            return cls.from_confusion_matrices(
+                _confusion_matrices_parallel(
+                    match_image_pairs(truth_path, prediction_path), workers
+                )
+            )
+        return cls(iter_image_pairs(truth_path, prediction_path))
 
     @classmethod
     def from_zip_file(
-        cls, truth_zip_file: pathlib.Path, prediction_zip_file: pathlib.Path
+        cls, truth_zip_file: pathlib.Path, prediction_zip_file: pathlib.Path, workers: int = 1
     ) -> SegmentationScore:
-        truth_path, truth_temp_dir = unzip_all(truth_zip_file)
-        # TODO: If an exception occurs while unzipping prediction_zip_file, truth_temp_dir is not
-        #  cleaned up
-        prediction_path, prediction_temp_dir = unzip_all(prediction_zip_file)
+        from isic_challenge_scoring.unzip import ZipImageSource
 
-        try:
-            score = cls.from_dir(truth_path, prediction_path)
-        finally:
-            truth_temp_dir.cleanup()
-            prediction_temp_dir.cleanup()
+        # Images are decoded directly from each ZIP file, without extracting them
+        with (
+            ZipImageSource(truth_zip_file) as truth_source,
+            ZipImageSource(prediction_zip_file) as prediction_source,
+        ):
+            return cls.from_dir(truth_source, prediction_source, workers)
 
-        return score
+
+def _confusion_matrices_parallel(
+    image_pairs: Iterable[ImagePair], workers: int
+) -> Iterator[pd.Series]:
+    """
+    Load and score each matched image pair in a separate worker process, in order.
+
+    Only a bounded number of pairs are submitted ahead of the one being yielded, so memory use does
+    not grow with the number of images, and only each pair's confusion matrix is returned.
+    """
+    with spawn_pool(
+        workers, tracing.attach, (tracing.current_file(), tracing.current_args())
+    ) as executor:
+        pending: deque[Future[pd.Series]] = deque()
+        for image_pair in image_pairs:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(_score_image_pair, image_pair))
+        while pending:
+            yield pending.popleft().result()
+
+
+# Each worker process scores one image pair at a time, so shares a single kernel
+_worker_mask_confusion = MaskConfusionKernel()
+
+
+def _score_image_pair(image_pair: ImagePair) -> pd.Series:
+    image_pair.load_images()
+    return SegmentationScore._confusion_matrix(image_pair, _worker_mask_confusion)
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import pathlib
+import threading
+import traceback
+from typing import TYPE_CHECKING, Any
+from urllib.parse import parse_qs, urlsplit
+
+from isic_challenge_scoring.classification import ClassificationScore, ClassificationTruth
+from isic_challenge_scoring.pool import spawn_pool
+from isic_challenge_scoring.segmentation import SegmentationScore
+from isic_challenge_scoring.types import ClassificationMetric, ScoreDict, ScoreError
+from isic_challenge_scoring.unzip import ZipImageSource
+
+if TYPE_CHECKING:
+    from isic_challenge_scoring.load_image import ImageSource
+
+
+class ScoringServer(ThreadingHTTPServer):
+    """
+    An HTTP JSON service, which scores submissions against preloaded ground truth.
+
+    Submissions are scored in a pool of warm worker processes, each of which loads all ground
+    truth once, on startup. The endpoints are:
+    * "POST /classification/<truth name>[?metric=<metric>]", with a prediction CSV body
+    * "POST /segmentation/<truth name>", with a prediction ZIP body
+    * "GET /health"
+    * "GET /queue", the number of submissions waiting for and being scored by workers
+
+    A submission which cannot be scored returns status 400, with its ScoreError as "error"; any
+    other failure to score it returns status 500. At most "max_queued" submissions wait for a
+    worker; beyond that, submissions return status 503. Submissions larger than "max_body_size"
+    bytes return status 413, without being read.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        server_address: tuple[str, int],
+        classification_truths: dict[str, ClassificationTruth],
+        segmentation_truths: dict[str, pathlib.Path],
+        workers: int | None = None,
+        max_queued: int = 100,
+        max_body_size: int = 2**30,
+    ) -> None:
+        self.classification_truth_names = sorted(classification_truths)
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.max_queued = max_queued
+        self.max_body_size = max_body_size
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._zip_sources = contextlib.ExitStack()
+        self._executor: ProcessPoolExecutor | None = None
+
+        super().__init__(server_address, _ScoringRequestHandler)
+        try:
+            # Segmentation ground truth ZIPs are read directly into memory, without extracting them
+            self.segmentation_truths: dict[str, ImageSource] = {
+                name: (
+                    truth_path
+                    if truth_path.is_dir()
+                    else self._zip_sources.enter_context(ZipImageSource(truth_path))
+                )
+                for name, truth_path in segmentation_truths.items()
+            }
+
+            self._executor = spawn_pool(
+                self.workers,
+                _init_server_worker,
+                (classification_truths, self.segmentation_truths),
+            )
+            # Start every worker now, so no submission waits for one to start
+            for future in [self._executor.submit(_warm_up_worker) for _ in range(self.workers)]:
+                future.result()
+        except BaseException:
+            self.server_close()
+            raise
+
+    def server_close(self) -> None:
+        super().server_close()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+        self._zip_sources.close()
+
+    def queue_status(self) -> dict[str, int]:
+        with self._pending_lock:
+            pending = self._pending
+        return {
+            'queued': max(pending - self.workers, 0),
+            'running': min(pending, self.workers),
+            'workers': self.workers,
+            'max_queued': self.max_queued,
+        }
+
+    def score(self, function: Callable[..., ScoreDict], *args: Any) -> ScoreDict:
+        """Score in a worker, blocking until done; raise _QueueFullError if too many wait."""
+        with self._pending_lock:
+            if self._pending >= self.workers + self.max_queued:
+                raise _QueueFullError()
+            self._pending += 1
+
+        assert self._executor is not None
+        future: Future[ScoreDict]
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._finish_pending()
+            raise
+        future.add_done_callback(lambda _: self._finish_pending())
+        return future.result()
+
+    def _finish_pending(self) -> None:
+        with self._pending_lock:
+            self._pending -= 1
+
+
+class _QueueFullError(Exception):
+    pass
+
+
+class _ScoringRequestHandler(BaseHTTPRequestHandler):
+    server: ScoringServer
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = urlsplit(self.path).path
+        if path == '/health':
+            self._send_json(
+                HTTPStatus.OK,
+                {
+                    'status': 'ok',
+                    'classification': self.server.classification_truth_names,
+                    'segmentation': sorted(self.server.segmentation_truths),
+                },
+            )
+        elif path == '/queue':
+            self._send_json(HTTPStatus.OK, self.server.queue_status())
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown path: "{path}".')
+
+    def do_POST(self) -> None:  # noqa: N802
+        url = urlsplit(self.path)
+        task, _, truth_name = url.path.strip('/').partition('/')
+        query = parse_qs(url.query)
+
+        if task == 'classification':
+            truth_names = self.server.classification_truth_names
+        elif task == 'segmentation':
+            truth_names = sorted(self.server.segmentation_truths)
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown path: "{url.path}".')
+            return
+        if truth_name not in truth_names:
+            self._send_error(HTTPStatus.NOT_FOUND, f'Unknown {task} ground truth: "{truth_name}".')
+            return
+
+        if 'Content-Length' not in self.headers:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, 'A Content-Length header is required.')
+            return
+        try:
+            content_length = int(self.headers['Content-Length'])
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self._send_error(
+                HTTPStatus.BAD_REQUEST, 'The Content-Length header must be a non-negative integer.'
+            )
+            return
+        if content_length > self.server.max_body_size:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self._send_error(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f'Submissions may be at most {self.server.max_body_size} bytes.',
+            )
+            return
+        data = self.rfile.read(content_length)
+
+        try:
+            if task == 'classification':
+                metric_value = query.get('metric', [ClassificationMetric.BALANCED_ACCURACY.value])
+                try:
+                    target_metric = ClassificationMetric(metric_value[-1])
+                except ValueError:
+                    self._send_error(
+                        HTTPStatus.BAD_REQUEST, f'Unknown metric: "{metric_value[-1]}".'
+                    )
+                    return
+                score = self.server.score(_score_classification, truth_name, data, target_metric)
+            else:
+                score = self.server.score(_score_segmentation, truth_name, data)
+        except ScoreError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        except _QueueFullError:
+            self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, 'Too many submissions are queued.')
+        except Exception:
+            # e.g. an image which cannot be decoded, or a worker process which crashed
+            self.log_error('Could not score a submission:\n%s', traceback.format_exc())
+            self._send_error(
+                HTTPStatus.INTERNAL_SERVER_ERROR, 'An error occurred while scoring the submission.'
+            )
+        else:
+            self._send_json(HTTPStatus.OK, score)
+
+    def _send_error(self, status: HTTPStatus, message: str) -> None:
+        self._send_json(status, {'error': message})
+
+    def _send_json(self, status: HTTPStatus, body: Any) -> None:
+        encoded_body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded_body)))
+        self.end_headers()
+        self.wfile.write(encoded_body)
+
+
+# The ground truth of each ScoringServer worker process
+_server_classification_truths: dict[str, ClassificationTruth] = {}
+_server_segmentation_truths: dict[str, ImageSource] = {}
+
+
+def _init_server_worker(
+    classification_truths: dict[str, ClassificationTruth],
+    segmentation_truths: dict[str, ImageSource],
+) -> None:
+    _server_classification_truths.update(classification_truths)
+    _server_segmentation_truths.update(segmentation_truths)
+
+
+def _warm_up_worker() -> None:
+    # Image decoding is only imported when first used
+    import isic_challenge_scoring.load_image  # noqa: F401
+
+
+def _score_classification(
+    truth_name: str, data: bytes, target_metric: ClassificationMetric
+) -> ScoreDict:
+    # Decoding errors are raised while parsing, as a ScoreError
+    prediction_file_stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8')
+    score = ClassificationScore.from_truth(
+        _server_classification_truths[truth_name], prediction_file_stream, target_metric
+    )
+    return score.to_dict(rocs=False)
+
+
+def _score_segmentation(truth_name: str, data: bytes) -> ScoreDict:
+    # The submission is only ever held in memory
+    with ZipImageSource(io.BytesIO(data), name='prediction.zip') as prediction_source:
+        score = SegmentationScore.from_dir(
+            _server_segmentation_truths[truth_name], prediction_source
+        )
+    return score.to_dict()
@@ -4,19 +4,17 @@ from typing import cast
 import pandas as pd
 
 from isic_challenge_scoring import metrics
-from isic_challenge_scoring.confusion import (
-    create_binary_confusion_matrix,
-    normalize_confusion_matrix,
-)
+from isic_challenge_scoring.confusion import MaskConfusionKernel, normalize_confusion_matrix
 from isic_challenge_scoring.load_image import iter_image_pairs
 
 
 def score(truth_path: pathlib.Path, prediction_path: pathlib.Path):
+    mask_confusion = MaskConfusionKernel()
     confusion_matrics = pd.DataFrame(
         [
-            create_binary_confusion_matrix(
-                truth_binary_values=image_pair.truth_image > 128,
-                prediction_binary_values=image_pair.prediction_image > 128,
+            mask_confusion(
+                image_pair.truth_image,
+                image_pair.prediction_image,
                 name=(cast(str, image_pair.attribute_id), image_pair.image_id),
             )
             for image_pair in iter_image_pairs(truth_path, prediction_path)
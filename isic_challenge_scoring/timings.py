@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+import contextlib
+from contextvars import ContextVar
+from dataclasses import dataclass
+import time
+import tracemalloc
+from types import TracebackType
+from typing import TYPE_CHECKING
+
+from isic_challenge_scoring import tracing
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass
+class _StageTotal:
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_memory: int = 0
+    count: int = 0
+
+
+@dataclass
+class _ActiveStage:
+    name: str
+    wall_start: float
+    cpu_start: float
+    start_memory: int
+    # The highest traced memory so far, excluding the current tracemalloc peak
+    peak_memory: int
+
+
+class Recorder:
+    """
+    Per-stage wall time, CPU time and peak allocation, accumulated over every run of each stage.
+
+    Peak allocation is the most memory allocated above that at the start of the stage, as traced by
+    tracemalloc. Stages may be nested, in which case an outer stage's totals include its inner
+    stages. CPU time is for the whole process, and stages run in other processes are not recorded.
+    Times include the overhead of tracing memory, which slows every allocation.
+    """
+
+    def __init__(self) -> None:
+        self.totals: dict[str, _StageTotal] = {}
+        self._active: list[_ActiveStage] = []
+
+    def enter(self, name: str) -> None:
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        if self._active:
+            self._active[-1].peak_memory = max(self._active[-1].peak_memory, peak_memory)
+        # There is only one peak, so it is reset for each stage, and restored from the stack
+        tracemalloc.reset_peak()
+        self.totals.setdefault(name, _StageTotal())
+        self._active.append(
+            _ActiveStage(
+                name, time.perf_counter(), time.process_time(), current_memory, current_memory
+            )
+        )
+
+    def exit(self) -> None:
+        active = self._active.pop()
+        wall_time = time.perf_counter() - active.wall_start
+        cpu_time = time.process_time() - active.cpu_start
+        peak_memory = max(active.peak_memory, tracemalloc.get_traced_memory()[1])
+        if self._active:
+            self._active[-1].peak_memory = max(self._active[-1].peak_memory, peak_memory)
+        tracemalloc.reset_peak()
+
+        total = self.totals[active.name]
+        total.wall_time += wall_time
+        total.cpu_time += cpu_time
+        total.peak_memory = max(total.peak_memory, peak_memory - active.start_memory)
+        total.count += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get the totals of each stage, in the order in which each was first started."""
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                'wall_time': [total.wall_time for total in self.totals.values()],
+                'cpu_time': [total.cpu_time for total in self.totals.values()],
+                'peak_memory': [total.peak_memory for total in self.totals.values()],
+                'count': [total.count for total in self.totals.values()],
+            },
+            index=pd.Index(list(self.totals.keys()), name='stage'),
+            columns=['wall_time', 'cpu_time', 'peak_memory', 'count'],
+        )
+
+
+class _RecordedStage:
+    def __init__(
+        self,
+        recorder: Recorder | None,
+        writer: tracing.TraceWriter | None,
+        name: str,
+        args: dict[str, str],
+    ) -> None:
+        self._recorder = recorder
+        self._writer = writer
+        self._name = name
+        self._args = args
+        self._start = 0
+
+    def __enter__(self) -> None:
+        if self._recorder is not None:
+            self._recorder.enter(self._name)
+        self._start = time.time_ns()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        if self._writer is not None:
+            self._writer.write_span(
+                self._name, self._start, time.time_ns(), {**tracing.current_args(), **self._args}
+            )
+        if self._recorder is not None:
+            self._recorder.exit()
+
+
+_recorder: ContextVar[Recorder | None] = ContextVar('_recorder', default=None)
+# When neither recording nor tracing, every stage shares this, so instrumentation costs only
+# lookups
+_unrecorded_stage = contextlib.nullcontext()
+
+
+def stage(name: str, **args: str) -> contextlib.AbstractContextManager[None]:
+    """
+    Instrument a stage of scoring, if recording or tracing.
+
+    Any args (e.g. the image) are added to the stage's trace span.
+    """
+    recorder = _recorder.get()
+    writer = tracing.current_writer()
+    if recorder is None and writer is None:
+        return _unrecorded_stage
+    return _RecordedStage(recorder, writer, name, args)
+
+
+@contextlib.contextmanager
+def record() -> Iterator[Recorder]:
+    """Record every stage which runs within this context."""
+    recorder = Recorder()
+    token = _recorder.set(recorder)
+    # Allow an outer user of tracemalloc to continue tracing
+    start_tracing = not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+    try:
+        yield recorder
+    finally:
+        if start_tracing:
+            tracemalloc.stop()
+        _recorder.reset(token)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+import contextlib
+from contextvars import ContextVar
+import json
+import os
+import pathlib
+import threading
+
+# Trace files are in the Chrome "JSON Array Format": an opening "[" line, then one event object
+# per line, each followed by a comma. Trace viewers (e.g. chrome://tracing and Perfetto) accept
+# the missing closing "]", so every process may append events to the same file, as they finish.
+
+
+class TraceWriter:
+    """Append span events to a trace file, with one write per event, so processes can share it."""
+
+    def __init__(self, trace_file: pathlib.Path, append: bool = False) -> None:
+        self.trace_file = trace_file
+        flags = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+        if not append:
+            flags |= os.O_TRUNC
+        self._fd = os.open(trace_file, flags, 0o644)
+        if not append:
+            os.write(self._fd, b'[\n')
+
+    def write_span(self, name: str, start: int, end: int, args: dict[str, str]) -> None:
+        """Write a span, given its start and end as nanoseconds since the epoch."""
+        event = {
+            'name': name,
+            'cat': 'scoring',
+            # A "complete" event, with both a start and a duration
+            'ph': 'X',
+            'ts': start / 1000,
+            'dur': (end - start) / 1000,
+            'pid': os.getpid(),
+            'tid': threading.get_native_id(),
+            'args': args,
+        }
+        os.write(self._fd, f'{json.dumps(event)},\n'.encode())
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+_writer: ContextVar[TraceWriter | None] = ContextVar('_writer', default=None)
+_args: ContextVar[dict[str, str] | None] = ContextVar('_args', default=None)
+
+
+def current_writer() -> TraceWriter | None:
+    return _writer.get()
+
+
+def current_file() -> pathlib.Path | None:
+    """Get the trace file of this context, to attach worker processes to."""
+    writer = _writer.get()
+    return writer.trace_file if writer is not None else None
+
+
+def current_args() -> dict[str, str]:
+    return _args.get() or {}
+
+
+@contextlib.contextmanager
+def trace(trace_file: pathlib.Path) -> Iterator[TraceWriter]:
+    """Write every stage which runs within this context to a new trace file."""
+    writer = TraceWriter(trace_file)
+    token = _writer.set(writer)
+    try:
+        yield writer
+    finally:
+        _writer.reset(token)
+        writer.close()
+
+
+def attach(trace_file: pathlib.Path | None, args: dict[str, str]) -> None:
+    """Append the stages of this worker process to an existing trace file, if any."""
+    if trace_file is not None:
+        _writer.set(TraceWriter(trace_file, append=True))
+    _args.set(args)
+
+
+@contextlib.contextmanager
+def span_args(**args: str) -> Iterator[None]:
+    """Add arguments (e.g. the submission) to every span which starts within this context."""
+    token = _args.set({**current_args(), **args})
+    try:
+        yield
+    finally:
+        _args.reset(token)
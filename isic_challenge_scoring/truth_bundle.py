@@ -0,0 +1,81 @@
+import json
+import pathlib
+import struct
+from typing import Any
+
+import numpy as np
+
+# A compact, memory-mappable binary format for pre-parsed classification ground truth. A bundle
+# is a single file, laid out as:
+# * the magic bytes
+# * the length of the header, as a little-endian uint64
+# * a UTF-8 JSON header, describing the metadata and arrays
+# * each array's raw bytes, aligned so it can be memory-mapped in place
+MAGIC = b'ISICTRB\x01'
+_HEADER_LENGTH = struct.Struct('<Q')
+_ALIGNMENT = 64
+
+
+def is_truth_bundle(path: pathlib.Path) -> bool:
+    with path.open('rb') as stream:
+        return stream.read(len(MAGIC)) == MAGIC
+
+
+def write_truth_bundle(
+    bundle_file: pathlib.Path,
+    metadata: dict[str, Any],
+    arrays: dict[str, np.ndarray],
+) -> None:
+    array_headers = {}
+    offset = 0
+    for name, array in arrays.items():
+        array_headers[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+        }
+        offset += _aligned(array.nbytes)
+
+    header = json.dumps({**metadata, 'arrays': array_headers}).encode()
+    # Arrays are aligned relative to the start of the file
+    data_start = _aligned(len(MAGIC) + _HEADER_LENGTH.size + len(header))
+    header = header.ljust(data_start - len(MAGIC) - _HEADER_LENGTH.size, b' ')
+
+    with bundle_file.open('wb') as stream:
+        stream.write(MAGIC)
+        stream.write(_HEADER_LENGTH.pack(len(header)))
+        stream.write(header)
+        for array in arrays.values():
+            data = np.ascontiguousarray(array).tobytes()
+            stream.write(data.ljust(_aligned(len(data)), b'\0'))
+
+
+def read_truth_bundle(bundle_file: pathlib.Path) -> tuple[dict[str, Any], dict[str, np.ndarray]]:
+    """Read a bundle's metadata, and memory-map its arrays read-only."""
+    with bundle_file.open('rb') as stream:
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'Not a truth bundle: "{bundle_file.name}".')
+        (header_length,) = _HEADER_LENGTH.unpack(stream.read(_HEADER_LENGTH.size))
+        metadata = json.loads(stream.read(header_length))
+
+    data_start = len(MAGIC) + _HEADER_LENGTH.size + header_length
+    arrays = {
+        name: (
+            np.memmap(
+                bundle_file,
+                dtype=np.dtype(array_header['dtype']),
+                mode='r',
+                offset=data_start + array_header['offset'],
+                shape=tuple(array_header['shape']),
+            )
+            if np.prod(array_header['shape'])
+            # Empty arrays cannot be memory-mapped
+            else np.empty(array_header['shape'], dtype=np.dtype(array_header['dtype']))
+        )
+        for name, array_header in metadata.pop('arrays').items()
+    }
+    return metadata, arrays
+
+
+def _aligned(length: int) -> int:
+    return -(-length // _ALIGNMENT) * _ALIGNMENT
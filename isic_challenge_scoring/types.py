@@ -1,10 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import enum
+from functools import cached_property
+from typing import TYPE_CHECKING, cast
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class ScoreError(Exception):
     pass
 
 
+class ClassificationMetric(enum.Enum):
+    BALANCED_ACCURACY = 'balanced_accuracy'
+    AUC = 'auc'
+    AVERAGE_PRECISION = 'ap'
+    DICE = 'dice'
+
+
 SeriesDict = dict[str, float]
 DataFrameDict = dict[str, SeriesDict]
 RocDict = dict[str, list[float]]
@@ -15,6 +28,8 @@ ScoreDict = dict[str, float | None | SeriesDict | DataFrameDict | dict[str, RocD
 class Score:
     overall: float
     validation: float | None
+    # The time and memory used by each stage of scoring, only if it was recorded
+    timings: 'pd.DataFrame | None' = field(default=None, init=False, repr=False, compare=False)
 
     def to_string(self) -> str:
         output = f'Overall: {self.overall}\n'
@@ -22,4 +37,32 @@ class Score:
         return output
 
     def to_dict(self) -> ScoreDict:
-        return {'overall': self.overall, 'validation': self.validation}
+        output: ScoreDict = {'overall': self.overall, 'validation': self.validation}
+        if self.timings is not None:
+            output['timings'] = cast(DataFrameDict, self.timings.to_dict(orient='index'))
+        return output
+
+    def to_bytes(self) -> bytes:
+        """Serialize the score compactly, with all tables and curves as float32 arrays."""
+        from isic_challenge_scoring.score_bytes import score_to_bytes
+
+        return score_to_bytes(self)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Score':
+        """Deserialize a score, of this type or any subclass, from "to_bytes" output."""
+        from isic_challenge_scoring.score_bytes import score_from_bytes
+
+        return score_from_bytes(cls, data)
+
+
+def lazy_score_fields(score_class: type[Score]) -> list[str]:
+    """Get the names of the public, lazily computed metrics of a type of score."""
+    return list(
+        dict.fromkeys(
+            name
+            for klass in reversed(score_class.__mro__)
+            for name, value in vars(klass).items()
+            if isinstance(value, cached_property) and not name.startswith('_')
+        )
+    )
@@ -1,15 +1,27 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import functools
 import os
 import pathlib
 import shutil
 import tempfile
+from types import TracebackType
+from typing import IO
 
 import zipfile_deflate64 as zipfile
 
+from isic_challenge_scoring.timings import stage
 from isic_challenge_scoring.types import ScoreError
 
 
 def extract_zip(zip_path: pathlib.Path, output_path: pathlib.Path, flatten: bool = True) -> None:
     """Extract a zip file, optionally flattening it into a single directory."""
+    with stage('extract_zip'):
+        _extract_zip(zip_path, output_path, flatten)
+
+
+def _extract_zip(zip_path: pathlib.Path, output_path: pathlib.Path, flatten: bool) -> None:
     try:
         with zipfile.ZipFile(zip_path) as zf:
             if flatten:
@@ -42,6 +54,104 @@ def unzip_all(input_file: pathlib.Path) -> tuple[pathlib.Path, tempfile.Temporar
     output_temp_dir = tempfile.TemporaryDirectory()
     output_path = pathlib.Path(output_temp_dir.name)
 
-    extract_zip(input_file, output_path)
+    try:
+        extract_zip(input_file, output_path)
+    except BaseException:
+        output_temp_dir.cleanup()
+        raise
 
     return output_path, output_temp_dir
+
+
+class ZipImageSource:
+    """
+    The files of a ZIP file, read directly into memory, without extracting them.
+
+    Members are indexed by base name from the central directory, as extract_zip flattens them, so
+    this can be used in place of a directory of extracted files.
+
+    The ZIP file may also be an in-memory file object (e.g. an io.BytesIO), in which case "name"
+    identifies it in errors. Only a ZIP file path can be sent to worker processes.
+    """
+
+    def __init__(self, zip_file: pathlib.Path | IO[bytes], name: str | None = None) -> None:
+        self.zip_file = zip_file
+        self.name = name if name is not None else getattr(zip_file, 'name', 'ZIP file')
+        try:
+            self._zip_file = zipfile.ZipFile(zip_file)
+        except zipfile.BadZipfile as e:
+            raise ScoreError(f'Could not read ZIP file "{self.name}": {str(e)}.')
+
+        self._members: dict[str, zipfile.ZipInfo] = {}
+        for member_info in self._zip_file.infolist():
+            if member_info.filename.startswith('__MACOSX'):
+                # Ignore Mac OS X metadata
+                continue
+            member_base_name = os.path.basename(member_info.filename)
+            if not member_base_name:
+                # Skip directories
+                continue
+            # As when extracting, a later member with the same base name replaces an earlier one
+            self._members[member_base_name] = member_info
+
+    def __enter__(self) -> ZipImageSource:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __reduce__(self) -> tuple[object, tuple[pathlib.Path]]:
+        if not isinstance(self.zip_file, pathlib.Path):
+            raise TypeError('A ZipImageSource of a file object cannot be sent to other processes.')
+        # Members are sent to worker processes individually, so rather than re-reading the central
+        # directory for each, every worker process opens the ZIP file only once
+        return _shared_zip_image_source, (self.zip_file,)
+
+    def close(self) -> None:
+        self._zip_file.close()
+
+    def iterdir(self) -> list[ZipMember]:
+        return [ZipMember(self, member_base_name) for member_base_name in self._members]
+
+    def open(self, member_base_name: str) -> IO[bytes]:
+        """Open a member as a stream, which is decompressed only as far as it is read."""
+        try:
+            return self._zip_file.open(self._members[member_base_name])
+        except zipfile.BadZipfile as e:
+            raise ScoreError(f'Could not read ZIP file "{self.name}": {str(e)}.')
+
+    def read_bytes(self, member_base_name: str) -> bytes:
+        try:
+            return self._zip_file.read(self._members[member_base_name])
+        except zipfile.BadZipfile as e:
+            raise ScoreError(f'Could not read ZIP file "{self.name}": {str(e)}.')
+
+
+@functools.cache
+def _shared_zip_image_source(zip_path: pathlib.Path) -> ZipImageSource:
+    return ZipImageSource(zip_path)
+
+
+@dataclass(frozen=True)
+class ZipMember:
+    """A file of a ZipImageSource, with the parts of the pathlib.Path interface used to score it."""
+
+    source: ZipImageSource
+    name: str
+
+    @property
+    def stem(self) -> str:
+        return pathlib.PurePath(self.name).stem
+
+    def open(self, mode: str = 'rb') -> IO[bytes]:
+        if mode != 'rb':
+            raise ValueError(f'ZIP members can only be opened for binary reading, not "{mode}".')
+        return self.source.open(self.name)
+
+    def read_bytes(self) -> bytes:
+        return self.source.read_bytes(self.name)
@@ -50,6 +50,30 @@ def classification_prediction_file_path() -> pathlib.Path:
     return data_dir / 'classification' / 'prediction' / 'ISIC2018_Task3_prediction.csv'
 
 
+@pytest.fixture
+def synthetic_classification() -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Return random truth probabilities, prediction probabilities and truth weights."""
+    rng = np.random.default_rng(0)
+    categories = pd.Index(['MEL', 'NV', 'BCC', 'AKIEC'])
+    images = pd.Index([f'ISIC_{i:07d}' for i in range(500)], name='image')
+    truth_probabilities = pd.DataFrame(
+        np.eye(len(categories))[rng.integers(len(categories), size=len(images))],
+        index=images,
+        columns=categories,
+    )
+    prediction_probabilities = pd.DataFrame(
+        rng.random((len(images), len(categories))), index=images, columns=categories
+    )
+    truth_weights = pd.DataFrame(
+        {
+            'score_weight': rng.integers(2, size=len(images)).astype(np.float64),
+            'validation_weight': rng.integers(2, size=len(images)).astype(np.float64),
+        },
+        index=images,
+    )
+    return truth_probabilities, prediction_probabilities, truth_weights
+
+
 @pytest.fixture
 def real_truth_binary_values(segmentation_truth_path) -> np.ndarray:
     # TODO: don't hardcode this filename
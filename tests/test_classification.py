@@ -1,6 +1,14 @@
+import io
+import json
+
+from click.testing import CliRunner
+import numpy as np
 import pytest
 
+from isic_challenge_scoring import metrics
+from isic_challenge_scoring.__main__ import cli
 from isic_challenge_scoring.classification import ClassificationMetric, ClassificationScore
+from isic_challenge_scoring.types import ScoreError
 
 
 @pytest.mark.parametrize(
@@ -19,3 +27,368 @@ def test_score(classification_truth_file_path, classification_prediction_file_pa
         target_metric,
     )
     assert isinstance(score.validation, float)
+
+
+def test_score_unsorted_truth(categories):
+    truth_rows = [
+        'ISIC_0000125,0.0,0.0,1.0,0.0,0.0,0.0,0.0,1.0,1.0',
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,1.0',
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,0.0,1.0,0.0',
+        'ISIC_0000126,1.0,0.0,0.0,0.0,0.0,0.0,0.0,1.0,1.0',
+    ]
+    truth_header = 'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC,score_weight,validation_weight\n'
+    prediction_csv = (
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000123,0.9,0.1,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0.8,0.2,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000125,0.1,0.0,0.7,0.0,0.0,0.0,0.2\n'
+        'ISIC_0000126,0.6,0.0,0.0,0.4,0.0,0.0,0.0\n'
+    )
+
+    scores = [
+        ClassificationScore.from_stream(
+            io.StringIO(truth_header + '\n'.join(rows) + '\n'),
+            io.StringIO(prediction_csv),
+            ClassificationMetric.AUC,
+        )
+        for rows in [truth_rows, sorted(truth_rows)]
+    ]
+
+    # Weights must stay aligned with their rows, regardless of the truth file order
+    assert scores[0].per_category.equals(scores[1].per_category)
+    assert scores[0].aggregate.equals(scores[1].aggregate)
+
+
+@pytest.mark.parametrize(
+    'target_metric',
+    [
+        ClassificationMetric.AUC,
+        ClassificationMetric.BALANCED_ACCURACY,
+        ClassificationMetric.AVERAGE_PRECISION,
+        ClassificationMetric.DICE,
+    ],
+)
+def test_score_extra_weights(target_metric):
+    truth_csv = (
+        'image,MEL,NV,BCC,score_weight,validation_weight,private_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,1.0,0.0,1.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,1.0,1.0,0.0\n'
+        'ISIC_0000125,0.0,0.0,1.0,0.0,1.0,1.0\n'
+        'ISIC_0000126,1.0,0.0,0.0,1.0,1.0,1.0\n'
+        'ISIC_0000127,0.0,1.0,0.0,0.0,1.0,1.0\n'
+        'ISIC_0000128,0.0,0.0,1.0,1.0,0.0,1.0\n'
+    )
+    prediction_csv = (
+        'image,MEL,NV,BCC\n'
+        'ISIC_0000123,0.9,0.1,0.0\n'
+        'ISIC_0000124,0.8,0.2,0.0\n'
+        'ISIC_0000125,0.1,0.0,0.9\n'
+        'ISIC_0000126,0.3,0.6,0.1\n'
+        'ISIC_0000127,0.2,0.7,0.1\n'
+        'ISIC_0000128,0.4,0.3,0.3\n'
+    )
+
+    score = ClassificationScore.from_stream(
+        io.StringIO(truth_csv), io.StringIO(prediction_csv), target_metric
+    )
+    # Score the private weights as if they were the score weights
+    private_score = ClassificationScore.from_stream(
+        io.StringIO(
+            truth_csv.replace('score_weight', 'public_weight').replace(
+                'private_weight', 'score_weight'
+            )
+        ),
+        io.StringIO(prediction_csv),
+        target_metric,
+    )
+
+    assert score.per_weight.index.tolist() == [
+        'score_weight',
+        'validation_weight',
+        'private_weight',
+    ]
+    assert score.per_weight.at['score_weight'] == score.overall
+    assert score.per_weight.at['validation_weight'] == score.validation
+    assert score.per_weight.at['private_weight'] == private_score.overall
+
+
+def test_score_undefined_auc():
+    truth_csv = (
+        'image,MEL,NV,BCC,score_weight,validation_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,1.0,1.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,1.0,1.0\n'
+        'ISIC_0000125,1.0,0.0,0.0,1.0,1.0\n'
+        'ISIC_0000126,0.0,1.0,0.0,1.0,1.0\n'
+    )
+    prediction_csv = (
+        'image,MEL,NV,BCC\n'
+        'ISIC_0000123,0.9,0.1,0.0\n'
+        'ISIC_0000124,0.3,0.6,0.1\n'
+        'ISIC_0000125,0.4,0.2,0.4\n'
+        'ISIC_0000126,0.5,0.4,0.1\n'
+    )
+
+    score = ClassificationScore.from_stream(
+        io.StringIO(truth_csv), io.StringIO(prediction_csv), ClassificationMetric.AUC
+    )
+
+    # BCC has no truly positive images
+    assert np.isnan(score.per_category.at['BCC', 'auc'])
+    assert np.isnan(score.per_category.at['BCC', 'auc_sens_80'])
+    assert score.per_category.at['BCC', 'ap'] == 0.0
+    # Undefined categories are excluded from the macro average, and so from the target metric
+    assert score.macro_average.at['auc'] == pytest.approx(0.875)
+    assert score.macro_average.at['auc'] == score.per_category.loc[['MEL', 'NV'], 'auc'].mean()
+    assert score.macro_average.at['ap'] == score.per_category['ap'].mean()
+    assert score.overall == score.macro_average.at['auc']
+
+
+def test_score_output_schema():
+    truth_csv = (
+        'image,MEL,NV,score_weight,validation_weight,private_weight\n'
+        'ISIC_0000123,1.0,0.0,1.0,1.0,1.0\n'
+        'ISIC_0000124,0.0,1.0,1.0,1.0,1.0\n'
+        'ISIC_0000125,1.0,0.0,1.0,1.0,0.0\n'
+    )
+    prediction_csv = (
+        'image,MEL,NV\n' 'ISIC_0000123,0.9,0.1\n' 'ISIC_0000124,0.2,0.8\n' 'ISIC_0000125,0.6,0.4\n'
+    )
+
+    score = ClassificationScore.from_stream(
+        io.StringIO(truth_csv), io.StringIO(prediction_csv), ClassificationMetric.AUC
+    )
+    score_dict = score.to_dict()
+
+    assert list(score_dict.keys()) == [
+        'overall',
+        'validation',
+        'per_category',
+        'macro_average',
+        'aggregate',
+        'per_weight',
+        'rocs',
+    ]
+    # The target metric for every weight column
+    assert score_dict['per_weight'] == {
+        'score_weight': score.overall,
+        'validation_weight': score.validation,
+        'private_weight': score.per_weight.at['private_weight'],
+    }
+    assert list(score.to_dict(rocs=False).keys()) == list(score_dict.keys())[:-1]
+    assert score.to_string().endswith(f'Target metric per weight:\n{score.per_weight.to_string()}')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_score_many(tmp_path, workers):
+    truth_file = tmp_path / 'truth.csv'
+    truth_file.write_text(
+        'image,MEL,NV,BCC,score_weight,validation_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,1.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,1.0,1.0\n'
+        'ISIC_0000125,0.0,0.0,1.0,1.0,1.0\n'
+    )
+    prediction_files = [tmp_path / f'prediction_{i}.csv' for i in range(3)]
+    prediction_files[0].write_text(
+        'image,MEL,NV,BCC\n'
+        'ISIC_0000123,0.9,0.1,0.0\n'
+        'ISIC_0000124,0.8,0.2,0.0\n'
+        'ISIC_0000125,0.1,0.0,0.9\n'
+    )
+    prediction_files[1].write_text(
+        'image,MEL,NV,BCC\n'
+        'ISIC_0000123,0.9,0.1,0.0\n'
+        'ISIC_0000124,0.1,0.9,0.0\n'
+        'ISIC_0000125,0.1,0.0,0.9\n'
+    )
+    prediction_files[2].write_text('image,MEL,NV,BCC\nISIC_0000123,0.9,0.1,0.0\n')
+
+    results = dict(
+        ClassificationScore.score_many(
+            truth_file, prediction_files, ClassificationMetric.BALANCED_ACCURACY, workers=workers
+        )
+    )
+
+    assert results.keys() == set(prediction_files)
+    for prediction_file in prediction_files[:2]:
+        expected_score = ClassificationScore.from_file(
+            truth_file, prediction_file, ClassificationMetric.BALANCED_ACCURACY
+        )
+        assert results[prediction_file].to_dict() == expected_score.to_dict()
+    assert isinstance(results[prediction_files[2]], ScoreError)
+    assert 'Missing images in CSV' in str(results[prediction_files[2]])
+
+
+def test_score_many_invalid_truth(tmp_path):
+    truth_file = tmp_path / 'truth.csv'
+    truth_file.write_text('MEL,NV,BCC\n1.0,0.0,0.0\n')
+
+    # This is raised before any result is requested
+    with pytest.raises(KeyError, match=r'Missing column in CSV'):
+        ClassificationScore.score_many(
+            truth_file, [tmp_path / 'prediction.csv'], ClassificationMetric.BALANCED_ACCURACY
+        )
+
+
+def test_score_parallel_categories(synthetic_classification):
+    serial_score, parallel_score = (
+        ClassificationScore(*synthetic_classification, ClassificationMetric.AUC, workers=workers)
+        for workers in [1, 2]
+    )
+
+    # Results must be bit-identical, including the ROCs
+    assert json.dumps(parallel_score.to_dict(rocs=True)) == json.dumps(
+        serial_score.to_dict(rocs=True)
+    )
+
+
+def test_score_bootstrap(synthetic_classification):
+    score = ClassificationScore(*synthetic_classification, ClassificationMetric.AUC)
+
+    bootstrap = score.bootstrap(100, seed=1)
+
+    assert bootstrap.replicates == 100
+    assert bootstrap.auc.columns.equals(score.per_category.index)
+    # The target metric is the mean of the category AUCs
+    assert bootstrap.overall.to_numpy() == pytest.approx(bootstrap.auc.mean(axis=1).to_numpy())
+    interval = bootstrap.overall_interval()
+    assert interval.at['lower'] < score.overall < interval.at['upper']
+    intervals = bootstrap.per_category_intervals()
+    assert (intervals['auc_lower'] <= intervals['auc_upper']).all()
+    assert (intervals['ap_lower'] <= intervals['ap_upper']).all()
+
+    # Replicates are reproducible from the seed, regardless of the number of workers
+    parallel_bootstrap = score.bootstrap(100, seed=1, workers=2)
+    assert parallel_bootstrap.overall.equals(bootstrap.overall)
+    assert parallel_bootstrap.auc.equals(bootstrap.auc)
+    assert parallel_bootstrap.ap.equals(bootstrap.ap)
+    assert not score.bootstrap(100, seed=2).overall.equals(bootstrap.overall)
+
+
+def test_score_bootstrap_batches(monkeypatch, synthetic_classification):
+    truth_probabilities, prediction_probabilities, truth_weights = synthetic_classification
+    score = ClassificationScore(
+        truth_probabilities, prediction_probabilities, truth_weights, ClassificationMetric.AUC
+    )
+    bootstrap = score.bootstrap(10)
+
+    # Memory is bounded by scoring each replicate separately, without changing the replicates
+    monkeypatch.setattr('isic_challenge_scoring.bootstrap.REPLICATE_BATCH_ELEMENTS', 1)
+    batched_bootstrap = score.bootstrap(10)
+
+    # Only summation order, so rounding, depends on the batch size
+    assert batched_bootstrap.overall.to_numpy() == pytest.approx(bootstrap.overall.to_numpy())
+    assert batched_bootstrap.auc.to_numpy() == pytest.approx(bootstrap.auc.to_numpy())
+    assert batched_bootstrap.ap.to_numpy() == pytest.approx(bootstrap.ap.to_numpy())
+
+
+def test_score_roc_points(synthetic_classification):
+    score = ClassificationScore(*synthetic_classification, ClassificationMetric.AUC)
+    budget_score = ClassificationScore(
+        *synthetic_classification, ClassificationMetric.AUC, roc_points=16
+    )
+
+    for category, roc in score.rocs.items():
+        assert len(roc) > 16
+        assert len(budget_score.rocs[category]) <= 16
+        assert len(budget_score.to_dict()['rocs'][category]['fpr']) <= 16
+    assert budget_score.overall == score.overall
+
+
+def test_score_roc_points_cli(tmp_path, synthetic_classification):
+    truth_probabilities, prediction_probabilities, truth_weights = synthetic_classification
+    truth_file = tmp_path / 'truth.csv'
+    truth_probabilities.join(truth_weights).to_csv(truth_file)
+    prediction_file = tmp_path / 'prediction.csv'
+    prediction_probabilities.to_csv(prediction_file)
+
+    result = CliRunner().invoke(
+        cli,
+        ['--output', 'npz', 'classification', '--metric', 'auc', '--roc-points', '16']
+        + [str(truth_file), str(prediction_file)],
+    )
+
+    assert result.exit_code == 0, result.output
+    score = ClassificationScore.from_bytes(result.stdout_bytes)
+    assert all(len(roc) <= 16 for roc in score.rocs.values())
+
+    result = CliRunner().invoke(
+        cli, ['classification', '--roc-points', '1', str(truth_file), str(prediction_file)]
+    )
+    assert result.exit_code == 2
+
+
+@pytest.mark.parametrize('metric', ['auc', 'ap'])
+def test_score_fast(tmp_path, monkeypatch, synthetic_classification, metric):
+    truth_probabilities, prediction_probabilities, truth_weights = synthetic_classification
+    truth_file = tmp_path / 'truth.csv'
+    truth_probabilities.join(truth_weights).to_csv(truth_file)
+    prediction_file = tmp_path / 'prediction.csv'
+    prediction_probabilities.to_csv(prediction_file)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('The ROC was computed.')
+
+    monkeypatch.setattr(metrics.CategoryRanking, 'roc', fail)
+    monkeypatch.setattr(metrics, '_rdp_mask', fail)
+    result = CliRunner().invoke(
+        cli,
+        ['--output', 'json', 'classification', '--fast', '--metric', metric]
+        + [str(truth_file), str(prediction_file)],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output).keys() == {'overall', 'validation'}
+
+
+def test_score_memmap(tmp_path, synthetic_classification):
+    truth_probabilities, prediction_probabilities, truth_weights = synthetic_classification
+    truth_file = tmp_path / 'truth.csv'
+    truth_probabilities.join(truth_weights).to_csv(truth_file)
+    prediction_file = tmp_path / 'prediction.csv'
+    prediction_probabilities.to_csv(prediction_file)
+
+    score = ClassificationScore.from_file(truth_file, prediction_file, ClassificationMetric.AUC)
+    memmap_score = ClassificationScore.from_file(
+        truth_file, prediction_file, ClassificationMetric.AUC, chunk_size=100, memmap=True
+    )
+
+    # The predictions are wrapped, without copying, from a memory-mapped file
+    prediction_values = memmap_score._prediction_probabilities.to_numpy()
+    while not isinstance(prediction_values, np.memmap):
+        assert prediction_values.base is not None
+        prediction_values = prediction_values.base
+    assert memmap_score.to_dict() == score.to_dict()
+
+    result = CliRunner().invoke(
+        cli, ['classification', '--memmap', str(truth_file), str(prediction_file)]
+    )
+    assert result.exit_code == 2
+    assert '--memmap requires --chunk-size' in result.output
+
+
+def test_score_lazy():
+    truth_csv = (
+        'image,MEL,NV,BCC,score_weight,validation_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,1.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,1.0,1.0\n'
+        'ISIC_0000125,0.0,0.0,1.0,1.0,1.0\n'
+    )
+    prediction_csv = (
+        'image,MEL,NV,BCC\n'
+        'ISIC_0000123,0.9,0.1,0.0\n'
+        'ISIC_0000124,0.8,0.2,0.0\n'
+        'ISIC_0000125,0.1,0.0,0.9\n'
+    )
+
+    score = ClassificationScore.from_stream(
+        io.StringIO(truth_csv), io.StringIO(prediction_csv), ClassificationMetric.DICE
+    )
+
+    # Only what the target metric needs is computed
+    assert '_cms' in score.__dict__
+    for name in ['_category_scores', '_balanced_accuracies', 'per_category', 'rocs', 'aggregate']:
+        assert name not in score.__dict__
+
+    assert score.per_category is score.per_category
+    assert '_category_scores' in score.__dict__
+    assert score.per_category.at['BCC', 'dice'] == 1.0
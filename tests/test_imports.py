@@ -0,0 +1,50 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+import isic_challenge_scoring
+
+
+def _imported_modules(module: str) -> set[str]:
+    """Import a module in a fresh interpreter, returning the names of every module imported."""
+    env = {
+        **os.environ,
+        'PYTHONPATH': str(pathlib.Path(isic_challenge_scoring.__file__).parent.parent),
+    }
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        check=True,
+        env=env,
+        text=True,
+    )
+
+    imported_modules = set()
+    for line in process.stderr.splitlines():
+        # Lines are formatted as "import time: <self us> | <cumulative us> | <name>"
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, _, name = line.removeprefix('import time:').split('|')
+        imported_modules.add(name.strip())
+    return imported_modules
+
+
+@pytest.mark.parametrize(
+    'module, forbidden_modules',
+    [
+        ('isic_challenge_scoring', ['numpy', 'pandas', 'PIL', 'sklearn']),
+        # The CLI starts quickly, as scoring dependencies are only imported by the commands
+        ('isic_challenge_scoring.__main__', ['numpy', 'pandas', 'PIL', 'sklearn']),
+        ('isic_challenge_scoring.classification', ['PIL', 'sklearn']),
+        ('isic_challenge_scoring.segmentation', ['PIL', 'sklearn']),
+    ],
+)
+def test_import_dependencies(module, forbidden_modules):
+    imported_modules = _imported_modules(module)
+
+    assert module in imported_modules
+    for forbidden_module in forbidden_modules:
+        assert forbidden_module not in imported_modules
@@ -1,5 +1,7 @@
 import io
+import re
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -263,6 +265,20 @@ def test_parse_csv_non_float_columns(categories):
         load_csv.parse_csv(prediction_file_stream, categories)
 
 
+def test_parse_csv_missing_values_non_float_columns(categories):
+    prediction_file_stream = io.StringIO(
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        "ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,'BAD'\n"
+        'ISIC_0000124,0.0,1.0,0.0,,0.0,0.0,0.0\n'
+    )
+
+    # Missing values are reported before non-floating-point values
+    with pytest.raises(
+        ScoreError, match=r"^Missing value\(s\) in CSV for images: \['ISIC_0000124'\]\.$"
+    ):
+        load_csv.parse_csv(prediction_file_stream, categories)
+
+
 def test_parse_csv_out_of_range_values(categories):
     prediction_file_stream = io.StringIO(
         'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
@@ -389,3 +405,149 @@ def test_sort_rows(categories):
             columns=categories,
         )
     )
+
+
+def test_parse_truth_csv_extra_weights(categories):
+    truth_file_stream = io.StringIO(
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC,private_weight,score_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0,0.0,1.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,0.0,1.0,1.0\n'
+    )
+
+    truth_probabilities, truth_weights = load_csv.parse_truth_csv(truth_file_stream)
+
+    assert truth_probabilities.columns.equals(categories)
+    assert truth_weights.equals(
+        pd.DataFrame(
+            [[1.0, 1.0, 0.0], [1.0, 1.0, 1.0]],
+            index=['ISIC_0000123', 'ISIC_0000124'],
+            columns=pd.Index(['score_weight', 'validation_weight', 'private_weight']),
+        )
+    )
+
+
+def test_align_rows(categories):
+    truth_index = pd.Index(['ISIC_0000123', 'ISIC_0000124', 'ISIC_0000125'])
+    prediction_probabilities = pd.DataFrame(
+        [
+            [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0],
+            [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        ],
+        index=['ISIC_0000124', 'ISIC_0000125', 'ISIC_0000123'],
+        columns=categories,
+    )
+
+    aligned_probabilities = load_csv.align_rows(truth_index, prediction_probabilities)
+
+    assert aligned_probabilities.equals(
+        pd.DataFrame(
+            [
+                [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+                [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+                [0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0],
+            ],
+            index=truth_index,
+            columns=categories,
+        )
+    )
+
+
+def test_align_rows_missing_and_extra_images(categories):
+    truth_index = pd.Index(['ISIC_0000123', 'ISIC_0000124', 'ISIC_0000125'])
+    prediction_probabilities = pd.DataFrame(
+        [
+            [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0],
+            [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+        ],
+        index=['ISIC_0000127', 'ISIC_0000124', 'ISIC_0000126'],
+        columns=categories,
+    )
+
+    # Missing images are reported before extra images
+    with pytest.raises(
+        ScoreError, match=r"^Missing images in CSV: \['ISIC_0000123', 'ISIC_0000125'\]\.$"
+    ):
+        load_csv.align_rows(truth_index, prediction_probabilities)
+
+    with pytest.raises(
+        ScoreError, match=r"^Extra images in CSV: \['ISIC_0000126', 'ISIC_0000127'\]\.$"
+    ):
+        load_csv.align_rows(truth_index[[1]], prediction_probabilities)
+
+
+@pytest.mark.parametrize(
+    'prediction_csv',
+    [
+        # Valid, in a different order than the truth
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000125.jpg,0.0,0.0,1.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0,1,0,0,0,0,0\n',
+        # Duplicates, in different chunks, take precedence over missing columns
+        'image,MEL,NV,BCC,AKIEC,BKL,DF\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000126,0.0,1.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000123.jpg,0.0,0.0,1.0,0.0,0.0,0.0\n'
+        'ISIC_0000126,0.0,0.0,1.0,0.0,0.0,0.0\n',
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0.0,,0.0,0.0,0.0,0.0,BAD\n'
+        'ISIC_0000125,0.0,0.0,1.0,0.0,0.0,0.0,0.0\n',
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,BAD\n'
+        'ISIC_0000125,0.0,0.0,1,0.0,0.0,0.0,0.0\n',
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000123,2.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000125,0.0,0.0,-1.0,0.0,0.0,0.0,0.0\n',
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000127,1.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000126,0.0,0.0,1.0,0.0,0.0,0.0,0.0\n',
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000127,0.0,0.0,1.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000125,0.0,0.0,1.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000126,0.0,0.0,1.0,0.0,0.0,0.0,0.0\n',
+    ],
+)
+@pytest.mark.parametrize('chunk_size', [1, 2, 10])
+def test_parse_aligned_csv(categories, prediction_csv, chunk_size):
+    truth_index = pd.Index(['ISIC_0000123', 'ISIC_0000124', 'ISIC_0000125'])
+
+    try:
+        expected = load_csv.align_rows(
+            truth_index, load_csv.parse_csv(io.StringIO(prediction_csv), categories)
+        )
+    except ScoreError as e:
+        with pytest.raises(ScoreError, match=f'^{re.escape(str(e))}$'):
+            load_csv.parse_aligned_csv(
+                io.StringIO(prediction_csv), truth_index, categories, chunk_size
+            )
+    else:
+        prediction_probabilities = load_csv.parse_aligned_csv(
+            io.StringIO(prediction_csv), truth_index, categories, chunk_size
+        )
+        assert prediction_probabilities.equals(expected)
+
+
+def test_parse_aligned_csv_out(categories, tmp_path):
+    truth_index = pd.Index(['ISIC_0000123', 'ISIC_0000124'])
+    prediction_file_stream = io.StringIO(
+        'image,MEL,NV,BCC,AKIEC,BKL,DF,VASC\n'
+        'ISIC_0000124,0.0,1.0,0.0,0.0,0.0,0.0,0.0\n'
+        'ISIC_0000123,1.0,0.0,0.0,0.0,0.0,0.0,0.0\n'
+    )
+    out = np.memmap(tmp_path / 'out', dtype=np.float64, mode='w+', shape=(2, len(categories)))
+
+    prediction_probabilities = load_csv.parse_aligned_csv(
+        prediction_file_stream, truth_index, categories, 1, out
+    )
+
+    assert np.shares_memory(prediction_probabilities.to_numpy(), out)
+    assert out[0].tolist() == [1.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+    assert out[1].tolist() == [0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0]
@@ -1,5 +1,7 @@
 import pathlib
 
+from PIL import Image
+import numpy as np
 import pytest
 
 from isic_challenge_scoring import ScoreError, load_image
@@ -31,6 +33,56 @@ def test_parse_image_id_invalid(truth_file):
         image_pair.parse_image_id()
 
 
+@pytest.mark.parametrize(
+    'truth_file, correct_prediction_file',
+    [
+        ('ISIC_0000001_Segmentation.png', 'ISIC_0000001_prediction.png'),
+        ('ISIC_0000002_attribute_streaks.png', 'ISIC_0000002_attribute_streaks.png'),
+        ('ISIC_0000002_attribute_globules.png', 'prefix_0000002_globules.png'),
+        # Digits within a longer run of digits also match
+        ('ISIC_0000004.png', 'ISIC_00000045.png'),
+    ],
+)
+def test_find_prediction_file_valid(tmp_path, truth_file, correct_prediction_file):
+    for prediction_file in [
+        'ISIC_0000001_prediction.png',
+        'ISIC_0000002_attribute_streaks.png',
+        'prefix_0000002_globules.png',
+        'ISIC_00000045.png',
+    ]:
+        (tmp_path / prediction_file).touch()
+    image_pair = load_image.ImagePair(truth_file=pathlib.Path(truth_file))
+    image_pair.parse_image_id()
+
+    image_pair.find_prediction_file(load_image.PredictionFileIndex(tmp_path))
+
+    assert image_pair.prediction_file == tmp_path / correct_prediction_file
+
+
+@pytest.mark.parametrize(
+    'truth_file, error',
+    [
+        ('ISIC_0000003.png', r'^No matching submission for: ISIC_0000003.png'),
+        ('ISIC_0000002_attribute_milia_like_cyst.png', r'^No matching submission for:'),
+        ('ISIC_0000001.png', r'^Multiple matching submissions for: ISIC_0000001.png'),
+        ('ISIC_0000002.png', r'^Multiple matching submissions for:'),
+    ],
+)
+def test_find_prediction_file_invalid(tmp_path, truth_file, error):
+    for prediction_file in [
+        'ISIC_0000001.png',
+        'ISIC_0000001_copy.png',
+        'ISIC_0000002_attribute_streaks.png',
+        'ISIC_0000002_attribute_globules.png',
+    ]:
+        (tmp_path / prediction_file).touch()
+    image_pair = load_image.ImagePair(truth_file=pathlib.Path(truth_file))
+    image_pair.parse_image_id()
+
+    with pytest.raises(ScoreError, match=error):
+        image_pair.find_prediction_file(load_image.PredictionFileIndex(tmp_path))
+
+
 @pytest.mark.parametrize(
     'test_image_name', ['binary.png', 'monochrome.png', 'monochrome_png_noext', 'monochrome.jpg']
 )
@@ -45,3 +97,43 @@ def test_load_segmentation_image_invalid(test_images_path, test_image_name):
     image_path = test_images_path / test_image_name
     with pytest.raises(ScoreError):
         load_image.load_segmentation_image(image_path)
+
+
+def test_match_image_pairs_problems(tmp_path):
+    truth_path = tmp_path / 'truth'
+    prediction_path = tmp_path / 'prediction'
+    truth_path.mkdir()
+    prediction_path.mkdir()
+    for image_number in range(5):
+        Image.new('L', (4, 3)).save(truth_path / f'ISIC_{image_number:07d}_segmentation.png')
+    Image.new('L', (4, 3)).save(prediction_path / 'ISIC_0000000.png')
+    Image.new('L', (4, 3)).save(prediction_path / 'ISIC_0000001.png')
+    Image.new('L', (4, 3)).save(prediction_path / 'ISIC_0000001_copy.png')
+    Image.new('L', (3, 4)).save(prediction_path / 'ISIC_0000003.png')
+    Image.new('RGB', (4, 3)).save(prediction_path / 'ISIC_0000004.png')
+
+    with pytest.raises(ScoreError) as exc_info:
+        load_image.match_image_pairs(truth_path, prediction_path)
+
+    assert str(exc_info.value) == (
+        '4 problems with the submission:\n'
+        '- Multiple matching submissions for: ISIC_0000001_segmentation.png\n'
+        '- No matching submission for: ISIC_0000002_segmentation.png\n'
+        '- Image ISIC_0000003.png has dimensions (4, 3); expected (3, 4).\n'
+        '- Image ISIC_0000004.png is not single-channel (greyscale).'
+    )
+
+
+def test_match_image_pairs_problem(tmp_path):
+    truth_path = tmp_path / 'truth'
+    prediction_path = tmp_path / 'prediction'
+    truth_path.mkdir()
+    prediction_path.mkdir()
+    Image.fromarray(np.zeros((3, 4), dtype=np.uint8)).save(
+        truth_path / 'ISIC_0000000_segmentation.png'
+    )
+    (prediction_path / 'ISIC_0000000.png').write_bytes(b'not an image')
+
+    # A single problem is reported alone
+    with pytest.raises(ScoreError, match=r'^Could not decode image "ISIC_0000000\.png"$'):
+        load_image.match_image_pairs(truth_path, prediction_path)
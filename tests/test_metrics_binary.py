@@ -2,7 +2,11 @@ import numpy as np
 import pytest
 
 from isic_challenge_scoring import metrics
-from isic_challenge_scoring.confusion import create_binary_confusion_matrix
+from isic_challenge_scoring.confusion import (
+    MaskConfusionKernel,
+    create_binary_confusion_matrices,
+    create_binary_confusion_matrix,
+)
 
 truth_binary_image = np.array(
     [
@@ -252,3 +256,83 @@ def test_binary_npv(truth_binary_image, prediction_binary_image, correct_value):
     value = metrics.binary_npv(cm)
 
     assert value == correct_value
+
+
+@pytest.mark.parametrize(
+    'scalar_metric, batch_metric',
+    [
+        (metrics.binary_accuracy, metrics.batch_binary_accuracy),
+        (metrics.binary_sensitivity, metrics.batch_binary_sensitivity),
+        (metrics.binary_specificity, metrics.batch_binary_specificity),
+        (metrics.binary_jaccard, metrics.batch_binary_jaccard),
+        (metrics.binary_threshold_jaccard, metrics.batch_binary_threshold_jaccard),
+        (metrics.binary_dice, metrics.batch_binary_dice),
+        (metrics.binary_ppv, metrics.batch_binary_ppv),
+        (metrics.binary_npv, metrics.batch_binary_npv),
+    ],
+)
+def test_batch_binary_metrics(scalar_metric, batch_metric):
+    prediction_binary_images = [
+        empty_overlap_prediction_binary_image,
+        no_overlap_prediction_binary_image,
+        quarter_overlap_prediction_binary_image,
+        half_overlap_prediction_binary_image,
+        half_filled_prediction_binary_image,
+        three_quarter_filled_prediction_binary_image,
+        truth_binary_image,
+        one_extra_prediction_binary_image,
+        filled_prediction_binary_image,
+    ]
+    # Treat each prediction image as a separate category
+    truth_binary_values = np.stack(
+        [truth_binary_image.ravel()] * len(prediction_binary_images), axis=1
+    )
+    prediction_binary_values = np.stack(
+        [image.ravel() for image in prediction_binary_images], axis=1
+    )
+
+    cms = create_binary_confusion_matrices(
+        truth_binary_values, prediction_binary_values, np.ones(truth_binary_values.shape[0])
+    )
+    values = batch_metric(cms)
+
+    assert values.tolist() == [
+        scalar_metric(create_binary_confusion_matrix(truth_binary_image, image))
+        for image in prediction_binary_images
+    ]
+
+
+def test_create_binary_confusion_matrices_weights():
+    truth_binary_values = np.array([[True, False], [True, True], [False, False]])
+    prediction_binary_values = np.array([[True, True], [False, True], [False, True]])
+    weights = np.array([[1.0, 0.0], [0.5, 1.0], [2.0, 1.0]])
+
+    cms = create_binary_confusion_matrices(truth_binary_values, prediction_binary_values, weights)
+
+    assert cms.shape == (2, 2, 4)
+    for weight_index in range(2):
+        for category_index in range(2):
+            cm = create_binary_confusion_matrix(
+                truth_binary_values[:, category_index],
+                prediction_binary_values[:, category_index],
+                weights[:, weight_index],
+            )
+            assert cms[weight_index, category_index].tolist() == cm.tolist()
+
+
+def test_mask_confusion_kernel():
+    rng = np.random.default_rng(0)
+    mask_confusion = MaskConfusionKernel()
+
+    # Varying sizes grow, then reuse, the kernel's buffers
+    for shape in [(4, 4), (30, 20), (5, 3), (30, 20)]:
+        truth_image = rng.integers(0, 256, size=shape, dtype=np.uint8)
+        prediction_image = rng.integers(0, 256, size=shape, dtype=np.uint8)
+
+        cm = mask_confusion(truth_image, prediction_image, name='image')
+
+        assert cm.name == 'image'
+        assert (
+            cm.to_dict()
+            == create_binary_confusion_matrix(truth_image > 128, prediction_image > 128).to_dict()
+        )
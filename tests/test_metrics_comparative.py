@@ -1,4 +1,7 @@
+import numpy as np
+import pandas as pd
 import pytest
+import rdp
 import sklearn.metrics
 
 from isic_challenge_scoring import metrics
@@ -60,3 +63,105 @@ def test_jaccard_dice_equality(real_cm):
 
     assert dice == (2 * jaccard) / (1.0 + jaccard)
     assert jaccard == dice / (2.0 - dice)
+
+
+@pytest.fixture
+def ranking_inputs() -> tuple[pd.Series, pd.Series, pd.Series]:
+    rng = np.random.default_rng(0)
+    truth_probabilities = pd.Series(rng.integers(0, 2, 1000).astype(float))
+    # Round, to create many tied thresholds
+    prediction_probabilities = pd.Series(
+        (truth_probabilities * 0.2 + rng.random(1000) * 0.8).round(2)
+    )
+    weights = pd.Series(rng.choice([0.0, 0.5, 1.0], 1000))
+    return truth_probabilities, prediction_probabilities, weights
+
+
+def test_auc_reference(ranking_inputs):
+    value = metrics.auc(*ranking_inputs)
+    reference_value = sklearn.metrics.roc_auc_score(
+        ranking_inputs[0], ranking_inputs[1], sample_weight=ranking_inputs[2]
+    )
+
+    assert value == pytest.approx(reference_value)
+
+
+def test_average_precision_reference(ranking_inputs):
+    value = metrics.average_precision(*ranking_inputs)
+    reference_value = sklearn.metrics.average_precision_score(
+        ranking_inputs[0], ranking_inputs[1], sample_weight=ranking_inputs[2]
+    )
+
+    assert value == pytest.approx(reference_value)
+
+
+def test_roc_curve_reference(ranking_inputs):
+    fp_rates, tp_rates, thresholds = metrics.CategoryRanking.from_probabilities(
+        *ranking_inputs
+    ).roc_curve()
+    reference_fp_rates, reference_tp_rates, reference_thresholds = sklearn.metrics.roc_curve(
+        ranking_inputs[0], ranking_inputs[1], sample_weight=ranking_inputs[2]
+    )
+
+    assert fp_rates == pytest.approx(reference_fp_rates)
+    assert tp_rates == pytest.approx(reference_tp_rates)
+    # The infinite first threshold is replaced
+    assert thresholds[1:] == pytest.approx(reference_thresholds[1:])
+
+
+def test_batch_ranking_metrics_reference(ranking_inputs):
+    truth_probabilities, prediction_probabilities, weights = ranking_inputs
+    rng = np.random.default_rng(1)
+    # Resampling counts, which include many zeros, are equivalent to duplicated rows
+    weight_matrix = np.vstack(
+        [weights.to_numpy(), rng.integers(0, 3, (4, len(weights))) * weights.to_numpy()]
+    )
+    descending_indices = np.argsort(prediction_probabilities.to_numpy(), kind='mergesort')[::-1]
+    sorted_predictions = prediction_probabilities.to_numpy()[descending_indices]
+    threshold_indices = np.r_[
+        np.flatnonzero(np.diff(sorted_predictions)), len(sorted_predictions) - 1
+    ]
+
+    auc, average_precision = metrics.batch_ranking_metrics(
+        truth_probabilities.to_numpy()[descending_indices] > 0.5,
+        threshold_indices,
+        weight_matrix[:, descending_indices],
+    )
+
+    for weight_vector, value, ap_value in zip(weight_matrix, auc, average_precision):
+        assert value == pytest.approx(
+            sklearn.metrics.roc_auc_score(
+                truth_probabilities, prediction_probabilities, sample_weight=weight_vector
+            )
+        )
+        assert ap_value == pytest.approx(
+            sklearn.metrics.average_precision_score(
+                truth_probabilities, prediction_probabilities, sample_weight=weight_vector
+            )
+        )
+
+
+@pytest.mark.parametrize('epsilon', [0.0, 0.001, 0.01])
+@pytest.mark.parametrize('curve', ['continuous', 'discrete', 'collinear', 'undefined'])
+def test_rdp_mask_reference(curve, epsilon):
+    rng = np.random.default_rng(0)
+    if curve == 'continuous':
+        x = np.sort(rng.random(500))
+        y = np.sort(rng.random(500))
+    elif curve == 'discrete':
+        # Many repeated points and collinear runs
+        x = np.cumsum(rng.integers(0, 3, 500)) / 1000
+        y = np.cumsum(rng.integers(0, 3, 500)) / 1000
+    elif curve == 'collinear':
+        x = np.linspace(0.0, 1.0, 500)
+        y = np.linspace(0.0, 1.0, 500)
+    elif curve == 'undefined':
+        # As when a category has no positives
+        x = np.sort(rng.random(500))
+        y = np.full(500, np.nan)
+    points = np.vstack((x, y)).T
+
+    mask = metrics._rdp_mask(points, epsilon)
+    reference_mask = rdp.rdp(points, epsilon=epsilon, return_mask=True)
+
+    assert np.array_equal(mask, reference_mask)
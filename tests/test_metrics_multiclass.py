@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -21,24 +22,24 @@ def test_to_labels(categories):
         columns=categories,
     )
 
-    labels = metrics._to_labels(probabilities)
+    labels = metrics._to_labels(probabilities.to_numpy())
 
-    assert labels.equals(pd.Series(['NV', 'undecided', 'AKIEC', 'undecided', 'MEL']))
+    # 'undecided' is labeled as the number of categories
+    assert labels.tolist() == [1, 7, 3, 7, 0]
 
 
 def test_get_frequencies(categories):
-    labels = pd.Series(['MEL', 'MEL', 'VASC', 'AKIEC', 'MEL'])
-    weights = pd.Series([1.0, 1.0, 1.0, 1.0, 0.0])
+    labels = categories.get_indexer(['MEL', 'MEL', 'VASC', 'AKIEC', 'MEL', 'undecided'])
+    labels[labels == -1] = len(categories)
+    weights = np.array([[1.0, 1.0, 1.0, 1.0, 0.0, 1.0], [0.0, 1.0, 1.0, 1.0, 1.0, 1.0]]).T
 
-    label_frequencies = metrics._get_frequencies(labels, weights, categories)
+    label_frequencies = metrics._get_frequencies(labels, weights, len(categories))
 
-    assert label_frequencies.equals(
-        pd.Series(
-            {'MEL': 2.0, 'NV': 0.0, 'BCC': 0.0, 'AKIEC': 1.0, 'BKL': 0.0, 'DF': 0.0, 'VASC': 1.0}
-        )
-    )
-    # Ensure the ordering is correct (although Python3.6 dicts are ordered)
-    assert label_frequencies.index.equals(categories)
+    # Each row is ordered by categories, and 'undecided' is excluded
+    assert label_frequencies.tolist() == [
+        [2.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0],
+        [2.0, 0.0, 0.0, 1.0, 0.0, 0.0, 1.0],
+    ]
 
 
 @pytest.mark.parametrize(
@@ -69,10 +70,37 @@ def test_label_balanced_multiclass_accuracy(
         weights = weights + [0.0]
 
     value = metrics._label_balanced_multiclass_accuracy(
-        pd.Series(truth_labels), pd.Series(prediction_labels), pd.Series(weights), categories
+        categories.get_indexer(truth_labels),
+        categories.get_indexer(prediction_labels),
+        np.array(weights)[:, np.newaxis],
+        len(categories),
     )
 
-    assert value == correct_value
+    assert value.tolist() == [correct_value]
+
+
+def test_batch_balanced_multiclass_accuracy(categories):
+    truth_probabilities = pd.DataFrame(np.eye(7)[[0, 1, 0, 0, 2]], columns=categories)
+    # The last row is 'undecided'
+    prediction_probabilities = pd.DataFrame(
+        np.eye(7)[[0, 0, 0, 1, 2]] + np.eye(7)[[0, 0, 0, 1, 3]], columns=categories
+    )
+    weights = pd.DataFrame(
+        {
+            'score_weight': [1.0, 1.0, 1.0, 1.0, 1.0],
+            'validation_weight': [1.0, 0.0, 1.0, 0.0, 0.0],
+        }
+    )
+
+    values = metrics.batch_balanced_multiclass_accuracy(
+        truth_probabilities, prediction_probabilities, weights
+    )
+
+    assert values.to_dict() == {'score_weight': (2 / 3 + 0 + 0) / 3, 'validation_weight': 1.0}
+    for weight_name, value in values.items():
+        assert value == metrics.balanced_multiclass_accuracy(
+            truth_probabilities, prediction_probabilities, weights[weight_name]
+        )
 
 
 @pytest.mark.parametrize(
@@ -187,3 +215,62 @@ def test_roc(truth_probabilities, prediction_probabilities, correct_roc, test_we
 
     correct_roc = pd.DataFrame(correct_roc).set_index('threshold')
     assert roc.equals(correct_roc)
+
+
+def test_category_ranking_from_weights():
+    truth_probabilities = pd.Series([0.0, 1.0, 1.0, 0.0, 1.0, 0.0, 1.0])
+    prediction_probabilities = pd.Series([0.3, 0.7, 0.3, 0.7, 0.9, 0.1, 0.5])
+    weights = pd.DataFrame(
+        {
+            'a': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+            'b': [0.0, 1.0, 0.5, 2.0, 0.0, 1.0, 1.0],
+            'c': [1.0, 0.0, 1.0, 1.0, 1.0, 0.0, 0.0],
+        }
+    )
+
+    rankings = metrics.CategoryRanking.from_weights(
+        truth_probabilities, prediction_probabilities, weights
+    )
+
+    assert list(rankings) == ['a', 'b', 'c']
+    for weight_name, ranking in rankings.items():
+        # Sorting and summing once for all weights must match each weight individually
+        single_ranking = metrics.CategoryRanking.from_probabilities(
+            truth_probabilities, prediction_probabilities, weights[weight_name]
+        )
+        assert np.array_equal(ranking.fps, single_ranking.fps)
+        assert np.array_equal(ranking.tps, single_ranking.tps)
+        assert np.array_equal(ranking.thresholds, single_ranking.thresholds)
+        assert ranking.roc().equals(single_ranking.roc())
+
+
+@pytest.mark.parametrize('max_points', [2, 10, 256])
+def test_roc_max_points(max_points):
+    rng = np.random.default_rng(0)
+    truth_probabilities = pd.Series(rng.integers(2, size=1000).astype(np.float64))
+    prediction_probabilities = pd.Series(rng.random(1000))
+    weights = pd.Series(np.ones(1000))
+
+    full_roc = metrics.CategoryRanking.from_probabilities(
+        truth_probabilities, prediction_probabilities, weights
+    ).roc_curve()
+    roc = metrics.roc(truth_probabilities, prediction_probabilities, weights, max_points)
+
+    assert 2 <= len(roc) <= max_points
+    # Points are a subset of the full curve, including both ends
+    assert np.isin(roc.index, full_roc[2]).all()
+    assert roc.index[0] == full_roc[2][0]
+    assert roc.index[-1] == full_roc[2][-1]
+    assert roc.index.is_monotonic_decreasing
+
+
+def test_downsample_roc():
+    roc = pd.DataFrame(
+        {'fpr': [0.0, 0.0, 0.5, 1.0], 'tpr': [0.0, 1.0, 1.0, 1.0]},
+        index=[1.0, 0.8, 0.6, 0.2],
+    )
+
+    assert metrics.downsample_roc(roc, 4).equals(roc)
+    assert metrics.downsample_roc(roc, 3).equals(roc.iloc[[0, 1, 3]])
+    with pytest.raises(ValueError, match=r'at least 2 points'):
+        metrics.downsample_roc(roc, 1)
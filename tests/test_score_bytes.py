@@ -0,0 +1,75 @@
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from isic_challenge_scoring.classification import ClassificationMetric, ClassificationScore
+from isic_challenge_scoring.load_image import ImagePair
+from isic_challenge_scoring.segmentation import SegmentationScore
+from isic_challenge_scoring.types import Score
+
+
+@pytest.fixture
+def classification_score():
+    rng = np.random.default_rng(0)
+    categories = pd.Index(['MEL', 'NV', 'BCC'])
+    images = pd.Index([f'ISIC_{i:07d}' for i in range(300)], name='image')
+    truth_probabilities = pd.DataFrame(
+        np.eye(len(categories))[rng.integers(len(categories), size=len(images))],
+        index=images,
+        columns=categories,
+    )
+    prediction_probabilities = pd.DataFrame(
+        rng.random((len(images), len(categories))), index=images, columns=categories
+    )
+    truth_weights = pd.DataFrame(
+        {'score_weight': np.ones(len(images)), 'validation_weight': np.ones(len(images))},
+        index=images,
+    )
+    return ClassificationScore(
+        truth_probabilities, prediction_probabilities, truth_weights, ClassificationMetric.AUC
+    )
+
+
+def test_classification_score_bytes(classification_score):
+    score = ClassificationScore.from_bytes(classification_score.to_bytes())
+
+    assert isinstance(score, ClassificationScore)
+    # Scalars are exact
+    assert score.overall == classification_score.overall
+    assert score.validation == classification_score.validation
+    # Tables and curves are float32
+    for name in ['per_category', 'macro_average', 'aggregate', 'per_weight']:
+        value = getattr(score, name)
+        expected_value = getattr(classification_score, name)
+        assert value.to_numpy().dtype == np.float32
+        assert np.allclose(value.to_numpy(), expected_value.to_numpy(), equal_nan=True)
+        assert value.index.equals(expected_value.index)
+    assert score.per_category.columns.equals(classification_score.per_category.columns)
+    assert score.rocs.keys() == classification_score.rocs.keys()
+    for category, roc in score.rocs.items():
+        assert roc.to_numpy().dtype == np.float32
+        assert roc.columns.equals(classification_score.rocs[category].columns)
+        assert np.allclose(roc.to_numpy(), classification_score.rocs[category].to_numpy())
+        assert np.allclose(roc.index, classification_score.rocs[category].index)
+
+
+def test_segmentation_score_bytes():
+    image_pair = ImagePair(truth_file=pathlib.Path('ISIC_0000000_segmentation.png'))
+    image_pair.image_id = 'ISIC_0000000'
+    image_pair.truth_image = np.array([[0, 255], [255, 255]], dtype=np.uint8)
+    image_pair.prediction_image = np.array([[0, 0], [255, 255]], dtype=np.uint8)
+    segmentation_score = SegmentationScore([image_pair])
+
+    score = Score.from_bytes(segmentation_score.to_bytes())
+
+    assert isinstance(score, SegmentationScore)
+    assert score.overall == segmentation_score.overall
+    assert np.allclose(score.macro_average, segmentation_score.macro_average)
+    assert score.macro_average.name == 'macro_average'
+
+
+def test_score_bytes_wrong_type(classification_score):
+    with pytest.raises(ValueError, match=r'^Cannot decode a "ClassificationScore"'):
+        SegmentationScore.from_bytes(classification_score.to_bytes())
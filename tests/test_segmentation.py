@@ -1,5 +1,70 @@
+import pathlib
+import zipfile
+
+from PIL import Image
+import numpy as np
+import pytest
+
 from isic_challenge_scoring.segmentation import SegmentationScore
+from isic_challenge_scoring.types import ScoreError
 
 
 def test_score(segmentation_truth_path, segmentation_prediction_path):
     assert SegmentationScore.from_dir(segmentation_truth_path, segmentation_prediction_path)
+
+
+def _write_images(truth_path: pathlib.Path, prediction_path: pathlib.Path) -> None:
+    rng = np.random.default_rng(0)
+    truth_path.mkdir()
+    prediction_path.mkdir()
+    for image_number in range(7):
+        for image_path in [
+            truth_path / f'ISIC_{image_number:07d}_segmentation.png',
+            prediction_path / f'ISIC_{image_number:07d}_prediction.png',
+        ]:
+            Image.fromarray(rng.choice(np.array([0, 255], dtype=np.uint8), (16, 16))).save(
+                image_path
+            )
+
+
+def test_score_parallel(tmp_path):
+    truth_path = tmp_path / 'truth'
+    prediction_path = tmp_path / 'prediction'
+    _write_images(truth_path, prediction_path)
+
+    serial_score = SegmentationScore.from_dir(truth_path, prediction_path)
+    parallel_score = SegmentationScore.from_dir(truth_path, prediction_path, workers=2)
+
+    assert parallel_score.to_dict() == serial_score.to_dict()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_score_zip_file(tmp_path, workers):
+    truth_path = tmp_path / 'truth'
+    prediction_path = tmp_path / 'prediction'
+    _write_images(truth_path, prediction_path)
+    truth_zip_file = tmp_path / 'truth.zip'
+    prediction_zip_file = tmp_path / 'prediction.zip'
+    with zipfile.ZipFile(truth_zip_file, 'w') as zf:
+        for truth_file in truth_path.iterdir():
+            zf.write(truth_file, truth_file.name)
+    with zipfile.ZipFile(prediction_zip_file, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        # Members are flattened, and metadata is ignored
+        zf.writestr('__MACOSX/predictions/._ISIC_0000000_prediction.png', b'')
+        for prediction_file in prediction_path.iterdir():
+            zf.write(prediction_file, f'predictions/{prediction_file.name}')
+
+    score = SegmentationScore.from_zip_file(truth_zip_file, prediction_zip_file, workers=workers)
+
+    assert score.to_dict() == SegmentationScore.from_dir(truth_path, prediction_path).to_dict()
+
+
+def test_score_zip_file_invalid(tmp_path):
+    truth_zip_file = tmp_path / 'truth.zip'
+    with zipfile.ZipFile(truth_zip_file, 'w') as zf:
+        zf.writestr('ISIC_0000000_segmentation.png', b'')
+    prediction_zip_file = tmp_path / 'prediction.zip'
+    prediction_zip_file.write_bytes(b'not a zip file')
+
+    with pytest.raises(ScoreError, match=r'^Could not read ZIP file "prediction.zip"'):
+        SegmentationScore.from_zip_file(truth_zip_file, prediction_zip_file)
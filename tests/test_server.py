@@ -0,0 +1,209 @@
+import http.client
+import io
+import json
+import threading
+import urllib.error
+from urllib.parse import urlsplit
+import urllib.request
+import zipfile
+
+from PIL import Image
+import numpy as np
+import pytest
+
+from isic_challenge_scoring.classification import (
+    ClassificationMetric,
+    ClassificationScore,
+    ClassificationTruth,
+)
+from isic_challenge_scoring.server import ScoringServer
+from isic_challenge_scoring.types import ScoreError
+
+TRUTH_CSV = (
+    'image,MEL,NV,BCC,score_weight,validation_weight\n'
+    'ISIC_0000123,1.0,0.0,0.0,1.0,0.0\n'
+    'ISIC_0000124,0.0,1.0,0.0,1.0,1.0\n'
+    'ISIC_0000125,0.0,0.0,1.0,1.0,1.0\n'
+)
+PREDICTION_CSV = (
+    'image,MEL,NV,BCC\n'
+    'ISIC_0000123,0.9,0.1,0.0\n'
+    'ISIC_0000124,0.8,0.2,0.0\n'
+    'ISIC_0000125,0.1,0.0,0.9\n'
+)
+
+
+@pytest.fixture(scope='module')
+def server_url(tmp_path_factory):
+    segmentation_truth_dir = tmp_path_factory.mktemp('segmentation_truth')
+    Image.fromarray(np.array([[0, 255], [255, 255]], dtype=np.uint8)).save(
+        segmentation_truth_dir / 'ISIC_0000000_segmentation.png'
+    )
+
+    server = ScoringServer(
+        ('127.0.0.1', 0),
+        {'classification': ClassificationTruth.from_stream(io.StringIO(TRUTH_CSV))},
+        {'segmentation': segmentation_truth_dir},
+        workers=1,
+    )
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server_thread.join()
+    server.server_close()
+
+
+def _request(url: str, data: bytes | None = None) -> tuple[int, dict]:
+    try:
+        with urllib.request.urlopen(url, data=data) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_server_health(server_url):
+    status, body = _request(f'{server_url}/health')
+
+    assert status == 200
+    assert body == {
+        'status': 'ok',
+        'classification': ['classification'],
+        'segmentation': ['segmentation'],
+    }
+
+
+def test_server_queue(server_url):
+    status, body = _request(f'{server_url}/queue')
+
+    assert status == 200
+    assert body == {'queued': 0, 'running': 0, 'workers': 1, 'max_queued': 100}
+
+
+@pytest.mark.parametrize(
+    'metric', [ClassificationMetric.BALANCED_ACCURACY, ClassificationMetric.AUC]
+)
+def test_server_classification(server_url, metric):
+    status, body = _request(
+        f'{server_url}/classification/classification?metric={metric.value}',
+        PREDICTION_CSV.encode(),
+    )
+
+    assert status == 200
+    score = ClassificationScore.from_stream(
+        io.StringIO(TRUTH_CSV), io.StringIO(PREDICTION_CSV), metric
+    )
+    assert body == json.loads(json.dumps(score.to_dict(rocs=False)))
+
+
+def test_server_classification_invalid(server_url):
+    status, body = _request(
+        f'{server_url}/classification/classification', PREDICTION_CSV.replace('BCC', 'foo').encode()
+    )
+
+    assert status == 400
+    assert body == {'error': "Missing columns in CSV: ['BCC']."}
+
+
+def test_server_segmentation(server_url):
+    prediction_zip = io.BytesIO()
+    with zipfile.ZipFile(prediction_zip, 'w') as zf:
+        image = io.BytesIO()
+        Image.fromarray(np.array([[0, 0], [255, 255]], dtype=np.uint8)).save(image, format='PNG')
+        zf.writestr('predictions/ISIC_0000000_segmentation.png', image.getvalue())
+
+    status, body = _request(f'{server_url}/segmentation/segmentation', prediction_zip.getvalue())
+
+    assert status == 200
+    assert body['macro_average']['sensitivity'] == pytest.approx(2 / 3)
+
+
+@pytest.mark.parametrize(
+    'path, data',
+    [
+        ('/nonexistent', None),
+        ('/classification/nonexistent', PREDICTION_CSV.encode()),
+        ('/segmentation/nonexistent', b''),
+    ],
+)
+def test_server_not_found(server_url, path, data):
+    status, body = _request(f'{server_url}{path}', data)
+
+    assert status == 404
+    assert 'error' in body
+
+
+@pytest.mark.parametrize(
+    'content_length, status',
+    [
+        ('foo', 400),
+        ('-1', 400),
+        # The body is rejected before being read, so is never sent
+        (str(2**30 + 1), 413),
+    ],
+)
+def test_server_content_length(server_url, content_length, status):
+    connection = http.client.HTTPConnection(urlsplit(server_url).netloc)
+    try:
+        connection.putrequest('POST', '/classification/classification')
+        connection.putheader('Content-Length', content_length)
+        connection.endheaders()
+        response = connection.getresponse()
+
+        assert response.status == status
+        assert 'error' in json.load(response)
+    finally:
+        connection.close()
+
+
+def test_server_segmentation_invalid_image(server_url):
+    image = io.BytesIO()
+    Image.fromarray(np.array([[0, 0], [255, 255]], dtype=np.uint8)).save(image, format='PNG')
+    prediction_zip = io.BytesIO()
+    with zipfile.ZipFile(prediction_zip, 'w') as zf:
+        # The header can be read, but the image data is truncated
+        zf.writestr('ISIC_0000000_segmentation.png', image.getvalue()[:-25])
+
+    status, body = _request(f'{server_url}/segmentation/segmentation', prediction_zip.getvalue())
+
+    assert status == 500
+    assert body == {'error': 'An error occurred while scoring the submission.'}
+
+
+def test_server_segmentation_truth_zip(tmp_path):
+    truth_zip_file = tmp_path / 'truth.zip'
+    with zipfile.ZipFile(truth_zip_file, 'w') as zf:
+        image = io.BytesIO()
+        Image.fromarray(np.array([[0, 255], [255, 255]], dtype=np.uint8)).save(image, format='PNG')
+        zf.writestr('truth/ISIC_0000000_segmentation.png', image.getvalue())
+
+    server = ScoringServer(('127.0.0.1', 0), {}, {'segmentation': truth_zip_file}, workers=1)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.start()
+    try:
+        truth_source = server.segmentation_truths['segmentation']
+        assert [member.name for member in truth_source.iterdir()] == [
+            'ISIC_0000000_segmentation.png'
+        ]
+
+        prediction_zip = io.BytesIO()
+        with zipfile.ZipFile(prediction_zip, 'w') as zf:
+            zf.writestr('ISIC_0000000_segmentation.png', image.getvalue())
+        status, body = _request(
+            f'http://127.0.0.1:{server.server_address[1]}/segmentation/segmentation',
+            prediction_zip.getvalue(),
+        )
+        assert status == 200
+        assert body['macro_average']['jaccard'] == 1.0
+    finally:
+        server.shutdown()
+        server_thread.join()
+        server.server_close()
+
+
+def test_server_invalid_segmentation_truth(tmp_path):
+    truth_zip_file = tmp_path / 'truth.zip'
+    truth_zip_file.write_bytes(b'not a zip')
+
+    with pytest.raises(ScoreError, match=r'^Could not read ZIP file "truth.zip"'):
+        ScoringServer(('127.0.0.1', 0), {}, {'segmentation': truth_zip_file}, workers=1)
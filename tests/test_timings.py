@@ -0,0 +1,69 @@
+import io
+import tracemalloc
+from typing import cast
+
+import numpy as np
+
+from isic_challenge_scoring import timings
+from isic_challenge_scoring.classification import ClassificationMetric, ClassificationScore
+from isic_challenge_scoring.types import DataFrameDict, Score
+
+
+def test_stage_unrecorded() -> None:
+    with timings.stage('unrecorded'):
+        pass
+
+    assert not tracemalloc.is_tracing()
+
+
+def test_record_nested_stages() -> None:
+    with timings.record() as recorder:
+        with timings.stage('outer'):
+            for _ in range(2):
+                with timings.stage('inner'):
+                    array = np.ones(1_000_000)
+                    del array
+            with timings.stage('other'):
+                pass
+
+    frame = recorder.to_frame()
+    assert frame.index.tolist() == ['outer', 'inner', 'other']
+    assert frame['count'].tolist() == [1, 2, 1]
+    peak_memory = frame['peak_memory']
+    assert peak_memory['inner'] >= 8_000_000
+    # Peaks of inner stages are included in outer stages, but not in later stages
+    assert peak_memory['outer'] >= peak_memory['inner']
+    assert peak_memory['other'] < 1_000_000
+    assert frame['wall_time']['outer'] >= frame['wall_time']['inner']
+    assert not tracemalloc.is_tracing()
+
+
+def test_score_timings() -> None:
+    truth_csv = (
+        'image,MEL,NV,BCC,score_weight,validation_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,1.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,1.0,1.0\n'
+        'ISIC_0000125,0.0,0.0,1.0,1.0,1.0\n'
+    )
+    prediction_csv = (
+        'image,MEL,NV,BCC\n'
+        'ISIC_0000123,0.9,0.1,0.0\n'
+        'ISIC_0000124,0.8,0.2,0.0\n'
+        'ISIC_0000125,0.1,0.0,0.9\n'
+    )
+
+    with timings.record() as recorder:
+        score = ClassificationScore.from_stream(
+            io.StringIO(truth_csv), io.StringIO(prediction_csv), ClassificationMetric.AUC
+        )
+    assert 'timings' not in score.to_dict()
+
+    score.timings = recorder.to_frame()
+
+    assert {'read_truth_csv', 'read_csv', 'validate_csv', 'rank_category'} <= set(
+        score.timings.index
+    )
+    assert cast(DataFrameDict, score.to_dict()['timings'])['rank_category']['count'] == 3
+    restored_timings = Score.from_bytes(score.to_bytes()).timings
+    assert restored_timings is not None
+    assert restored_timings.index.equals(score.timings.index)
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from isic_challenge_scoring import timings, tracing
+from isic_challenge_scoring.classification import ClassificationMetric, ClassificationScore
+
+
+def _load_trace(trace_file):
+    # Trace viewers accept a missing closing bracket, but the JSON module does not
+    return json.loads(trace_file.read_text().rstrip().rstrip(',') + ']')
+
+
+def test_trace(tmp_path):
+    trace_file = tmp_path / 'trace.json'
+
+    with tracing.trace(trace_file):
+        with tracing.span_args(submission='submission.csv'):
+            with timings.stage('outer'):
+                with timings.stage('inner', image='ISIC_0000000'):
+                    pass
+        with timings.stage('after'):
+            pass
+    with timings.stage('untraced'):
+        pass
+
+    lines = trace_file.read_text().splitlines()
+    assert lines[0] == '['
+    assert all(line.endswith(',') for line in lines[1:])
+
+    events = _load_trace(trace_file)
+    # Spans are written as they end
+    assert [event['name'] for event in events] == ['inner', 'outer', 'after']
+    assert [event['args'] for event in events] == [
+        {'submission': 'submission.csv', 'image': 'ISIC_0000000'},
+        {'submission': 'submission.csv'},
+        {},
+    ]
+    for event in events:
+        assert event['ph'] == 'X'
+        assert event['pid'] == os.getpid()
+    inner, outer, _ = events
+    assert outer['ts'] <= inner['ts']
+    assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_trace_score_many(tmp_path, workers):
+    truth_file = tmp_path / 'truth.csv'
+    truth_file.write_text(
+        'image,MEL,NV,BCC,score_weight,validation_weight\n'
+        'ISIC_0000123,1.0,0.0,0.0,1.0,0.0\n'
+        'ISIC_0000124,0.0,1.0,0.0,1.0,1.0\n'
+        'ISIC_0000125,0.0,0.0,1.0,1.0,1.0\n'
+    )
+    prediction_files = [tmp_path / f'prediction_{i}.csv' for i in range(2)]
+    for prediction_file in prediction_files:
+        prediction_file.write_text(
+            'image,MEL,NV,BCC\n'
+            'ISIC_0000123,0.9,0.1,0.0\n'
+            'ISIC_0000124,0.8,0.2,0.0\n'
+            'ISIC_0000125,0.1,0.0,0.9\n'
+        )
+    trace_file = tmp_path / 'trace.json'
+
+    with tracing.trace(trace_file):
+        list(
+            ClassificationScore.score_many(
+                truth_file, prediction_files, ClassificationMetric.AUC, workers=workers
+            )
+        )
+
+    events = _load_trace(trace_file)
+    submission_events = [event for event in events if event['name'] == 'score_submission']
+    assert sorted(event['args']['submission'] for event in submission_events) == [
+        'prediction_0.csv',
+        'prediction_1.csv',
+    ]
+    if workers > 1:
+        assert all(event['pid'] != os.getpid() for event in submission_events)
+    # Lazily computed metrics are computed within each submission's span
+    rank_events = [event for event in events if event['name'] == 'rank_category']
+    assert len(rank_events) == 6
+    assert all('submission' in event['args'] for event in rank_events)
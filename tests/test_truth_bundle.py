@@ -0,0 +1,65 @@
+import io
+
+import pandas as pd
+
+from isic_challenge_scoring.classification import (
+    ClassificationMetric,
+    ClassificationScore,
+    ClassificationTruth,
+)
+from isic_challenge_scoring.truth_bundle import is_truth_bundle
+
+TRUTH_CSV = (
+    'image,MEL,NV,BCC,score_weight,validation_weight\n'
+    'ISIC_0000002,0.0,1.0,0.0,1.0,0.0\n'
+    'ISIC_0000001,1.0,0.0,0.0,1.0,1.0\n'
+    'ISIC_0000003,0.0,0.0,1.0,1.0,1.0\n'
+    'ISIC_0000000,0.0,1.0,0.0,1.0,1.0\n'
+)
+PREDICTION_CSV = (
+    'image,MEL,NV,BCC\n'
+    'ISIC_0000000,0.2,0.7,0.1\n'
+    'ISIC_0000001,0.6,0.3,0.1\n'
+    'ISIC_0000002,0.3,0.3,0.4\n'
+    'ISIC_0000003,0.1,0.1,0.8\n'
+)
+
+
+def test_truth_bundle_round_trip(tmp_path):
+    truth = ClassificationTruth.from_stream(io.StringIO(TRUTH_CSV))
+    bundle_file = tmp_path / 'truth.bundle'
+    truth.to_bundle(bundle_file)
+
+    assert is_truth_bundle(bundle_file)
+    bundle_truth = ClassificationTruth.from_bundle(bundle_file)
+
+    pd.testing.assert_frame_equal(bundle_truth.probabilities, truth.probabilities)
+    pd.testing.assert_frame_equal(bundle_truth.weights, truth.weights)
+    # Memory-mapped arrays are wrapped without copying, so remain read-only
+    assert not bundle_truth.probabilities.to_numpy().flags.writeable
+    assert not bundle_truth.weights.to_numpy().flags.writeable
+
+
+def test_truth_bundle_not_csv(tmp_path):
+    truth_file = tmp_path / 'truth.csv'
+    truth_file.write_text(TRUTH_CSV)
+
+    assert not is_truth_bundle(truth_file)
+
+
+def test_score_from_truth_bundle(tmp_path):
+    truth_file = tmp_path / 'truth.csv'
+    truth_file.write_text(TRUTH_CSV)
+    prediction_file = tmp_path / 'prediction.csv'
+    prediction_file.write_text(PREDICTION_CSV)
+    bundle_file = tmp_path / 'truth.bundle'
+    ClassificationTruth.from_file(truth_file).to_bundle(bundle_file)
+
+    csv_score = ClassificationScore.from_file(
+        truth_file, prediction_file, ClassificationMetric.BALANCED_ACCURACY
+    )
+    bundle_score = ClassificationScore.from_file(
+        bundle_file, prediction_file, ClassificationMetric.BALANCED_ACCURACY
+    )
+
+    assert bundle_score.to_dict() == csv_score.to_dict()